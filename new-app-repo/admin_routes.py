@@ -1,35 +1,206 @@
-from flask import Blueprint, request, jsonify, session, render_template, Response, redirect, url_for
-from db import get_db_connection
-from ai_agents import hr_agent_process_file, generate_employee_analysis_agent
+from flask import Blueprint, request, jsonify, session, render_template, Response, redirect, url_for, stream_with_context, send_from_directory
+from db import get_db_connection, pool_stats, SKILL_COLUMNS
+from cache import LRUCache
+from jobs import job_queue
+from ai_agents import invalidate_employee_ai_cache, ai_cache, ai_stale_cache
+from ingest import stream_ingest, MultipartFileStream
+from dashboard_summary import read_summary, rebuild_summary, record_employees_added, record_employees_removed
+from search_index import employee_index, parse_skill_filters, index_employees, unindex_employee
+# Imported under another name: the /admin/agent_metrics view below is called agent_metrics.
+from metrics import agent_metrics as agent_metrics_registry
+from resilience import llm_guard
+from profiling import request_profiler, PROFILE_DIR
+import role_assignment  # registers the 'assign_roles' job
+from department_analysis import get_stored_analysis, department_analysis_rows, EXPORT_COLUMNS as ANALYSIS_EXPORT_COLUMNS
+from recommendations import queue_recommendation_refresh
+from course_catalog import course_catalog
+from employee_profiles import profile_cache, get_employee_profile, invalidate_employee_profile
+from report_export import stream_columnar, check_columnar_support, ColumnarExportUnavailable, COLUMNAR_FORMATS
+from change_log import record_changes, employee_change, read_changes, CHANGE_ENTITIES, CHANGE_FEED_PAGE_MAX
+from course_assignments import ensure_course_assignment_key, record_assessment_results, ASSESSMENT_MAX_SCORE, ASSESSMENT_BATCH_MAX
+import base64
 import csv
+import json
+import zlib
 from io import StringIO
 import os
-import pandas as pd
-from werkzeug.utils import secure_filename
+import time
+import pymysql
 
 admin_bp = Blueprint('admin', __name__)
 
 # ------------- PAGE ROUTES -------------
 
+# Finished analyses are reused for this many seconds before being regenerated.
+AI_REPORT_MAX_AGE = int(os.getenv('AI_REPORT_MAX_AGE', str(24 * 3600)))
+
 @admin_bp.route('/admin/ai_report/<emp_code>')
 def ai_report_page(emp_code):
     if session.get('role') != 'admin':
         return redirect('/')
     
     employee_id = int(emp_code)
-    employee, top_skills, weak_skills, analysis = generate_employee_analysis_agent(employee_id)
-
-    if not employee:
+    if not get_employee_profile(employee_id):
         return "Employee not found", 404
+    refresh = request.args.get('refresh') == '1'
+    if not refresh:
+        # An employee covered by a department analysis needs no report of their own.
+        latest = job_queue.latest('employee_analysis', employee_id)
+        if not latest or latest['status'] != 'done':
+            stored = get_stored_analysis(employee_id)
+            if stored:
+                return _render_ai_report(employee_id, None, stored)
+
+    # The analysis runs on a background worker; this request only enqueues it
+    # (or picks up a stored result) so the gunicorn worker is freed immediately.
+    job = job_queue.enqueue(
+        'employee_analysis', employee_id,
+        reuse_max_age=AI_REPORT_MAX_AGE,
+        force=refresh
+    )
+
+    if job['status'] != 'done':
+        return render_template('admin_ai_report.html', pending=True, job=job, emp_code=employee_id)
+
+    return _render_ai_report(employee_id, job, job['result'])
 
+def _render_ai_report(employee_id, job, report):
     return render_template(
         'admin_ai_report.html',
-        employee=employee,
-        top_skills=top_skills,
-        weak_skills=weak_skills,
-        analysis=analysis
+        pending=False,
+        job=job,
+        emp_code=employee_id,
+        employee=report['employee'],
+        top_skills=report['top_skills'],
+        weak_skills=report['weak_skills'],
+        analysis=report['analysis']
     )
 
+@admin_bp.route('/admin/assign_roles', methods=['POST'])
+def assign_roles():
+    """Queues batch role assignment for every employee without a role (see role_assignment.py)."""
+    if session.get('role') != 'admin':
+        return jsonify({"success": False, "message": "Unauthorized"}), 401
+    job = job_queue.enqueue('assign_roles', 'pending', force=True)
+    return jsonify({"success": True, "job": job}), 202
+
+@admin_bp.route('/admin/assign_roles/status', methods=['GET'])
+def assign_roles_status():
+    if session.get('role') != 'admin':
+        return jsonify({"success": False, "message": "Unauthorized"}), 401
+    return jsonify({"success": True, "job": job_queue.latest('assign_roles', 'pending')}), 200
+
+@admin_bp.route('/admin/recommendations/refresh', methods=['POST'])
+def refresh_recommendations():
+    """Queues the course recommendation refresh (see recommendations.py); ?force=1 regenerates every profile."""
+    if session.get('role') != 'admin':
+        return jsonify({"success": False, "message": "Unauthorized"}), 401
+    target = 'force' if request.args.get('force') == '1' else 'all'
+    job = job_queue.enqueue('refresh_recommendations', target, force=True)
+    return jsonify({"success": True, "job": job}), 202
+
+@admin_bp.route('/admin/recommendations/status', methods=['GET'])
+def refresh_recommendations_status():
+    if session.get('role') != 'admin':
+        return jsonify({"success": False, "message": "Unauthorized"}), 401
+    target = 'force' if request.args.get('force') == '1' else 'all'
+    return jsonify({"success": True, "job": job_queue.latest('refresh_recommendations', target)}), 200
+
+@admin_bp.route('/admin/course_catalog', methods=['GET'])
+def course_catalog_stats():
+    """Courses per skill as the recommender sees them; ?reload=1 re-reads the course table first."""
+    if session.get('role') != 'admin':
+        return jsonify({"success": False, "message": "Unauthorized"}), 401
+    if request.args.get('reload') == '1':
+        course_catalog.load()
+    else:
+        course_catalog.names()  # loads it if needed
+    return jsonify({"success": True, "catalog": course_catalog.stats()}), 200
+
+@admin_bp.route('/admin/ai_report/<emp_code>/status')
+def ai_report_status(emp_code):
+    if session.get('role') != 'admin':
+        return jsonify({"success": False, "message": "Unauthorized"}), 401
+    job = job_queue.latest('employee_analysis', int(emp_code))
+    if not job:
+        return jsonify({"success": False, "message": "No report has been requested for this employee."}), 404
+    job.pop('result', None)
+    return jsonify({"success": True, "job": job}), 200
+
+@admin_bp.route('/admin/ai_jobs/stats', methods=['GET'])
+def ai_job_stats():
+    if session.get('role') != 'admin':
+        return jsonify({"success": False, "message": "Unauthorized"}), 401
+    return jsonify({"success": True, "jobs": job_queue.stats()}), 200
+
+@admin_bp.route('/admin/department_analysis', methods=['POST'])
+def department_analysis():
+    """Queues AI analysis of a whole department (see department_analysis.py): JSON {"department": ...}."""
+    if session.get('role') != 'admin':
+        return jsonify({"success": False, "message": "Unauthorized"}), 401
+    department = ((request.get_json(silent=True) or {}).get('department') or '').strip()
+    if not department:
+        return jsonify({"success": False, "message": "department is required."}), 400
+    job = job_queue.enqueue('department_analysis', department, force=True)
+    return jsonify({"success": True, "job": job}), 202
+
+@admin_bp.route('/admin/department_analysis/status', methods=['GET'])
+def department_analysis_status():
+    if session.get('role') != 'admin':
+        return jsonify({"success": False, "message": "Unauthorized"}), 401
+    job = job_queue.latest('department_analysis', request.args.get('department', ''))
+    if not job:
+        return jsonify({"success": False, "message": "No analysis has been requested for this department."}), 404
+    return jsonify({"success": True, "job": job}), 200
+
+@admin_bp.route('/admin/department_analysis/export', methods=['GET'])
+def department_analysis_export():
+    """CSV of the department's stored analyses (list items separated by ' | ')."""
+    if session.get('role') != 'admin':
+        return jsonify({"success": False, "message": "Unauthorized"}), 401
+    department = request.args.get('department', '')
+    rows = department_analysis_rows(department)
+    if not rows:
+        return "No analyses found for this department.", 404
+
+    buffer = StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=ANALYSIS_EXPORT_COLUMNS)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(dict(
+            row,
+            strengths=" | ".join(row['strengths'].split("\n")),
+            roadmap=" | ".join(row['roadmap'].split("\n")),
+        ))
+    filename = "".join(c if c.isalnum() else '_' for c in department) + "_analysis.csv"
+    return Response(
+        buffer.getvalue(),
+        mimetype='text/csv',
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+@admin_bp.route('/admin/changes', methods=['GET'])
+def changes_feed():
+    """
+    Incremental sync (see change_log.py): ?since=<seq> (default 0),
+    ?limit=N (default 1000), ?entity=employee|course_assigned|assessment_marks.
+    Continue with since=next_since while has_more; resync_required means
+    the entries after `since` were pruned and a full export is needed.
+    """
+    if session.get('role') != 'admin':
+        return jsonify({"success": False, "message": "Unauthorized"}), 401
+    try:
+        since = int(request.args.get('since', 0))
+        limit = int(request.args.get('limit', 1000))
+    except ValueError:
+        return jsonify({"success": False, "message": "since and limit must be integers."}), 400
+    entity = request.args.get('entity') or None
+    if since < 0 or not 0 < limit <= CHANGE_FEED_PAGE_MAX:
+        return jsonify({"success": False, "message": f"since must be >= 0 and limit between 1 and {CHANGE_FEED_PAGE_MAX}."}), 400
+    if entity and entity not in CHANGE_ENTITIES:
+        return jsonify({"success": False, "message": f"Unknown entity: {entity}"}), 400
+    return jsonify(dict(read_changes(since, limit, entity), success=True)), 200
+
 @admin_bp.route('/admin/hr_agent')
 def hr_agent_page():
     if session.get('role') == 'admin':
@@ -75,153 +246,487 @@ def search_filters_page():
 # ------------- API ROUTES -------------
 
 # ----------- AI HR Agent File Upload Logic -----------
-UPLOAD_FOLDER = 'uploads'
-ALLOWED_EXTENSIONS = {'csv', 'xlsx', 'json'}
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+ALLOWED_EXTENSIONS = {'csv', 'xlsx', 'json', 'jsonl'}
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def _invalidating_counts(updates):
+    """
+    Passes ingestion progress through, dropping the cached employee count as
+    rows land. Once the upload is done, new employees are queued for batch
+    role assignment and course recommendation refresh; both jobs are reported
+    in the final update.
+    """
+    for update in updates:
+        if update['employees_added']:
+            invalidate_employee_count()
+        if update['done'] and update['employees_added']:
+            try:
+                update['role_assignment_job'] = job_queue.enqueue('assign_roles', 'pending', force=True)['id']
+            except Exception as e:
+                print(f"Error queueing role assignment: {e}")
+            refresh_job = queue_recommendation_refresh()
+            update['recommendation_job'] = refresh_job['id'] if refresh_job else None
+        yield update
+
 @admin_bp.route('/admin/hr_agent/upload_employees', methods=['POST'])
 def upload_employees_by_agent():
+    """
+    Streams the upload into the HR agent chunk by chunk; nothing is saved to disk.
+
+    The file may be sent as multipart form data ('file' field, decoded from
+    the request stream as it arrives) or as the raw request body with
+    ?filename=... . Clients that send
+    `Accept: application/x-ndjson` receive one JSON progress line per chunk;
+    everyone else gets a single JSON response at the end.
+    """
     if session.get('role') != 'admin':
         return jsonify({"success": False, "message": "Unauthorized"}), 401
-    
-    if 'file' not in request.files:
-        return jsonify({"success": False, "message": "No file part"}), 400
-    
-    file = request.files['file']
-    if file.filename == '' or not allowed_file(file.filename):
-        return jsonify({"success": False, "message": "Invalid or no selected file"}), 400
-        
-    filename = secure_filename(file.filename)
-    filepath = os.path.join(UPLOAD_FOLDER, filename)
-    file.save(filepath)
-    
-    try:
-        ext = os.path.splitext(filepath)[1].lower()
-        if ext == '.csv': df = pd.read_csv(filepath)
-        elif ext == '.xlsx': df = pd.read_excel(filepath)
-        elif ext == '.json': df = pd.read_json(filepath)
-        else: raise ValueError("Unsupported file format")
-    except Exception as e:
-        os.remove(filepath)
-        return jsonify({"success": False, "message": f"Error reading file: {e}"}), 500
 
-    employees_added, error = hr_agent_process_file(df)
-    
-    os.remove(filepath)
+    if request.mimetype == 'multipart/form-data':
+        # Not request.files: that parses the whole form and spools large files to disk.
+        try:
+            stream = MultipartFileStream(request.stream, request.mimetype_params.get('boundary', ''), 'file')
+        except ValueError as e:
+            return jsonify({"success": False, "message": f"Invalid multipart body: {e}"}), 400
+        if stream.filename is None:
+            return jsonify({"success": False, "message": "No file part"}), 400
+        # The body size includes the form's boundaries, so progress is approximate.
+        filename, total_bytes = stream.filename, request.content_length
+    else:
+        filename = request.args.get('filename', '')
+        stream, total_bytes = request.stream, request.content_length
+
+    if filename == '' or not allowed_file(filename):
+        return jsonify({"success": False, "message": "Invalid or no selected file"}), 400
 
-    if error:
-        return jsonify({"success": False, "message": f"Error processing data: {error}"}), 500
-        
-    return jsonify({"success": True, "message": f"AI HR Agent successfully onboarded {employees_added} new employees."}), 200
+    extension = filename.rsplit('.', 1)[1].lower()
+    updates = _invalidating_counts(stream_ingest(stream, extension, total_bytes=total_bytes))
+
+    if request.accept_mimetypes.best == 'application/x-ndjson':
+        return Response(
+            stream_with_context(json.dumps(update) + "\n" for update in updates),
+            mimetype='application/x-ndjson'
+        )
+
+    update = None
+    for update in updates:
+        pass
+    if update is None:
+        return jsonify({"success": False, "message": "The upload produced no result."}), 500
+    status = 200 if update['success'] else 500
+    return jsonify({"success": update['success'], "message": update['message'], "report": update}), status
+
+LIST_DEFAULT_FIELDS = ['id', 'NAME', 'DEPARTMENT', 'ROLE']
+LIST_SORT_COLUMNS = ['id', 'NAME', 'DEPARTMENT', 'ROLE']
+LIST_DEFAULT_PAGE_SIZE = 50
+LIST_MAX_PAGE_SIZE = 500
+
+# The total row count is cached briefly; add/delete/upload also invalidate it.
+employee_count_cache = LRUCache(max_entries=1, ttl=int(os.getenv('EMPLOYEE_COUNT_TTL', '60')))
+
+def invalidate_employee_count():
+    employee_count_cache.delete('total')
+
+def _cached_employee_count(cursor):
+    total = employee_count_cache.get('total')
+    if total is None:
+        cursor.execute("SELECT COUNT(*) AS total FROM employee")
+        total = cursor.fetchone()['total']
+        employee_count_cache.set('total', total)
+    return total
+
+def _encode_cursor(sort_value, emp_id):
+    raw = json.dumps([sort_value, emp_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+def _decode_cursor(token):
+    try:
+        sort_value, emp_id = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+        return sort_value, int(emp_id)
+    except Exception:
+        raise ValueError("Invalid cursor.")
+
+def _keyset_condition(sort, descending, sort_value, emp_id):
+    """
+    WHERE clause that continues after (sort_value, emp_id) in ORDER BY sort, id.
+    MySQL sorts NULLs first ascending and last descending, so NULL sort values
+    need their own branch; written this way an index on (sort) can be used.
+    """
+    if sort == 'id':
+        return ("id < %s", [emp_id]) if descending else ("id > %s", [emp_id])
+    if descending:
+        if sort_value is None:
+            return (f"{sort} IS NULL AND id < %s", [emp_id])
+        return (f"({sort} < %s OR ({sort} = %s AND id < %s) OR {sort} IS NULL)", [sort_value, sort_value, emp_id])
+    if sort_value is None:
+        return (f"(({sort} IS NULL AND id > %s) OR {sort} IS NOT NULL)", [emp_id])
+    return (f"({sort} > %s OR ({sort} = %s AND id > %s))", [sort_value, sort_value, emp_id])
 
 # ----------- Employee Data Endpoints -----------
 @admin_bp.route('/admin/list_employees', methods=['GET'])
 def list_employees():
+    """
+    Keyset-paginated employee list.
+      limit   page size (default 50, max 500)
+      sort    id | NAME | DEPARTMENT | ROLE (default id), order asc | desc
+      fields  comma-separated projection (id is always included)
+      cursor  opaque token from the previous page's next_cursor
+    """
     if session.get('role') != 'admin':
         return jsonify({"success": False, "message": "Unauthorized"}), 401
+
+    try:
+        limit = min(max(int(request.args.get('limit', LIST_DEFAULT_PAGE_SIZE)), 1), LIST_MAX_PAGE_SIZE)
+        sort = {col.upper(): col for col in LIST_SORT_COLUMNS}.get(request.args.get('sort', 'id').upper())
+        if sort is None:
+            raise ValueError(f"Cannot sort by {request.args.get('sort')}.")
+        descending = request.args.get('order', 'asc').lower() == 'desc'
+        fields = _parse_report_columns(request.args.get('fields', '')) if request.args.get('fields') else list(LIST_DEFAULT_FIELDS)
+        if 'id' not in fields:
+            fields.insert(0, 'id')
+        token = request.args.get('cursor')
+        after = _decode_cursor(token) if token else None
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    select_fields = fields if sort in fields else fields + [sort]
+    query = f"SELECT {', '.join(select_fields)} FROM employee"
+    params = []
+    if after:
+        condition, params = _keyset_condition(sort, descending, *after)
+        query += f" WHERE {condition}"
+    direction = "DESC" if descending else "ASC"
+    order_by = f"id {direction}" if sort == 'id' else f"{sort} {direction}, id {direction}"
+    query += f" ORDER BY {order_by} LIMIT %s"
+    params.append(limit + 1)
+
     conn = get_db_connection()
     try:
         with conn.cursor() as cursor:
-            cursor.execute("SELECT id, NAME, DEPARTMENT, ROLE FROM employee")
+            cursor.execute(query, params)
             employees = cursor.fetchall()
-        return jsonify({"success": True, "employees": employees}), 200
+            total = _cached_employee_count(cursor)
     finally:
         conn.close()
 
+    has_more = len(employees) > limit
+    employees = employees[:limit]
+    next_cursor = _encode_cursor(employees[-1][sort], employees[-1]['id']) if has_more else None
+    if sort not in fields:
+        for employee in employees:
+            employee.pop(sort, None)
+
+    return jsonify({
+        "success": True,
+        "employees": employees,
+        "next_cursor": next_cursor,
+        "has_more": has_more,
+        "total": total,
+        "limit": limit,
+        "sort": sort,
+        "order": direction.lower()
+    }), 200
+
+SEARCH_DEFAULT_PAGE_SIZE = 50
+SEARCH_MAX_PAGE_SIZE = 200
+
 @admin_bp.route('/admin/search_employees', methods=['GET'])
 def search_employees():
+    """
+    Multi-criteria employee search against the in-process index (search_index.py).
+      name        prefix match on any name token, fuzzy fallback for typos (fuzzy=1 forces it)
+      department  exact, case-insensitive
+      role        exact, case-insensitive
+      skill_gap   score filters, e.g. "PYTHON<40, HTML>=60" (a bare "PYTHON" means < 50)
+      page, page_size
+    """
     if session.get('role') != 'admin':
         return jsonify({"success": False, "message": "Unauthorized"}), 401
     
-    department = request.args.get('department', '')
-    
-    conn = get_db_connection()
+    started = time.perf_counter()
     try:
-        with conn.cursor() as cursor:
-            query = "SELECT id, NAME, DEPARTMENT, ROLE FROM employee WHERE 1=1"
-            params = []
-            
-            if department:
-                query += " AND DEPARTMENT LIKE %s"
-                params.append(f"%{department}%")
-            
-            cursor.execute(query, params)
-            employees = cursor.fetchall()
-        
-        return jsonify({"success": True, "employees": employees}), 200
+        skill_filters = parse_skill_filters(request.args.get('skill_gap', ''))
+        page = max(int(request.args.get('page', 1)), 1)
+        page_size = min(max(int(request.args.get('page_size', SEARCH_DEFAULT_PAGE_SIZE)), 1), SEARCH_MAX_PAGE_SIZE)
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    try:
+        employee_index.refresh_if_stale()
+        employees, total = employee_index.search(
+            name=request.args.get('name', '').strip(),
+            fuzzy=request.args.get('fuzzy') == '1',
+            department=request.args.get('department', '').strip(),
+            role=request.args.get('role', '').strip(),
+            skill_filters=skill_filters,
+            page=page,
+            page_size=page_size
+        )
     except Exception as e:
         return jsonify({"success": False, "message": str(e)}), 500
-    finally:
-        conn.close()
+
+    return jsonify({
+        "success": True,
+        "employees": employees,
+        "total": total,
+        "page": page,
+        "page_size": page_size,
+        "took_ms": round((time.perf_counter() - started) * 1000, 3),
+        "index": employee_index.stats()
+    }), 200
 
 # ----------- Dashboard & Report Endpoints -----------
 @admin_bp.route('/admin/dashboard_stats', methods=['GET'])
 def dashboard_stats():
+    """Served from the materialized summary tables (dashboard_summary.py), not a full scan."""
     if session.get('role') != 'admin':
         return jsonify({"success": False, "message": "Unauthorized"}), 401
-    conn = get_db_connection()
     try:
-        with conn.cursor() as cursor:
-            cursor.execute("SELECT DEPARTMENT, COUNT(*) as count FROM employee GROUP BY DEPARTMENT")
-            progress_by_dept = cursor.fetchall()
-            cursor.execute("SELECT COUNT(*) as total_employees FROM employee")
-            total_employees = cursor.fetchone()['total_employees']
-        chart_data = {
-            "labels": [dept['DEPARTMENT'] for dept in progress_by_dept if dept['DEPARTMENT']],
-            "data": [dept['count'] for dept in progress_by_dept if dept['DEPARTMENT']]
-        }
-        stats = {"total_employees": total_employees, "learning_progress_chart": chart_data}
-        return jsonify({"success": True, "stats": stats}), 200
-    finally:
-        conn.close()
+        summary = read_summary()
+    except Exception as e:
+        return jsonify({"success": False, "message": str(e)}), 500
+
+    named_departments = [dept for dept in summary['departments'] if dept['department']]
+    chart_data = {
+        "labels": [dept['department'] for dept in named_departments],
+        "data": [dept['employees'] for dept in named_departments]
+    }
+    stats = dict(summary, learning_progress_chart=chart_data)
+    return jsonify({"success": True, "stats": stats}), 200
+
+@admin_bp.route('/admin/dashboard_stats/rebuild', methods=['POST'])
+def rebuild_dashboard_stats():
+    """Recomputes the summary tables from scratch (e.g. after manual SQL edits)."""
+    if session.get('role') != 'admin':
+        return jsonify({"success": False, "message": "Unauthorized"}), 401
+    try:
+        rebuild_summary()
+    except Exception as e:
+        return jsonify({"success": False, "message": str(e)}), 500
+    return jsonify({"success": True, "message": "Dashboard statistics rebuilt."}), 200
 
 @admin_bp.route('/admin/agent_metrics', methods=['GET'])
 def agent_metrics():
     if session.get('role') != 'admin':
         return jsonify({"success": False, "message": "Unauthorized"}), 401
-    metrics = {
-        "profile_agent": {"queue": 3, "latency_ms": 120, "error_rate": "2%"},
-        "assessment_agent": {"queue": 5, "latency_ms": 200, "error_rate": "0.5%"},
-        "recommender_agent": {"queue": 2, "latency_ms": 150, "error_rate": "1%"},
-        "tracker_agent": {"queue": 0, "latency_ms": 80, "error_rate": "0%"}
-    }
-    return jsonify({"success": True, "metrics": metrics}), 200
+    snapshot = agent_metrics_registry.snapshot()
+    return jsonify({
+        "success": True,
+        "metrics": snapshot["agents"],
+        "pid": snapshot["pid"],
+        "uptime_seconds": snapshot["uptime_seconds"],
+        "window": snapshot["window"],
+        "llm_guard": llm_guard.stats(),
+    }), 200
+
+@admin_bp.route('/admin/agent_metrics/prometheus', methods=['GET'])
+def agent_metrics_prometheus():
+    # Scrapers have no session; they may authenticate with METRICS_TOKEN instead.
+    token = os.getenv('METRICS_TOKEN')
+    authorized = session.get('role') == 'admin' or (
+        token and request.headers.get('Authorization') == f"Bearer {token}"
+    )
+    if not authorized:
+        return Response("Unauthorized\n", status=401, mimetype='text/plain')
+    return Response(agent_metrics_registry.prometheus(), mimetype='text/plain; version=0.0.4')
+
+@admin_bp.route('/admin/agent_metrics/reset', methods=['POST'])
+def agent_metrics_reset():
+    if session.get('role') != 'admin':
+        return jsonify({"success": False, "message": "Unauthorized"}), 401
+    agent_metrics_registry.reset()
+    return jsonify({"success": True}), 200
+
+@admin_bp.route('/admin/db_pool_stats', methods=['GET'])
+def db_pool_stats():
+    if session.get('role') != 'admin':
+        return jsonify({"success": False, "message": "Unauthorized"}), 401
+    return jsonify({"success": True, "pool": pool_stats()}), 200
+
+@admin_bp.route('/admin/profiling', methods=['GET'])
+def profiling_stats():
+    """Per-route request timings (see profiling.py). ?recent=N recent requests."""
+    if session.get('role') != 'admin':
+        return jsonify({"success": False, "message": "Unauthorized"}), 401
+    recent = max(0, min(int(request.args.get('recent', 20)), 200))
+    return jsonify({"success": True, "profiling": request_profiler.snapshot(recent=recent)}), 200
+
+@admin_bp.route('/admin/profiling', methods=['POST'])
+def update_profiling():
+    """{"enabled": true|false} turns profiling of every request on/off in this process; {"reset": true} clears the stats."""
+    if session.get('role') != 'admin':
+        return jsonify({"success": False, "message": "Unauthorized"}), 401
+    data = request.get_json(silent=True) or {}
+    if 'enabled' in data:
+        request_profiler.set_enabled(data['enabled'])
+    if data.get('reset'):
+        request_profiler.reset()
+    return jsonify({"success": True, "enabled": request_profiler.enabled}), 200
+
+@admin_bp.route('/admin/profiling/files/<path:filename>', methods=['GET'])
+def profiling_file(filename):
+    """Downloads a .prof (cProfile) or .folded (flame graph) dump."""
+    if session.get('role') != 'admin':
+        return jsonify({"success": False, "message": "Unauthorized"}), 401
+    return send_from_directory(os.path.abspath(PROFILE_DIR), filename, as_attachment=True)
+
+@admin_bp.route('/admin/profile_cache_stats', methods=['GET'])
+def profile_cache_stats():
+    if session.get('role') != 'admin':
+        return jsonify({"success": False, "message": "Unauthorized"}), 401
+    return jsonify({"success": True, "cache": profile_cache.stats()}), 200
+
+@admin_bp.route('/admin/ai_cache_stats', methods=['GET'])
+def ai_cache_stats():
+    if session.get('role') != 'admin':
+        return jsonify({"success": False, "message": "Unauthorized"}), 401
+    return jsonify({"success": True, "cache": ai_cache.stats(), "stale_cache": ai_stale_cache.stats()}), 200
+
+@admin_bp.route('/admin/ai_cache/clear', methods=['POST'])
+def clear_ai_cache():
+    if session.get('role') != 'admin':
+        return jsonify({"success": False, "message": "Unauthorized"}), 401
+    ai_cache.clear()
+    ai_stale_cache.clear()
+    return jsonify({"success": True, "message": "AI response cache cleared."}), 200
+
+# Columns that can be requested with ?columns=...; all of them by default.
+REPORT_COLUMNS = ['id', 'NAME', 'DEPARTMENT', 'ROLE'] + SKILL_COLUMNS
+# Rows pulled from the server-side cursor per CSV write.
+REPORT_FETCH_ROWS = int(os.getenv('REPORT_FETCH_ROWS', '1000'))
+
+def _parse_report_columns(raw):
+    """Maps ?columns=id,name,python to known column names; raises ValueError on unknown ones."""
+    if not raw:
+        return list(REPORT_COLUMNS)
+    known = {col.upper(): col for col in REPORT_COLUMNS}
+    columns = []
+    for name in raw.split(','):
+        name = name.strip()
+        if not name:
+            continue
+        if name.upper() not in known:
+            raise ValueError(f"Unknown column: {name}")
+        if known[name.upper()] not in columns:
+            columns.append(known[name.upper()])
+    if not columns:
+        raise ValueError("No columns selected.")
+    return columns
+
+def _release_on_close(response, conn, cursor):
+    """
+    Closes the report cursor and gives the connection back when the response
+    is closed. The body generators also close them once drained, but they
+    never run for HEAD requests or when the client goes away before the
+    first chunk. Closing twice is harmless.
+    """
+    def release():
+        try:
+            cursor.close()
+        except Exception as e:
+            print(f"Error closing report cursor: {e}")
+        conn.close()
+
+    response.call_on_close(release)
+    return response
+
+def _stream_csv(conn, cursor, first_row, columns, compress):
+    """Writes rows to CSV as they come off the unbuffered cursor; memory use is one fetch batch."""
+    buffer = StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns)
+    compressor = zlib.compressobj(wbits=31) if compress else None  # wbits=31 -> gzip container
+
+    def drain():
+        data = buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+        return compressor.compress(data) if compressor else data
+
+    try:
+        writer.writeheader()
+        writer.writerow(first_row)
+        while True:
+            rows = cursor.fetchmany(REPORT_FETCH_ROWS)
+            if not rows:
+                break
+            writer.writerows(rows)
+            chunk = drain()
+            if chunk:
+                yield chunk
+        chunk = drain()
+        if compressor:
+            chunk += compressor.flush()
+        if chunk:
+            yield chunk
+    finally:
+        cursor.close()
+        conn.close()
 
 @admin_bp.route('/admin/generate_report', methods=['GET'])
 def generate_report():
+    """
+    Streams the report as CSV straight from a server-side cursor.
+    Optional: ?columns=id,NAME,PYTHON (column selection), ?gzip=1 (CSV only)
+    and ?format=parquet|arrow for typed, compressed columnar files (see
+    report_export.py).
+    """
     if session.get('role') != 'admin':
         return jsonify({"success": False, "message": "Unauthorized"}), 401
     report_type = request.args.get('type', 'all')
     target = request.args.get('target', '')
+    export_format = request.args.get('format', 'csv').lower()
+    compress = request.args.get('gzip') == '1' and export_format == 'csv'
+    if export_format != 'csv' and export_format not in COLUMNAR_FORMATS:
+        return jsonify({"success": False, "message": f"Unknown format: {export_format}"}), 400
+    try:
+        columns = _parse_report_columns(request.args.get('columns', ''))
+        if export_format != 'csv':
+            check_columnar_support()
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    except ColumnarExportUnavailable as e:
+        return jsonify({"success": False, "message": str(e)}), 501
+
+    query = f"SELECT {', '.join(columns)} FROM employee"
+    params = []
+    if report_type == 'department' and target:
+        query += " WHERE DEPARTMENT = %s"
+        params.append(target)
+    elif report_type == 'individual' and target:
+        query += " WHERE id = %s"
+        params.append(target)
+
     conn = get_db_connection()
     try:
-        with conn.cursor() as cursor:
-            query = "SELECT * FROM employee"
-            params = []
-            if report_type == 'department' and target:
-                query += " WHERE DEPARTMENT = %s"
-                params.append(target)
-            elif report_type == 'individual' and target:
-                query += " WHERE id = %s"
-                params.append(target)
-
-            cursor.execute(query, tuple(params))
-            rows = cursor.fetchall()
-
-        if not rows:
-            return "No records found for this report.", 404
-        
-        output = StringIO()
-        writer = csv.DictWriter(output, fieldnames=rows[0].keys())
-        writer.writeheader()
-        writer.writerows(rows)
-        return Response(output.getvalue(), mimetype='text/csv',
-                        headers={"Content-Disposition": f"attachment; filename={report_type}_report.csv"})
-    finally:
+        # SSDictCursor leaves the result set on the server and fetches it incrementally.
+        cursor = conn.cursor(pymysql.cursors.SSDictCursor)
+        cursor.execute(query, tuple(params))
+        first_row = cursor.fetchone()
+    except Exception:
+        conn.close()
+        raise
+
+    if not first_row:
+        cursor.close()
         conn.close()
+        return "No records found for this report.", 404
+
+    if export_format != 'csv':
+        extension, mimetype = COLUMNAR_FORMATS[export_format]
+        return _release_on_close(Response(
+            stream_columnar(conn, cursor, first_row, columns, export_format),
+            mimetype=mimetype,
+            headers={"Content-Disposition": f"attachment; filename={report_type}_report.{extension}"}
+        ), conn, cursor)
+
+    filename = f"{report_type}_report.csv" + (".gz" if compress else "")
+    return _release_on_close(Response(
+        _stream_csv(conn, cursor, first_row, columns, compress),
+        mimetype='application/gzip' if compress else 'text/csv',
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    ), conn, cursor)
 
 # --- UPDATED: API ROUTE TO ADD A SINGLE EMPLOYEE WITH MARKS ---
 @admin_bp.route('/admin/add_employee', methods=['POST'])
@@ -272,7 +777,17 @@ def add_employee():
                 "INSERT INTO credentials (emp_id, username, password, email, is_admin) VALUES (%s, %s, %s, %s, 0)",
                 (new_emp_id, username, password, email)
             )
+            record_employees_added(cursor, [marks])
+            record_changes(cursor, [employee_change(new_emp_id, 'insert', dict(marks, NAME=name, DEPARTMENT=None, ROLE=None))])
         conn.commit()
+        invalidate_employee_count()
+        invalidate_employee_profile(new_emp_id)
+        index_employees([dict(marks, id=new_emp_id, NAME=name, DEPARTMENT=None, ROLE=None)])
+        # The role job refreshes recommendations once the new employee has a role.
+        try:
+            job_queue.enqueue('assign_roles', 'pending', force=True)
+        except Exception as e:
+            print(f"Error queueing role assignment: {e}")
         return jsonify({"success": True, "message": "Employee added successfully!"}), 201
     except Exception as e:
         conn.rollback()
@@ -294,11 +809,25 @@ def delete_employee():
     conn = get_db_connection()
     try:
         with conn.cursor() as cursor:
+            # Lock the row first so the dashboard summary can subtract exactly what is deleted.
+            cursor.execute(
+                f"SELECT DEPARTMENT, ROLE, {', '.join(SKILL_COLUMNS)} FROM employee WHERE id = %s FOR UPDATE",
+                (emp_id,)
+            )
+            deleted = cursor.fetchone()
             result = cursor.execute("DELETE FROM employee WHERE id = %s", (emp_id,))
+            if result > 0 and deleted:
+                record_employees_removed(cursor, [deleted])
+            if result > 0:
+                record_changes(cursor, [employee_change(emp_id, 'delete')])
             
         conn.commit()
 
         if result > 0:
+            invalidate_employee_ai_cache(emp_id)
+            invalidate_employee_profile(emp_id)
+            invalidate_employee_count()
+            unindex_employee(emp_id)
             return jsonify({"success": True, "message": "Employee deleted successfully."}), 200
         else:
             return jsonify({"success": False, "error": "Employee not found."}), 404
@@ -306,4 +835,53 @@ def delete_employee():
         conn.rollback()
         return jsonify({"success": False, "error": str(e)}), 500
     finally:
-        conn.close()
\ No newline at end of file
+        conn.close()
+
+# --- BATCH ASSESSMENT RESULTS (e.g. from an external grading system) ---
+@admin_bp.route('/admin/assessment_results', methods=['POST'])
+def upload_assessment_results():
+    """
+    {"results": [{"emp_id": 12, "course_name": "Python", "marks": 8}, ...]}
+    Stores every result and updates the matching course assignments in one
+    transaction with a fixed number of statements (see course_assignments.py).
+    """
+    if session.get('role') != 'admin':
+        return jsonify({"success": False, "error": "Unauthorized"}), 401
+
+    entries = (request.get_json(silent=True) or {}).get('results')
+    if not isinstance(entries, list) or not entries:
+        return jsonify({"success": False, "error": "results must be a non-empty list."}), 400
+    if len(entries) > ASSESSMENT_BATCH_MAX:
+        return jsonify({"success": False, "error": f"At most {ASSESSMENT_BATCH_MAX} results per request."}), 400
+
+    results = []
+    for i, entry in enumerate(entries):
+        try:
+            emp_id, course_name, marks = int(entry['emp_id']), str(entry['course_name']), int(entry['marks'])
+        except (KeyError, TypeError, ValueError):
+            return jsonify({"success": False, "error": f"Result {i}: emp_id, course_name and marks are required."}), 400
+        if not course_name or not 0 <= marks <= ASSESSMENT_MAX_SCORE:
+            return jsonify({"success": False, "error": f"Result {i}: marks must be between 0 and {ASSESSMENT_MAX_SCORE}."}), 400
+        results.append((emp_id, course_name, marks))
+
+    ensure_course_assignment_key()
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            outcomes = record_assessment_results(cursor, results)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        return jsonify({"success": False, "error": str(e)}), 500
+    finally:
+        conn.close()
+
+    for emp_id in {emp_id for emp_id, _, _ in results}:
+        invalidate_employee_ai_cache(emp_id)
+        invalidate_employee_profile(emp_id)
+    return jsonify({
+        "success": True,
+        "stored": len(outcomes),
+        "passed": sum(o["passed"] for o in outcomes),
+        "not_assigned": [o for o in outcomes if not o["assigned"]],
+    }), 200
\ No newline at end of file
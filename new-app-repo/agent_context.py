@@ -0,0 +1,256 @@
+import os
+import re
+from db import get_db_connection, SKILL_COLUMNS
+from employee_profiles import get_employee_profiles
+from course_catalog import course_catalog
+from course_assignments import ASSESSMENT_MAX_SCORE, ASSESSMENT_PASSING_SCORE
+
+# ----------- Agent Context Assembly -----------
+# The employee agents used to send the LLM nothing but the employee id, so it
+# made the answers up (and people asked again). Instead, an agent gets the
+# employee's real data:
+#   profile (name, role, department, skill scores) from the profile cache,
+#   course assignments and assessment marks in one UNION query,
+# rendered as a compact prompt that stays under AGENT_PROMPT_TOKEN_BUDGET.
+# Questions the data answers by itself (progress %, pending or completed
+# courses, scores) are answered without calling the LLM at all.
+
+AGENT_PROMPT_TOKEN_BUDGET = int(os.getenv('AGENT_PROMPT_TOKEN_BUDGET', '600'))
+# Rough size of a token for budgeting (English text averages ~4 characters).
+CHARS_PER_TOKEN = 4
+
+STATUS_ORDER = {'In Progress': 0, 'Not Started': 1, 'Completed': 2}
+
+# Keyword patterns for questions answered straight from the data. Each agent
+# only accepts the intents it owns (see EMPLOYEE_AGENTS in ai_agents.py), and
+# words with other common meanings ("next", "left", "done") are left out so
+# that advice questions still reach the LLM.
+DATA_INTENTS = [
+    ('pending', re.compile(r'\b(pending|remaining|not started|unfinished|incomplete)\b', re.I)),
+    ('completed', re.compile(r'\b(completed|finished|passed)\b', re.I)),
+    ('scores', re.compile(r'\b(scores?|marks?|results?|grades?|assessments?)\b', re.I)),
+    ('progress', re.compile(r'(\bprogress\b|\bpercent|%|\bhow far\b)', re.I)),
+]
+
+
+def fetch_employee_contexts(emp_ids):
+    """
+    {emp_id: context} for the given employees (unknown ids are left out).
+    Profiles come from the profile cache; assignments and marks for all of
+    the employees are read with a single query.
+    """
+    ids = list(dict.fromkeys(int(emp_id) for emp_id in emp_ids))
+    if not ids:
+        return {}
+    placeholders = ", ".join(["%s"] * len(ids))
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            profiles = get_employee_profiles(ids, cursor)
+            cursor.execute(
+                f"SELECT emp_id, 'course' AS kind, id AS seq, course_name, status, progress, NULL AS marks "
+                f"FROM course_assigned WHERE emp_id IN ({placeholders}) "
+                f"UNION ALL "
+                f"SELECT emp_id, 'mark' AS kind, id AS seq, course_name, NULL, NULL, marks_obtained "
+                f"FROM assessment_marks WHERE emp_id IN ({placeholders}) "
+                f"ORDER BY emp_id, kind, seq",
+                ids + ids
+            )
+            rows = cursor.fetchall()
+    finally:
+        conn.close()
+
+    contexts = {emp_id: _new_context(profile) for emp_id, profile in profiles.items()}
+    for row in rows:
+        context = contexts.get(int(row['emp_id']))
+        if context is None:
+            continue
+        if row['kind'] == 'course':
+            context["courses"].append({
+                "name": row['course_name'],
+                "status": row['status'] or 'Not Started',
+                "progress": int(row['progress'] or 0),
+            })
+        else:
+            marks = int(row['marks'] or 0)
+            attempts = context["assessments"].setdefault(
+                row['course_name'], {"attempts": 0, "best": 0, "last": 0}
+            )
+            attempts["attempts"] += 1
+            attempts["best"] = max(attempts["best"], marks)
+            attempts["last"] = marks
+    for context in contexts.values():
+        _summarize(context)
+    return contexts
+
+
+def fetch_employee_context(emp_id):
+    return fetch_employee_contexts([emp_id]).get(int(emp_id))
+
+
+def _new_context(profile):
+    return {
+        "employee": {"name": profile.get('NAME'), "role": profile.get('ROLE'), "department": profile.get('DEPARTMENT')},
+        "skills": {skill: float(profile.get(skill) or 0) for skill in SKILL_COLUMNS},
+        "courses": [],
+        "assessments": {},
+    }
+
+
+def _summarize(context):
+    courses = context["courses"]
+    courses.sort(key=lambda course: (STATUS_ORDER.get(course["status"], 3), -course["progress"], course["name"]))
+    counts = {status: sum(course["status"] == status for course in courses) for status in STATUS_ORDER}
+    context["progress"] = {
+        "assigned": len(courses),
+        "completed": counts['Completed'],
+        "in_progress": counts['In Progress'],
+        "not_started": counts['Not Started'],
+        # Completed courses count as 100% whatever their stored progress.
+        "percent": round(sum(100 if c["status"] == 'Completed' else c["progress"] for c in courses) / len(courses))
+        if courses else 0,
+    }
+    for result in context["assessments"].values():
+        result["passed"] = result["best"] >= ASSESSMENT_PASSING_SCORE
+
+
+# ----------- Prompt Rendering -----------
+
+def _employee_section(context):
+    employee = context["employee"]
+    return "Employee", [
+        f"{employee['name'] or 'Unknown'}, {employee['role'] or 'no role yet'} "
+        f"({employee['department'] or 'no department yet'})"
+    ]
+
+
+def _skills_section(context, weakest_first=False):
+    skills = sorted(context["skills"].items(), key=lambda item: item[1], reverse=not weakest_first)
+    return "Skill scores out of 100" + (" (weakest first)" if weakest_first else ""), [
+        ", ".join(f"{skill} {score:g}" for skill, score in skills)
+    ]
+
+
+def _progress_section(context):
+    p = context["progress"]
+    return "Progress", [
+        f"{p['assigned']} courses assigned: {p['completed']} completed, {p['in_progress']} in progress, "
+        f"{p['not_started']} not started; overall {p['percent']}%"
+    ]
+
+
+def _courses_section(context):
+    return "Courses", [f"{c['name']}: {c['status']}, {c['progress']}%" for c in context["courses"]]
+
+
+def _assessments_section(context):
+    return f"Assessments (marks out of {ASSESSMENT_MAX_SCORE}, pass mark {ASSESSMENT_PASSING_SCORE})", [
+        f"{name}: {r['attempts']} attempt(s), best {r['best']}, last {r['last']}, {'passed' if r['passed'] else 'not passed'}"
+        for name, r in sorted(context["assessments"].items())
+    ]
+
+
+def _catalog_section(context):
+    """Catalog courses for the three weakest skills that the employee does not have yet."""
+    taken = {course["name"] for course in context["courses"]}
+    weakest = sorted(context["skills"], key=context["skills"].get)[:3]
+    lines = []
+    for skill in weakest:
+        options = [name for name in course_catalog.courses_for_skill(skill) if name not in taken]
+        if options:
+            lines.append(f"{skill}: {', '.join(options)}")
+    return "Catalog courses for the weakest skills", lines
+
+
+# Sections per agent, most important first; the budget cuts from the end.
+AGENT_SECTIONS = {
+    'profile': [_employee_section, _skills_section, _progress_section, _courses_section],
+    'assessment': [_employee_section, _assessments_section, _courses_section],
+    'recommender': [_employee_section, lambda c: _skills_section(c, weakest_first=True), _catalog_section, _courses_section],
+    'tracker': [_employee_section, _progress_section, _courses_section, _assessments_section],
+}
+
+
+def render_context(agent_type, context, budget_tokens=AGENT_PROMPT_TOKEN_BUDGET):
+    """The agent's data sections as text, cut to fit the token budget."""
+    budget = budget_tokens * CHARS_PER_TOKEN
+    out, used = [], 0
+    for section in AGENT_SECTIONS[agent_type]:
+        title, lines = section(context)
+        if not lines:
+            continue
+        header = f"{title}:"
+        if used + len(header) + len(lines[0]) + 4 > budget:
+            break
+        out.append(header)
+        used += len(header) + 1
+        for i, line in enumerate(lines):
+            if used + len(line) + 3 > budget:
+                out.append(f"- (+{len(lines) - i} more)")
+                used = budget
+                break
+            out.append(f"- {line}")
+            used += len(line) + 3
+    return "\n".join(out)
+
+
+def build_grounded_prompt(instruction, agent_type, context, question=None):
+    parts = [
+        instruction,
+        "Use only the employee data below. If it does not cover something, say so instead of guessing.",
+        "",
+        render_context(agent_type, context),
+    ]
+    if question:
+        parts += ["", f"The employee asks: {question.strip()[:500]}"]
+    return "\n".join(parts)
+
+
+# ----------- Answers From Data -----------
+
+def detect_intent(question, allowed=None):
+    """First data intent matching the question, out of `allowed` (all when None)."""
+    for intent, pattern in DATA_INTENTS:
+        if allowed is not None and intent not in allowed:
+            continue
+        if pattern.search(question or ''):
+            return intent
+    return None
+
+
+def answer_from_data(intent, context):
+    """Detail lines answering `intent` from the context alone, or None."""
+    p = context["progress"]
+    courses = context["courses"]
+    pending = [c for c in courses if c["status"] != 'Completed']
+    completed = [c for c in courses if c["status"] == 'Completed']
+
+    if intent == 'progress':
+        if not courses:
+            return ["You have no courses assigned yet"]
+        lines = [f"Overall progress: {p['percent']}% across {p['assigned']} assigned courses",
+                 f"Completed: {p['completed']}, in progress: {p['in_progress']}, not started: {p['not_started']}"]
+        lines += [f"{c['name']}: {c['status']} ({c['progress']}%)" for c in pending]
+        if pending:
+            step = pending[0]
+            lines.append(f"Next step: {'continue' if step['status'] == 'In Progress' else 'start'} {step['name']}")
+        else:
+            lines.append("All assigned courses are completed")
+        return lines
+    if intent == 'pending':
+        if not pending:
+            return ["You have no pending courses"]
+        return [f"{c['name']}: {c['status']} ({c['progress']}%)" for c in pending]
+    if intent == 'completed':
+        if not completed:
+            return ["You have not completed any courses yet"]
+        return [f"{c['name']}: completed" for c in completed]
+    if intent == 'scores':
+        if not context["assessments"]:
+            return ["You have not taken any assessments yet"]
+        return [
+            f"{name}: best {r['best']}/{ASSESSMENT_MAX_SCORE}, last {r['last']}/{ASSESSMENT_MAX_SCORE} "
+            f"after {r['attempts']} attempt(s), {'passed' if r['passed'] else 'not passed yet'}"
+            for name, r in sorted(context["assessments"].items())
+        ]
+    return None
@@ -1,38 +1,249 @@
+from __future__ import annotations
+
 import os
-from langchain_google_genai import ChatGoogleGenerativeAI
-import pandas as pd
-from db import get_db_connection
+import hashlib
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import time
+from typing import TYPE_CHECKING
+from db import get_db_connection, SKILL_COLUMNS
+from cache import make_cache
+from jobs import register_job_type
+from search_index import index_employees
+from employee_profiles import get_employee_profile
+from agent_context import fetch_employee_context, build_grounded_prompt, detect_intent, answer_from_data
+from dashboard_summary import record_employees_added
+from change_log import record_changes, employee_change
+from metrics import agent_metrics, instrument_agent, current_agent, mark_current_call_failed
+from resilience import llm_guard, LLMUnavailableError
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 # Use your Gemini API Key (set as environment variable)
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY", "YOUR_API_KEY_HERE")
 
-# Initialize the LLM
-llm = ChatGoogleGenerativeAI(
-    model="gemini-1.5-flash",
-    temperature=0.3
-)
+LLM_MODEL = "gemini-1.5-flash"
+LLM_TEMPERATURE = 0.3
+
+# ----------- Lazy LLM Client -----------
+# langchain and pandas are only imported when first needed, so workers that
+# serve logins and course pages never load them. The gunicorn config can
+# import them in the master (preload_heavy_modules) to share the pages
+# copy-on-write between workers.
+_llm = None
+_llm_lock = threading.Lock()
+
+def get_llm():
+    """Returns the shared LLM client, creating it on first use."""
+    global _llm
+    if _llm is None:
+        with _llm_lock:
+            if _llm is None:
+                from langchain_google_genai import ChatGoogleGenerativeAI
+                _llm = ChatGoogleGenerativeAI(
+                    model=LLM_MODEL,
+                    temperature=LLM_TEMPERATURE
+                )
+    return _llm
+
+def set_llm(client):
+    """Replaces the LLM client, e.g. with the benchmark's fake model."""
+    global _llm
+    with _llm_lock:
+        _llm = client
+
+def preload_heavy_modules():
+    """
+    Imports langchain and pandas without creating the client (its network
+    channels must not be shared across fork). Meant for the gunicorn master.
+    """
+    import pandas  # noqa: F401
+    import langchain_google_genai  # noqa: F401
+
+# ----------- AI Response Cache -----------
+# Set AI_CACHE_BACKEND=sqlite (and optionally AI_CACHE_PATH) so every gunicorn
+# worker on the host shares cached responses.
+ai_cache = make_cache('AI_CACHE', default_max_entries=2048, default_ttl=6 * 3600)
+# Long-lived copy of every response, only read when the LLM is unavailable
+# (bulkhead full, circuit open or timed out).
+ai_stale_cache = make_cache('AI_STALE_CACHE', default_max_entries=4096, default_ttl=7 * 24 * 3600)
+
+def _ai_cache_key(prompt: str):
+    """Whitespace-insensitive key so re-indented prompts map to the same entry."""
+    normalized = " ".join(prompt.split())
+    return hashlib.sha256(f"{LLM_MODEL}|{LLM_TEMPERATURE}|{normalized}".encode("utf-8")).hexdigest()
+
+def employee_cache_tag(emp_id):
+    return f"emp:{emp_id}"
+
+def invalidate_employee_ai_cache(emp_id):
+    """Drops every cached AI response built from this employee's data."""
+    try:
+        ai_cache.invalidate_tag(employee_cache_tag(emp_id))
+        ai_stale_cache.invalidate_tag(employee_cache_tag(emp_id))
+    except Exception as e:
+        print(f"Error invalidating AI cache for employee {emp_id}: {e}")
+
+def _clean_ai_text(text: str):
+    """Removes backticks and quotes from model output."""
+    return text.replace("```", "").replace('"', '').replace("'", "")
+
+def _cache_response(key, text, cache_tags):
+    try:
+        ai_cache.set(key, text, tags=cache_tags)
+        ai_stale_cache.set(key, text, tags=cache_tags)
+    except Exception as e:
+        print(f"AI cache write failed: {e}")
 
-def call_ai(prompt: str):
-    """Utility function to call the AI model and clean the response."""
+def _stale_response(agent, key, error):
+    """Records the rejection and returns a stale cached answer, if there is one."""
+    try:
+        stale = ai_stale_cache.get(key)
+    except Exception as e:
+        print(f"AI cache read failed: {e}")
+        stale = None
+    agent_metrics.record_rejection(agent, error.reason, stale_served=stale is not None)
+    return stale
+
+def call_ai(prompt: str, cache_tags=()):
+    """
+    Utility function to call the AI model and clean the response.
+    Successful responses are cached; `cache_tags` lets callers invalidate them
+    later (e.g. when an employee's skills change). Every call is reported to
+    the metrics of the agent that made it. The LLM request runs through
+    llm_guard (see resilience.py); when it is rejected the last known answer
+    for the prompt is returned instead, if any.
+    """
+    agent = current_agent() or 'unattributed'
+    key = _ai_cache_key(prompt)
     try:
-        response = llm.invoke(prompt)
+        cached = ai_cache.get(key)
+    except Exception as e:
+        print(f"AI cache read failed: {e}")
+        cached = None
+    if cached is not None:
+        agent_metrics.record_cache_hit(agent, len(prompt))
+        return cached
+
+    started = time.perf_counter()
+    try:
+        response = llm_guard.call(get_llm().invoke, prompt)
         # Clean the text: remove backticks, quotes, and leading/trailing whitespace
-        clean_text = response.content.strip().replace("```", "").replace('"', '').replace("'", "")
-        return clean_text
+        clean_text = _clean_ai_text(response.content.strip())
+    except LLMUnavailableError as e:
+        stale = _stale_response(agent, key, e)
+        if stale is not None:
+            return stale
+        mark_current_call_failed()
+        return f"AI Error: {str(e)}"
     except Exception as e:
+        agent_metrics.record_llm_call(agent, time.perf_counter() - started, len(prompt), failed=True)
+        mark_current_call_failed()
         return f"AI Error: {str(e)}"
+    usage = getattr(response, 'usage_metadata', None) or {}
+    agent_metrics.record_llm_call(
+        agent, time.perf_counter() - started, len(prompt), len(response.content),
+        input_tokens=usage.get('input_tokens', 0), output_tokens=usage.get('output_tokens', 0)
+    )
+    _cache_response(key, clean_text, cache_tags)
+    return clean_text
+
+def call_ai_stream(prompt: str, cache_tags=(), agent=None):
+    """
+    Streaming counterpart of call_ai: yields cleaned text chunks as the model
+    produces them. A cached response is yielded as a single chunk, and so is
+    a stale one if llm_guard rejects the request before anything was
+    streamed. The full text is cached once the stream completes; errors are
+    raised to the caller.
+    """
+    agent = agent or current_agent() or 'unattributed'
+    key = _ai_cache_key(prompt)
+    try:
+        cached = ai_cache.get(key)
+    except Exception as e:
+        print(f"AI cache read failed: {e}")
+        cached = None
+    if cached is not None:
+        agent_metrics.record_cache_hit(agent, len(prompt))
+        yield cached
+        return
+
+    started = time.perf_counter()
+    raw_parts = []
+    parts = []
+    held = ""
+    usage = {}
+    try:
+        for chunk in llm_guard.stream(lambda: get_llm().stream(prompt)):
+            usage = getattr(chunk, 'usage_metadata', None) or usage
+            raw_parts.append(chunk.content or "")
+            # A ``` fence can be split across chunks, so trailing backticks
+            # wait for the next chunk before the text is cleaned.
+            held += chunk.content or ""
+            ready = held.rstrip('`')
+            held = held[len(ready):]
+            text = _clean_ai_text(ready)
+            if not parts:
+                text = text.lstrip()
+                if not text:
+                    continue
+                agent_metrics.record_first_token(agent, time.perf_counter() - started)
+            parts.append(text)
+            yield text
+        text = _clean_ai_text(held)
+        if parts and text:
+            parts.append(text)
+            yield text
+    except LLMUnavailableError as e:
+        if parts:
+            # Timed out mid-stream: the partial answer has already been sent.
+            agent_metrics.record_rejection(agent, e.reason)
+            raise
+        stale = _stale_response(agent, key, e)
+        if stale is None:
+            raise
+        yield stale
+        return
+    except Exception:
+        agent_metrics.record_llm_call(agent, time.perf_counter() - started, len(prompt),
+                                      len("".join(parts)), failed=True)
+        raise
+
+    # Cleaned like call_ai, which reads the same cache entry.
+    full_text = _clean_ai_text("".join(raw_parts).strip())
+    agent_metrics.record_llm_call(
+        agent, time.perf_counter() - started, len(prompt), len(full_text),
+        input_tokens=usage.get('input_tokens', 0), output_tokens=usage.get('output_tokens', 0)
+    )
+    if full_text:
+        _cache_response(key, full_text, cache_tags)
+
+# Rows per multi-row INSERT / commit in the bulk ingestion path.
+HR_BULK_BATCH_SIZE = int(os.getenv('HR_BULK_BATCH_SIZE', '1000'))
+# Only the first N rejected rows are echoed back; the count is always exact.
+MAX_REPORTED_REJECTIONS = 100
 
 # --- NEW: Fully functional version for the company_roles schema ---
-def hr_agent_process_file(df: pd.DataFrame):
+def hr_agent_process_file(df: pd.DataFrame, bulk=True, batch_size=None):
     """
     Processes a DataFrame from an uploaded file to add new employees.
     It adds records to the 'employee' and 'credentials' tables.
     The role and department are left NULL to be assigned on first login.
 
     Expected file columns: NAME, HTML, CSS, JAVASCRIPT, PYTHON, C, CPP, JAVA, SQL_TESTING, TOOLS_COURSE
+
+    By default this goes through the batched bulk path (see hr_agent_bulk_ingest);
+    bulk=False keeps the original row-by-row, single-transaction behaviour.
     """
+    if bulk:
+        report = hr_agent_bulk_ingest(df, batch_size=batch_size)
+        return report['employees_added'], report['error']
+
     conn = get_db_connection()
     employees_added = 0
+    changes = []
     
     # Standardize column names from the uploaded file
     df.columns = [col.strip().upper() for col in df.columns]
@@ -70,8 +281,14 @@ def hr_agent_process_file(df: pd.DataFrame):
                 # Insert into credentials table
                 sql_credentials = "INSERT INTO credentials (emp_id, username, password, email, is_admin) VALUES (%s, %s, %s, %s, 0)"
                 cursor.execute(sql_credentials, (new_emp_id, username, password, email))
+                changes.append(employee_change(new_emp_id, 'insert', dict(skill_values, NAME=employee_name, DEPARTMENT=None, ROLE=None)))
                 
                 employees_added += 1
+
+            record_employees_added(cursor, [
+                {col: row.get(col, 0) for col in SKILL_COLUMNS} for _, row in df.iterrows()
+            ])
+            record_changes(cursor, changes)
         
         conn.commit()
         return employees_added, None
@@ -82,34 +299,180 @@ def hr_agent_process_file(df: pd.DataFrame):
     finally:
         conn.close()
 
+def _prepare_employee_frame(df: pd.DataFrame):
+    """
+    Vectorized validation/coercion of an uploaded employee frame.
+    Returns (clean frame with NAME + SKILL_COLUMNS, rejected frame with a 'reason' column).
+    Missing skill columns/cells default to 0; non-numeric or out-of-range (0-100)
+    scores and empty names reject the row.
+    """
+    import pandas as pd
+    df.columns = [str(col).strip().upper() for col in df.columns]
+
+    names = df['NAME'].astype('string').str.strip()
+    clean = pd.DataFrame({'NAME': names}, index=df.index)
+    reason = pd.Series('', index=df.index, dtype='object')
+    reason = reason.mask(names.isna() | (names == ''), 'missing NAME')
+
+    for col in SKILL_COLUMNS:
+        if col not in df.columns:
+            clean[col] = 0.0
+            continue
+        raw = df[col]
+        scores = pd.to_numeric(raw, errors='coerce')
+        blank = raw.isna() | (raw.astype('string').str.strip() == '')
+        invalid = (scores.isna() & ~blank) | (scores < 0) | (scores > 100)
+        reason = reason.mask((reason == '') & invalid, f'invalid {col} score')
+        clean[col] = scores.fillna(0.0)
+
+    rejected_mask = reason != ''
+    rejected = df.loc[rejected_mask, ['NAME']].assign(reason=reason[rejected_mask])
+    return clean.loc[~rejected_mask], rejected
+
+
+def _insert_employee_batch(cursor, batch: pd.DataFrame):
+    """
+    Inserts one batch with a single multi-row INSERT and returns the new ids.
+    MySQL reports the first auto-increment id of the statement; the contiguous
+    id range is verified (a concurrent writer could interleave ids depending on
+    innodb_autoinc_lock_mode) and None is returned if it does not hold.
+    """
+    columns = ['NAME'] + SKILL_COLUMNS
+    row_placeholder = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    values = batch[columns].astype(object).to_numpy().ravel().tolist()
+    cursor.execute(
+        f"INSERT INTO employee ({', '.join(columns)}) VALUES " + ", ".join([row_placeholder] * len(batch)),
+        values
+    )
+    first_id = cursor.lastrowid
+    last_id = first_id + len(batch) - 1
+    cursor.execute("SELECT id, NAME FROM employee WHERE id BETWEEN %s AND %s ORDER BY id", (first_id, last_id))
+    inserted = cursor.fetchall()
+    if [row['NAME'] for row in inserted] != batch['NAME'].tolist():
+        return None
+    return list(range(first_id, last_id + 1))
+
+
+def _insert_employee_rows(cursor, batch: pd.DataFrame):
+    """Row-by-row fallback when a multi-row INSERT did not get a contiguous id range."""
+    columns = ['NAME'] + SKILL_COLUMNS
+    sql = f"INSERT INTO employee ({', '.join(columns)}) VALUES (" + ", ".join(["%s"] * len(columns)) + ")"
+    ids = []
+    for row in batch[columns].astype(object).itertuples(index=False):
+        cursor.execute(sql, tuple(row))
+        ids.append(cursor.lastrowid)
+    return ids
+
+
+@instrument_agent('hr_agent', failed=lambda report: bool(report['error']))
+def hr_agent_bulk_ingest(df: pd.DataFrame, batch_size=None):
+    """
+    Set-based ingestion for large uploads. Columns are validated in pandas,
+    employees are inserted with multi-row INSERTs of `batch_size` rows,
+    credentials are derived from the returned id range and written with
+    executemany, and every batch is committed on its own.
+
+    Returns a report dict: employees_added, rejected_count, rejected (first
+    MAX_REPORTED_REJECTIONS rows), per-batch timings and an error (or None).
+    """
+    import pandas as pd
+    batch_size = batch_size or HR_BULK_BATCH_SIZE
+    report = {"employees_added": 0, "rejected_count": 0, "rejected": [], "batches": [], "error": None}
+    started = time.perf_counter()
+
+    if 'NAME' not in [str(col).strip().upper() for col in df.columns]:
+        report["error"] = "File is missing the required 'NAME' column."
+        return report
+
+    clean, rejected = _prepare_employee_frame(df)
+    report["rejected_count"] = len(rejected)
+    report["rejected"] = [
+        {"row": int(index) + 1, "name": None if pd.isna(row.NAME) else str(row.NAME), "reason": row.reason}
+        for index, row in rejected.head(MAX_REPORTED_REJECTIONS).iterrows()
+    ]
+
+    # Usernames only depend on the first name, so derive them for the whole frame up front.
+    clean = clean.assign(USERNAME_BASE=clean['NAME'].str.lower().str.split().str[0])
+
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            for batch_number, start in enumerate(range(0, len(clean), batch_size), start=1):
+                batch = clean.iloc[start:start + batch_size]
+                batch_started = time.perf_counter()
+
+                new_ids = _insert_employee_batch(cursor, batch)
+                if new_ids is None:
+                    conn.rollback()
+                    new_ids = _insert_employee_rows(cursor, batch)
+
+                usernames = [f"{base}{emp_id}" for base, emp_id in zip(batch['USERNAME_BASE'].tolist(), new_ids)]
+                cursor.executemany(
+                    "INSERT INTO credentials (emp_id, username, password, email, is_admin) VALUES (%s, %s, %s, %s, 0)",
+                    [(emp_id, username, f"pass{emp_id}", f"{username}@company.com")
+                     for emp_id, username in zip(new_ids, usernames)]
+                )
+                record_employees_added(cursor, batch[SKILL_COLUMNS].to_dict('records'))
+                added = [
+                    dict(row, id=emp_id, DEPARTMENT=None, ROLE=None)
+                    for row, emp_id in zip(batch[['NAME'] + SKILL_COLUMNS].to_dict('records'), new_ids)
+                ]
+                record_changes(cursor, [
+                    employee_change(row['id'], 'insert', {k: v for k, v in row.items() if k != 'id'}) for row in added
+                ])
+                conn.commit()
+                index_employees(added)
+
+                elapsed = time.perf_counter() - batch_started
+                report["employees_added"] += len(new_ids)
+                report["batches"].append({
+                    "batch": batch_number,
+                    "rows": len(new_ids),
+                    "first_id": new_ids[0],
+                    "last_id": new_ids[-1],
+                    "seconds": round(elapsed, 4),
+                    "rows_per_sec": round(len(new_ids) / elapsed, 1) if elapsed else None,
+                })
+    except Exception as e:
+        # Earlier batches are already committed; only the failing batch is rolled back.
+        conn.rollback()
+        report["error"] = str(e)
+    finally:
+        conn.close()
+
+    total = time.perf_counter() - started
+    report["seconds"] = round(total, 4)
+    report["rows_per_sec"] = round(report["employees_added"] / total, 1) if total else None
+    return report
+
+
+def skill_highlights(employee):
+    """
+    (all skills, top 3, weakest 3) of an employee row. Skills scored 0 are
+    left out of the top/weakest lists (no data is not a weakness).
+    """
+    skills = {skill: employee.get(skill, 0) or 0 for skill in SKILL_COLUMNS}
+    non_zero_skills = {k: v for k, v in skills.items() if v > 0}
+    sorted_skills = sorted(non_zero_skills.items(), key=lambda x: x[1], reverse=True)
+    return skills, dict(sorted_skills[:3]), dict(sorted_skills[-3:])
+
+
 # --- NEW: Fully functional version for the company_roles schema ---
+@instrument_agent('employee_analysis_agent', failed=lambda result: result[0] is None)
 def generate_employee_analysis_agent(emp_id: int):
     """
     Fetches an employee's skills from the 'employee' table, analyzes them, 
     and generates an AI-powered upskilling roadmap.
     """
-    conn = get_db_connection()
     try:
-        with conn.cursor() as cursor:
-            # Get employee's details and all skill scores
-            cursor.execute("SELECT * FROM employee WHERE id = %s", (emp_id,))
-            employee = cursor.fetchone()
-            if not employee:
-                return None, None, None, "Employee not found."
-
-        # Define skill columns and extract them from the employee record
-        skill_columns = ['HTML', 'CSS', 'JAVASCRIPT', 'PYTHON', 'C', 'CPP', 'JAVA', 'SQL_TESTING', 'TOOLS_COURSE']
-        skills = {skill: employee.get(skill, 0) or 0 for skill in skill_columns}
-        
+        # Get employee's details and all skill scores (profile cache, no connection held)
+        employee = get_employee_profile(emp_id)
+        if not employee:
+            return None, None, None, "Employee not found."
+
         # Analyze skills to find top 3 and weakest 3
         # Filter out skills with 0 score to not count them as weak
-        non_zero_skills = {k: v for k, v in skills.items() if v > 0}
-        if not non_zero_skills:
-            return employee, {}, {}, "No proficiency data found for this employee."
-
-        sorted_skills = sorted(non_zero_skills.items(), key=lambda x: x[1], reverse=True)
-        top_skills = dict(sorted_skills[:3])
-        weak_skills = dict(sorted_skills[-3:])
+        skills, top_skills, weak_skills = skill_highlights(employee)
 
         # Employee details for the prompt
         employee_details = {
@@ -118,6 +481,9 @@ def generate_employee_analysis_agent(emp_id: int):
             "Role": employee.get('ROLE')
         }
 
+        if not top_skills:
+            return employee_details, {}, {}, "No proficiency data found for this employee."
+
         # Generate the AI analysis prompt
         prompt = f"""
         You are an expert AI Career Development Analyst for a corporate Learning Management System.
@@ -145,120 +511,219 @@ def generate_employee_analysis_agent(emp_id: int):
         (End with a short, encouraging sentence.)
         """
         
-        analysis_text = call_ai(prompt)
+        analysis_text = call_ai(prompt, cache_tags=(employee_cache_tag(emp_id),))
         
         return employee_details, top_skills, weak_skills, analysis_text
 
     except Exception as e:
         return None, None, None, f"An error occurred during analysis: {e}"
-    finally:
-        if conn and conn.open:
-            conn.close()
 
 
-# ----------- AI Course Recommender Agent (Based on Skills) -----------
-def course_recommender_agent_v2(emp_id: int):
-    """
-    Analyzes an employee's skills, finds the weakest one, and uses an AI to 
-    recommend a specific course. The recommended course is then stored in the
-    database.
-    """
-    conn = get_db_connection()
-    try:
-        with conn.cursor() as cursor:
-            # Step 1: Fetch employee skills and role
-            cursor.execute("SELECT * FROM employee WHERE id = %s", (emp_id,))
-            employee = cursor.fetchone()
-            if not employee:
-                return {"success": False, "message": "Employee not found."}
-
-            # Step 2: Identify all skill columns and find the weakest one
-            skill_columns = ['HTML', 'CSS', 'JAVASCRIPT', 'PYTHON', 'C', 'CPP', 'JAVA', 'SQL_TESTING', 'TOOLS_COURSE']
-            skills = {skill: employee.get(skill, 0) or 0 for skill in skill_columns}
-            
-            weakest_skill = min(skills, key=skills.get)
-            employee_role = employee.get('ROLE', 'Trainee')
-
-            # Step 3: Generate a prompt for the AI
-            prompt = f"""
-            As a corporate Learning Management System AI, your task is to recommend one specific, actionable course title for an employee based on their weakest skill.
-
-            Employee Role: {employee_role}
-            Employee Skill Scores (out of 100): {skills}
-            Identified Weakest Skill: {weakest_skill}
-
-            Based on this data, suggest a single course title to help the employee improve their weakest skill. The title should be concise and sound like a real course.
-
-            Examples: "Advanced JavaScript for Developers", "Mastering Python Data Structures", "Introduction to UI/UX with Figma".
-
-            Return only the course title and nothing else.
-            """
-            
-            # Step 4: Call the AI to get the course name
-            recommended_course_name = call_ai(prompt)
-
-            if "AI Error" in recommended_course_name:
-                 return {"success": False, "message": recommended_course_name}
-            
-            # Step 5: Store the recommended course in the new 'course_assigned' table
-            cursor.execute(
-                "SELECT * FROM course_assigned WHERE emp_id = %s AND course_name = %s AND status != 'Completed'",
-                (emp_id, recommended_course_name)
-            )
-            if cursor.fetchone():
-                return {"success": True, "course": {"CourseName": recommended_course_name, "message": "This course is already assigned to you."}}
-
-            cursor.execute(
-                "INSERT INTO course_assigned (emp_id, course_name, status, progress) VALUES (%s, %s, 'Not Started', 0)",
-                (emp_id, recommended_course_name)
-            )
-            conn.commit()
-
-            return {"success": True, "course": {"CourseName": recommended_course_name}}
+def employee_analysis_job(target):
+    """Background job handler for the admin AI report (see jobs.py)."""
+    employee, top_skills, weak_skills, analysis = generate_employee_analysis_agent(int(target))
+    if not employee:
+        raise LookupError(analysis)
+    if analysis.startswith("AI Error"):
+        # Fail the job so the next page view retries instead of reusing the error.
+        raise RuntimeError(analysis)
+    return {
+        "employee": employee,
+        "top_skills": {k: float(v) for k, v in top_skills.items()},
+        "weak_skills": {k: float(v) for k, v in weak_skills.items()},
+        "analysis": analysis,
+    }
+
+register_job_type('employee_analysis', employee_analysis_job)
 
-    except Exception as e:
-        conn.rollback()
-        return {"success": False, "message": str(e)}
-    finally:
-        conn.close()
 
 # ----------- Existing Employee-Facing Agents -----------
-def profile_agent(emp_code: str):
-    """Generates a profile summary for an employee."""
-    prompt = f"You are an AI profile assistant. Analyze employee {emp_code} and give a summary of their current learning profile in 2-3 sentences, followed by key strengths and areas to improve."
-    output = call_ai(prompt)
-    return {
-        "agent": "Profile Agent",
+# Prompt and presentation for each employee agent. The blocking functions below
+# and the streaming endpoint share these so both return the same content.
+# Prompts are grounded in the employee's own data (agent_context.py); when the
+# data answers the question by itself ("data_intent", or a question such as
+# "which courses are pending?" matching one of the agent's "question_intents")
+# the agent answers without calling the LLM.
+EMPLOYEE_AGENTS = {
+    'profile': {
+        "metric": "profile_agent",
+        "label": "Profile Agent",
         "summary": "Here is a quick overview of your profile:",
-        "details": [line.strip() for line in output.split('.') if line.strip()]
-    }
+        "prompt": "You are an AI profile assistant. Give a summary of this employee's current learning profile in 2-3 sentences, followed by key strengths and areas to improve.",
+        "data_intent": None,
+        "question_intents": (),
+    },
+    'assessment': {
+        "metric": "assessment_agent",
+        "label": "Assessment Agent",
+        "summary": "Here is your assessment progress:",
+        "prompt": "You are an AI assessment agent. Review this employee's assessment results. Provide pending and completed assessments with short recommendations.",
+        "data_intent": None,
+        "question_intents": ('scores',),
+    },
+    'recommender': {
+        "metric": "recommender_agent",
+        "label": "Recommender Agent",
+        "summary": "Based on your profile, these courses are recommended:",
+        "prompt": "You are a course recommendation AI. Suggest 3-5 courses from the catalog courses listed that this employee should take next based on their skill gaps and learning history.",
+        "data_intent": None,
+        "question_intents": (),
+    },
+    'tracker': {
+        "metric": "tracker_agent",
+        "label": "Tracker Agent",
+        "summary": "Here is your current learning progress:",
+        "prompt": "You are a learning progress tracker. Summarize this employee's current progress, including learning percentage, completed modules, and remaining steps.",
+        "data_intent": 'progress',
+        "question_intents": ('progress', 'pending', 'completed'),
+    },
+}
 
-def assessment_agent(emp_code: str):
-    """Provides an assessment status for an employee."""
-    prompt = f"You are an AI assessment agent. Check the assessment status for employee {emp_code}. Provide pending and completed assessments with short recommendations."
-    output = call_ai(prompt)
+def prepare_employee_agent(agent_type: str, emp_code: str, question=None):
+    """
+    ('data', response) when the employee's data answers the request directly,
+    otherwise ('prompt', grounded prompt) for the LLM.
+    """
+    return _prepare_from_context(agent_type, fetch_employee_context(emp_code), question)
+
+def _prepare_from_context(agent_type: str, context, question=None):
+    spec = EMPLOYEE_AGENTS[agent_type]
+    if context is None:
+        return 'data', _data_response(agent_type, ["No employee record was found for your account"])
+    intent = detect_intent(question, spec["question_intents"]) if question else spec["data_intent"]
+    details = answer_from_data(intent, context) if intent else None
+    if details is not None:
+        return 'data', _data_response(agent_type, details)
+    return 'prompt', build_grounded_prompt(spec["prompt"], agent_type, context, question)
+
+def _data_response(agent_type: str, details):
+    spec = EMPLOYEE_AGENTS[agent_type]
+    return {"agent": spec["label"], "summary": spec["summary"], "details": details, "source": "data"}
+
+def format_agent_response(agent_type: str, output: str):
+    """The JSON shape returned by /ask_agent."""
+    spec = EMPLOYEE_AGENTS[agent_type]
     return {
-        "agent": "Assessment Agent",
-        "summary": "Here is your assessment progress:",
-        "details": [line.strip() for line in output.split('.') if line.strip()]
+        "agent": spec["label"],
+        "summary": spec["summary"],
+        "details": [line.strip() for line in output.split('.') if line.strip()],
+        "source": "ai",
     }
 
-def recommender_agent(emp_code: str):
+def _run_employee_agent(agent_type: str, emp_code: str, question=None):
+    return _answer_employee_agent(agent_type, emp_code, prepare_employee_agent(agent_type, emp_code, question))
+
+def _answer_employee_agent(agent_type: str, emp_code: str, prepared):
+    kind, payload = prepared
+    if kind == 'data':
+        return payload
+    output = call_ai(payload, cache_tags=(employee_cache_tag(emp_code),))
+    return format_agent_response(agent_type, output)
+
+@instrument_agent('profile_agent')
+def profile_agent(emp_code: str, question=None):
+    """Generates a profile summary for an employee."""
+    return _run_employee_agent('profile', emp_code, question)
+
+@instrument_agent('assessment_agent')
+def assessment_agent(emp_code: str, question=None):
+    """Provides an assessment status for an employee."""
+    return _run_employee_agent('assessment', emp_code, question)
+
+@instrument_agent('recommender_agent')
+def recommender_agent(emp_code: str, question=None):
     """Recommends new courses for an employee."""
-    prompt = f"You are a course recommendation AI. Suggest 3-5 courses that employee {emp_code} should take next based on skill gaps and learning history."
-    output = call_ai(prompt)
-    return {
-        "agent": "Recommender Agent",
-        "summary": "Based on your profile, these courses are recommended:",
-        "details": [line.strip() for line in output.split('.') if line.strip()]
-    }
+    return _run_employee_agent('recommender', emp_code, question)
 
-def tracker_agent(emp_code: str):
+@instrument_agent('tracker_agent')
+def tracker_agent(emp_code: str, question=None):
     """Summarizes an employee's learning progress."""
-    prompt = f"You are a learning progress tracker. Summarize the current progress for employee {emp_code}, including learning percentage, completed modules, and remaining steps."
-    output = call_ai(prompt)
-    return {
-        "agent": "Tracker Agent",
-        "summary": "Here is your current learning progress:",
-        "details": [line.strip() for line in output.split('.') if line.strip()]
-    }
\ No newline at end of file
+    return _run_employee_agent('tracker', emp_code, question)
+
+def stream_employee_agent(agent_type: str, emp_code: str, question=None):
+    """
+    Generator behind the streaming /ask_agent endpoint. Yields
+    ('chunk', text) while the model generates, then ('done', response) with
+    the same shape as the blocking agent, or ('error', message). Answers
+    taken straight from the employee's data arrive as a single 'done'.
+    """
+    spec = EMPLOYEE_AGENTS[agent_type]
+    agent = spec["metric"]
+    agent_metrics.agent_started(agent)
+    started = time.perf_counter()
+    failed = True
+    parts = []
+    try:
+        kind, payload = prepare_employee_agent(agent_type, emp_code, question)
+        if kind == 'data':
+            failed = False
+            yield 'done', payload
+            return
+        for text in call_ai_stream(payload, cache_tags=(employee_cache_tag(emp_code),), agent=agent):
+            parts.append(text)
+            yield 'chunk', text
+        failed = False
+        yield 'done', format_agent_response(agent_type, "".join(parts))
+    except GeneratorExit:
+        # The client went away; that is not an agent failure.
+        failed = False
+        raise
+    except Exception as e:
+        yield 'error', f"AI Error: {str(e)}"
+    finally:
+        agent_metrics.agent_finished(agent, time.perf_counter() - started, failed)
+
+
+# ----------- Multi-Agent Fan-Out -----------
+# The agent page used to ask each agent separately, one LLM call after the
+# other. run_employee_agents fetches the employee's data once and runs the
+# agents' LLM calls side by side (still bounded by llm_guard), so answering
+# all four takes about as long as the slowest one.
+
+AGENT_FANOUT_WORKERS = int(os.getenv('AGENT_FANOUT_WORKERS', '16'))
+
+_fanout_lock = threading.Lock()
+_fanout_pid = None
+_fanout_executor = None
+
+def _fanout_pool():
+    """The pool belongs to one process (gunicorn forks after import)."""
+    global _fanout_pid, _fanout_executor
+    if _fanout_pid != os.getpid():
+        with _fanout_lock:
+            if _fanout_pid != os.getpid():
+                _fanout_executor = ThreadPoolExecutor(AGENT_FANOUT_WORKERS, thread_name_prefix='agent-fanout')
+                _fanout_pid = os.getpid()
+    return _fanout_executor
+
+def _answer_from_context(agent_type: str, emp_code: str, context, question):
+    return _answer_employee_agent(agent_type, emp_code, _prepare_from_context(agent_type, context, question))
+
+# Recorded under the same metric names as the single-agent functions.
+_FANOUT_TASKS = {
+    agent_type: instrument_agent(spec["metric"])(_answer_from_context)
+    for agent_type, spec in EMPLOYEE_AGENTS.items()
+}
+
+def run_employee_agents(emp_code: str, agent_types=None, question=None):
+    """
+    Runs several employee agents (default: all) concurrently over a single
+    fetch of the employee's data. Yields (agent_type, response) in the order
+    the agents finish; an agent that fails yields a response with "error"
+    and does not affect the others.
+    """
+    agent_types = list(dict.fromkeys(agent_types or EMPLOYEE_AGENTS))
+    context = fetch_employee_context(emp_code)
+    pool = _fanout_pool()
+    futures = {
+        # copy_context keeps the request's profiling and metrics context in the worker thread.
+        pool.submit(contextvars.copy_context().run, _FANOUT_TASKS[agent_type], agent_type, emp_code, context, question): agent_type
+        for agent_type in agent_types
+    }
+    for future in as_completed(futures):
+        agent_type = futures[future]
+        try:
+            yield agent_type, future.result()
+        except Exception as e:
+            spec = EMPLOYEE_AGENTS[agent_type]
+            yield agent_type, {"agent": spec["label"], "summary": spec["summary"], "details": [], "error": f"AI Error: {str(e)}"}
\ No newline at end of file
@@ -1,7 +1,9 @@
 from flask import Flask, render_template, session, redirect, request
 from flask_cors import CORS
 import os
-from db import get_db_connection # Import the DB connection function
+from employee_profiles import get_employee_profile
+from jobs import job_queue
+from profiling import request_profiler, current_profile, connect_template_timing, PROFILE_PARAM
 
 # Import Blueprints
 from auth_routes import auth_bp
@@ -22,6 +24,49 @@ app.register_blueprint(admin_bp)
 app.register_blueprint(employee_bp)
 
 
+# Request profiling (opt-in, see profiling.py): SQL, connection checkout and
+# template timings per request, reported in a Server-Timing header.
+connect_template_timing(app)
+
+
+@app.before_request
+def start_request_profile():
+    if request.endpoint == 'static':
+        return
+    request_profiler.start_request(
+        request.method,
+        request.url_rule.rule if request.url_rule else '<unmatched>',
+        request.path,
+        request.args.get(PROFILE_PARAM) or request.headers.get('X-Profile'),
+        session.get('role') == 'admin'
+    )
+
+
+@app.after_request
+def add_server_timing(response):
+    profile = current_profile()
+    if profile is not None:
+        profile.status = response.status_code
+        # Streamed bodies keep running after this point; their totals end up
+        # in /admin/profiling, the header only covers the work done so far.
+        response.headers['Server-Timing'] = profile.server_timing()
+    return response
+
+
+@app.teardown_request
+def finish_request_profile(error=None):
+    profile = request_profiler.finish_request(500 if error is not None else None)
+    if profile is not None and profile.profile_file:
+        print(f"Request profile written: {profile.profile_file}")
+
+
+# Background workers (AI jobs, periodic role assignment) run in every worker
+# process; start() is a no-op once this process' threads are running.
+@app.before_request
+def start_background_workers():
+    job_queue.start()
+
+
 # ---------------- HOME & DASHBOARD ROUTES ----------------
 
 @app.route('/')
@@ -56,20 +101,15 @@ def dashboard_employee():
     if session.get('role') == 'employee':
         emp_code = session.get('emp_code')
         employee_data = {}
-        conn = get_db_connection()
-        try:
-            with conn.cursor() as cursor:
-                cursor.execute("SELECT NAME, ROLE, DEPARTMENT FROM employee WHERE id = %s", (emp_code,))
-                emp = cursor.fetchone()
-                if emp:
-                    employee_data = {
-                        "name": emp.get('NAME', 'Employee'),
-                        "role": emp.get('ROLE', 'N/A'),
-                        "department": emp.get('DEPARTMENT', 'N/A')
-                    }
-        finally:
-            conn.close()
-            
+        # Served from the profile cache (employee_profiles.py) after the first view.
+        emp = get_employee_profile(emp_code)
+        if emp:
+            employee_data = {
+                "name": emp.get('NAME', 'Employee'),
+                "role": emp.get('ROLE', 'N/A'),
+                "department": emp.get('DEPARTMENT', 'N/A')
+            }
+
         return render_template('dashboard_employee.html', employee=employee_data)
     return redirect('/')
 
@@ -0,0 +1,323 @@
+import datetime
+import hashlib
+import random
+import re
+import sqlite3
+import threading
+import time
+import types
+from db import SKILL_COLUMNS
+
+# ----------- Benchmark Stand-ins -----------
+# Lets benchmark.py run the real Flask app without MySQL or a Gemini key:
+#   * SQLiteConnection: a pymysql-compatible connection (DictCursor rows,
+#     %s placeholders, lastrowid of multi-row INSERTs) that translates the
+#     MySQL dialect used in this app to SQLite,
+#   * FakeLLM: deterministic answers with configurable latency,
+#   * seed_database: schema + N generated employees.
+# This is test tooling; nothing in the app imports it.
+
+
+# ---- MySQL -> SQLite translation ----
+
+_NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+_TRANSLATIONS = [
+    (re.compile(r'\s+FOR UPDATE\b', re.I), ''),
+    (re.compile(r'NOW\(3?\)\s*-\s*INTERVAL\s+\?\s+SECOND', re.I), _NOW[:-1] + ", '-' || ? || ' seconds')"),
+    (re.compile(r'\bNOW\(3?\)', re.I), _NOW),
+    (re.compile(r'ON DUPLICATE KEY UPDATE', re.I), 'ON CONFLICT DO UPDATE SET'),
+    (re.compile(r'\bVALUES\((\w+)\)', re.I), r'excluded.\1'),
+    (re.compile(r'\b\w+\s+AUTO_INCREMENT\s+PRIMARY KEY', re.I), 'INTEGER PRIMARY KEY AUTOINCREMENT'),
+    (re.compile(r'\bUNIQUE KEY\s+\w+\s*\(', re.I), 'UNIQUE ('),
+    (re.compile(r',\s*(?:KEY|INDEX)\s+\w+\s*\([^)]*\)', re.I), ''),
+    (re.compile(r'\bDATETIME\(\d\)', re.I), 'DATETIME'),
+    (re.compile(r'\bCREATE UNIQUE INDEX\s+(\w+)', re.I), r'CREATE UNIQUE INDEX IF NOT EXISTS \1'),
+]
+_cache = {}
+
+
+def mysql_to_sqlite(sql):
+    translated = _cache.get(sql)
+    if translated is None:
+        translated = sql.replace('%s', '?')
+        for pattern, replacement in _TRANSLATIONS:
+            translated = pattern.sub(replacement, translated)
+        _cache[sql] = translated
+    return translated
+
+
+def _parse_datetime(value):
+    return datetime.datetime.fromisoformat(value.decode())
+
+
+sqlite3.register_converter('DATETIME', _parse_datetime)
+sqlite3.register_converter('TIMESTAMP', _parse_datetime)
+try:
+    import numpy as np
+    sqlite3.register_adapter(np.int64, int)
+    sqlite3.register_adapter(np.float64, float)
+except ImportError:
+    pass
+
+
+class SQLiteCursor:
+    def __init__(self, conn):
+        self._conn = conn
+        self._cursor = conn.raw.cursor()
+        self.rowcount = -1
+        self.lastrowid = None
+
+    def execute(self, sql, params=()):
+        translated = mysql_to_sqlite(sql)
+        self._conn.begin_if_writing(sql)
+        self._cursor.execute(translated, tuple(params or ()))
+        self.rowcount = self._cursor.rowcount
+        self.lastrowid = self._cursor.lastrowid
+        if self.rowcount > 1 and translated.lstrip().upper().startswith('INSERT'):
+            # MySQL reports the first id of a multi-row INSERT, SQLite the last.
+            self.lastrowid = self.lastrowid - self.rowcount + 1
+        return self.rowcount
+
+    def executemany(self, sql, seq_of_params):
+        self._conn.begin_if_writing(sql)
+        self._cursor.executemany(mysql_to_sqlite(sql), [tuple(params) for params in seq_of_params])
+        self.rowcount = self._cursor.rowcount
+        return self.rowcount
+
+    def _row(self, row):
+        return None if row is None else dict(zip([col[0] for col in self._cursor.description], row))
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchmany(self, size=1):
+        return [self._row(row) for row in self._cursor.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._row(row) for row in self._cursor.fetchall()]
+
+    def close(self):
+        self._cursor.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class SQLiteConnection:
+    """Just enough of pymysql's Connection for the app and db.ConnectionPool."""
+
+    _READS = ('SELECT', 'WITH', 'PRAGMA')
+
+    def __init__(self, path):
+        self.raw = sqlite3.connect(
+            path, timeout=30, isolation_level=None, check_same_thread=False,
+            detect_types=sqlite3.PARSE_DECLTYPES
+        )
+        self.raw.execute("PRAGMA journal_mode=WAL")
+        self.raw.execute("PRAGMA synchronous=NORMAL")
+        self.open = True
+        self._in_transaction = False
+
+    def begin_if_writing(self, sql):
+        # Take the write lock up front (like InnoDB row locks for FOR UPDATE);
+        # a deferred transaction that upgrades later fails with SQLITE_BUSY.
+        if self._in_transaction:
+            return
+        statement = sql.lstrip().upper()
+        if not statement.startswith(self._READS) or 'FOR UPDATE' in statement:
+            self.raw.execute("BEGIN IMMEDIATE")
+            self._in_transaction = True
+
+    def cursor(self, cursor_class=None):
+        return SQLiteCursor(self)
+
+    def commit(self):
+        if self._in_transaction:
+            self.raw.execute("COMMIT")
+            self._in_transaction = False
+
+    def rollback(self):
+        if self._in_transaction:
+            self.raw.execute("ROLLBACK")
+            self._in_transaction = False
+
+    def ping(self, reconnect=False):
+        if not self.open:
+            raise sqlite3.ProgrammingError("Connection closed")
+
+    def close(self):
+        self.open = False
+        self.raw.close()
+
+
+# ---- Fake LLM ----
+
+class FakeLLM:
+    """
+    Deterministic stand-in for ChatGoogleGenerativeAI. The answer depends only
+    on the prompt; latency is `latency` seconds plus up to `jitter` random.
+    Streaming yields `chunks` pieces spread over the same total time.
+    """
+
+    def __init__(self, latency=0.05, jitter=0.0, chunks=8, seed=0):
+        self.model = 'fake-llm'
+        self.temperature = 0.3
+        self.latency = latency
+        self.jitter = jitter
+        self.chunks = chunks
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def _delay(self):
+        with self._lock:
+            self.calls += 1
+            return self.latency + (self._random.random() * self.jitter if self.jitter else 0.0)
+
+    @staticmethod
+    def answer(prompt):
+        digest = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        words = ['focus', 'practice', 'review', 'build', 'projects', 'python', 'testing', 'javascript', 'sql', 'design']
+        sentences = []
+        for i in range(4):
+            picks = [words[int(digest[j], 16) % len(words)] for j in range(i * 6, i * 6 + 6)]
+            sentences.append(" ".join(picks).capitalize() + ".")
+        profiles = re.findall(r'Profile (P\d+):', prompt)
+        if profiles:
+            # Department analysis asks for one labelled record per profile.
+            return "\n".join(
+                f"=== {profile}\nSUMMARY: {sentences[0]}\nSTRENGTHS: {sentences[1]} | {sentences[2]}\n"
+                f"ROADMAP: {sentences[3]} | {sentences[0]} | {sentences[1]}\nREMARK: {sentences[2]}"
+                for profile in profiles
+            )
+        return " ".join(sentences)
+
+    def _response(self, text, prompt):
+        return types.SimpleNamespace(
+            content=text,
+            usage_metadata={"input_tokens": len(prompt) // 4, "output_tokens": len(text) // 4}
+        )
+
+    def invoke(self, prompt):
+        time.sleep(self._delay())
+        return self._response(self.answer(prompt), prompt)
+
+    def stream(self, prompt):
+        text = self.answer(prompt)
+        delay = self._delay() / self.chunks
+        size = max(1, len(text) // self.chunks + 1)
+        for start in range(0, len(text), size):
+            time.sleep(delay)
+            yield types.SimpleNamespace(content=text[start:start + size], usage_metadata=None)
+
+
+# ---- Fixture data ----
+
+BASE_SCHEMA = [
+    f"""
+    CREATE TABLE IF NOT EXISTS employee (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        NAME VARCHAR(100),
+        DEPARTMENT VARCHAR(100),
+        ROLE VARCHAR(100),
+        {', '.join(f'{skill} REAL DEFAULT 0' for skill in SKILL_COLUMNS)}
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS credentials (
+        emp_id INTEGER, username VARCHAR(100) UNIQUE, password VARCHAR(100),
+        email VARCHAR(100), is_admin INTEGER DEFAULT 0
+    )
+    """,
+    "CREATE TABLE IF NOT EXISTS course (CourseName VARCHAR(100) PRIMARY KEY, CourseFile VARCHAR(100))",
+    """
+    CREATE TABLE IF NOT EXISTS course_assigned (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, emp_id INTEGER, course_name VARCHAR(100),
+        status VARCHAR(30), progress INTEGER DEFAULT 0,
+        assigned_date DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS assessment_marks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, emp_id INTEGER, course_name VARCHAR(100), marks_obtained INTEGER
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_employee_name ON employee (NAME)",
+    "CREATE INDEX IF NOT EXISTS idx_employee_department ON employee (DEPARTMENT)",
+    "CREATE INDEX IF NOT EXISTS idx_employee_role ON employee (ROLE)",
+    "CREATE INDEX IF NOT EXISTS idx_course_assigned_emp ON course_assigned (emp_id)",
+]
+
+COURSES = [
+    ('HTML Tags', 'HTMLTAGS.html'), ('CSS', 'CSS.html'), ('JavaScript', 'js3.html'),
+    ('Python', 'python.html'), ('C Programming', 'c_course1.html'), ('C++', 'c++_course.html'),
+    ('Java', 'java.html'), ('SQL Testing', 'Sql_testing_course.html'), ('Testing Tools', 'testing.html'),
+]
+ROLES = [('Development', 'Frontend Developer'), ('Development', 'Backend Developer'), ('Testing', 'Automation Tester')]
+FIRST_NAMES = ['Asha', 'Ravi', 'Meena', 'Arjun', 'Divya', 'Karthik', 'Priya', 'Vikram', 'Sneha', 'Rahul',
+               'Anita', 'Suresh', 'Lakshmi', 'Mohan', 'Kavya', 'Naveen']
+LAST_NAMES = ['Kumar', 'Sharma', 'Iyer', 'Reddy', 'Nair', 'Das', 'Patel', 'Singh', 'Rao', 'Menon']
+STATUSES = ['Not Started', 'In Progress', 'Completed']
+ADMIN_USERNAME = 'admin'
+ADMIN_PASSWORD = 'admin'
+
+
+def employee_credentials(emp_id):
+    """Username/password of a seeded employee."""
+    return f"user{emp_id}", f"pass{emp_id}"
+
+
+def generate_employee_rows(count, rng, unassigned_share=0.1):
+    rows = []
+    for _ in range(count):
+        department, role = (None, None) if rng.random() < unassigned_share else rng.choice(ROLES)
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        rows.append((name, department, role, *[rng.randint(0, 100) for _ in SKILL_COLUMNS]))
+    return rows
+
+
+def seed_database(conn, employees=1000, seed=42):
+    """Creates the base tables and fills them. `conn` is a SQLiteConnection."""
+    rng = random.Random(seed)
+    raw = conn.raw
+    for statement in BASE_SCHEMA:
+        raw.execute(statement)
+    raw.execute("BEGIN")
+    raw.executemany("INSERT OR IGNORE INTO course (CourseName, CourseFile) VALUES (?, ?)", COURSES)
+    columns = ['NAME', 'DEPARTMENT', 'ROLE'] + SKILL_COLUMNS
+    raw.executemany(
+        f"INSERT INTO employee ({', '.join(columns)}) VALUES ({', '.join(['?'] * len(columns))})",
+        generate_employee_rows(employees, rng)
+    )
+    ids = [row[0] for row in raw.execute("SELECT id FROM employee ORDER BY id")]
+    raw.executemany(
+        "INSERT OR IGNORE INTO credentials (emp_id, username, password, email, is_admin) VALUES (?, ?, ?, ?, 0)",
+        [(emp_id, *employee_credentials(emp_id), f"user{emp_id}@company.com") for emp_id in ids]
+    )
+    raw.execute(
+        "INSERT OR IGNORE INTO credentials (emp_id, username, password, email, is_admin) VALUES (0, ?, ?, ?, 1)",
+        (ADMIN_USERNAME, ADMIN_PASSWORD, 'admin@company.com')
+    )
+    assignments = []
+    for emp_id in ids:
+        for course_name, _ in rng.sample(COURSES, rng.randint(0, 3)):
+            status = rng.choice(STATUSES)
+            progress = 100 if status == 'Completed' else (0 if status == 'Not Started' else rng.randint(1, 99))
+            assignments.append((emp_id, course_name, status, progress))
+    raw.executemany(
+        "INSERT INTO course_assigned (emp_id, course_name, status, progress) VALUES (?, ?, ?, ?)",
+        assignments
+    )
+    raw.execute("COMMIT")
+    return ids
+
+
+def upload_csv(rows, rng):
+    """CSV body for the HR upload endpoint."""
+    lines = [",".join(['NAME'] + SKILL_COLUMNS)]
+    for name, _, _, *skills in generate_employee_rows(rows, rng, unassigned_share=1.0):
+        lines.append(",".join([name] + [str(score) for score in skills]))
+    return ("\n".join(lines) + "\n").encode('utf-8')
@@ -0,0 +1,330 @@
+"""
+Load-test the Flask app without MySQL or Gemini.
+
+    python benchmark.py                                   # all scenarios, defaults
+    python benchmark.py --scenarios login,list_employees --concurrency 16
+    python benchmark.py --employees 20000 --requests 500 --llm-latency 0.2
+    python benchmark.py --json results.json               # save results
+    python benchmark.py --baseline results.json           # fail on regressions
+
+The app runs in-process against a seeded SQLite database (bench_support.py)
+and a deterministic fake LLM. Each scenario is driven by --concurrency
+threads, each with its own test client and session, and reports req/s,
+latency percentiles, error count and process memory.
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+SCENARIOS = {}
+
+
+def scenario(name, role):
+    """Registers a request factory: fn(client, rng, context) -> response."""
+    def decorator(func):
+        SCENARIOS[name] = (role, func)
+        return func
+    return decorator
+
+
+@scenario('login', role=None)
+def _login(client, rng, context):
+    from bench_support import employee_credentials
+    username, password = employee_credentials(rng.choice(context['employee_ids']))
+    return client.post('/login', json={"username": username, "password": password})
+
+
+@scenario('list_employees', role='admin')
+def _list_employees(client, rng, context):
+    # Walk a few pages with the cursor, like the admin table does.
+    cursor = context['list_cursors'].get(threading.get_ident())
+    response = client.get('/admin/list_employees', query_string={"limit": 50, **({"cursor": cursor} if cursor else {})})
+    data = response.get_json(silent=True) or {}
+    context['list_cursors'][threading.get_ident()] = data.get('next_cursor') if rng.random() < 0.8 else None
+    return response
+
+
+@scenario('generate_report', role='admin')
+def _generate_report(client, rng, context):
+    return client.get('/admin/generate_report', query_string={"type": "all"})
+
+
+@scenario('ask_agent', role='employee')
+def _ask_agent(client, rng, context):
+    return client.post('/ask_agent', json={"agent": rng.choice(['profile', 'assessment', 'recommender', 'tracker'])})
+
+
+@scenario('ask_agent_stream', role='employee')
+def _ask_agent_stream(client, rng, context):
+    return client.get('/ask_agent/stream', query_string={"agent": rng.choice(['profile', 'tracker'])})
+
+
+@scenario('ask_agents', role='employee')
+def _ask_agents(client, rng, context):
+    return client.post('/ask_agents', json={})
+
+
+@scenario('recommend_course', role='employee')
+def _recommend_course(client, rng, context):
+    return client.get('/employee/recommend_course')
+
+
+@scenario('submit_assessments', role='employee')
+def _submit_assessments(client, rng, context):
+    from bench_support import COURSES
+    names = [name for name, _ in rng.sample(COURSES, 3)]
+    return client.post('/employee/submit_assessments', json={"course_names": names})
+
+
+@scenario('get_my_courses', role='employee')
+def _get_my_courses(client, rng, context):
+    return client.get('/employee/get_my_courses')
+
+
+@scenario('ai_report', role='admin')
+def _ai_report(client, rng, context):
+    # Every thread opens the same two reports, so enqueues race; each employee
+    # must end up with a single analysis job (reused on later views).
+    import db
+    emp_id = context['employee_ids'][rng.randrange(2)]
+    response = client.get(f'/admin/ai_report/{emp_id}')
+    conn = db.get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) AS jobs FROM ai_jobs WHERE job_type = 'employee_analysis' AND target = %s",
+                           (str(emp_id),))
+            jobs = cursor.fetchone()['jobs']
+    finally:
+        conn.close()
+    if jobs > 1:
+        raise AssertionError(f"{jobs} analysis jobs queued for employee {emp_id}")
+    return response
+
+
+@scenario('agent_metrics', role='admin')
+def _agent_metrics(client, rng, context):
+    # JSON, Prometheus and reset endpoints; the first failure is what gets reported.
+    for method, path in (('get', '/admin/agent_metrics'), ('get', '/admin/agent_metrics/prometheus'),
+                         ('post', '/admin/agent_metrics/reset')):
+        response = getattr(client, method)(path)
+        if response.status_code >= 400:
+            return response
+        response.close()
+    return response
+
+
+@scenario('hr_upload', role='admin')
+def _hr_upload(client, rng, context):
+    from bench_support import upload_csv
+    return client.post(
+        '/admin/hr_agent/upload_employees',
+        query_string={"filename": "bench.csv"},
+        data=upload_csv(context['upload_rows'], rng),
+        content_type='text/csv'
+    )
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, max(0, int(round(q * len(sorted_values))) - 1))]
+
+
+def _max_rss_mb():
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes.
+    return round(usage / (1024 * 1024) if sys.platform == 'darwin' else usage / 1024, 1)
+
+
+def run_scenario(app, name, context, requests, concurrency, duration, seed):
+    role, make_request = SCENARIOS[name]
+    latencies, statuses, errors = [], {}, []
+    lock = threading.Lock()
+    remaining = [requests]
+    deadline = time.perf_counter() + duration if duration else None
+
+    def worker(index):
+        rng = random.Random(f"{seed}-{name}-{index}")
+        client = app.test_client()
+        if role:
+            with client.session_transaction() as session:
+                session['role'] = role
+                session['emp_code'] = 0 if role == 'admin' else rng.choice(context['employee_ids'])
+        while True:
+            with lock:
+                if deadline is None:
+                    if remaining[0] <= 0:
+                        return
+                    remaining[0] -= 1
+            if deadline is not None and time.perf_counter() >= deadline:
+                return
+            started = time.perf_counter()
+            try:
+                response = make_request(client, rng, context)
+                response.get_data()  # drain streamed bodies
+                status = response.status_code
+                response.close()
+            except Exception as e:
+                status = 'exception'
+                with lock:
+                    errors.append(repr(e))
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                statuses[status] = statuses.get(status, 0) + 1
+
+    rss_before = _max_rss_mb()
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    failures = sum(count for status, count in statuses.items() if status == 'exception' or status >= 400)
+    return {
+        "scenario": name,
+        "requests": len(latencies),
+        "concurrency": concurrency,
+        "seconds": round(wall, 3),
+        "req_per_sec": round(len(latencies) / wall, 1) if wall else None,
+        "p50_ms": round(_percentile(latencies, 0.5) * 1000, 2) if latencies else None,
+        "p95_ms": round(_percentile(latencies, 0.95) * 1000, 2) if latencies else None,
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else None,
+        "errors": failures,
+        "statuses": {str(status): count for status, count in sorted(statuses.items(), key=str)},
+        "max_rss_mb": _max_rss_mb(),
+        "rss_growth_mb": round(_max_rss_mb() - rss_before, 1),
+        "sample_errors": errors[:3],
+    }
+
+
+def build_app(args, workdir):
+    """Seeds the stand-in database, installs it and the fake LLM, and imports the app."""
+    from bench_support import SQLiteConnection, FakeLLM, seed_database
+    import db
+
+    db_path = args.db or os.path.join(workdir, 'bench.sqlite3')
+    seed_conn = SQLiteConnection(db_path)
+    employee_ids = seed_database(seed_conn, employees=args.employees, seed=args.seed)
+    seed_conn.close()
+    db.use_pool(db.ConnectionPool(max_size=args.pool_size, connect=SQLiteConnection, path=db_path))
+    # Create the feature tables up front. The app creates them lazily from a
+    # second connection, which is harmless with MySQL row locks but would wait
+    # on SQLite's database-wide write lock held by the first one.
+    import dashboard_summary
+    import jobs
+    import recommendations
+    import department_analysis
+    import change_log
+    db.ensure_schema('dashboard_summary', dashboard_summary.SUMMARY_SCHEMA)
+    db.ensure_schema('jobs', jobs.JOBS_SCHEMA)
+    db.ensure_schema('recommendations', recommendations.RECOMMENDATION_SCHEMA)
+    db.ensure_schema('department_analysis', department_analysis.ANALYSIS_SCHEMA)
+    db.ensure_schema('change_log', change_log.CHANGE_LOG_SCHEMA)
+    import course_assignments
+    course_assignments.ensure_course_assignment_key()
+
+    import ai_agents
+    ai_agents.set_llm(FakeLLM(latency=args.llm_latency, jitter=args.llm_jitter, seed=args.seed))
+    if not args.ai_cache:
+        from cache import LRUCache
+        # A zero-size cache evicts on every write, so every request reaches the (fake) LLM.
+        ai_agents.ai_cache = LRUCache(max_entries=0)
+        ai_agents.ai_stale_cache = LRUCache(max_entries=0)
+
+    from app import app
+    app.config['TESTING'] = True
+    return app, {"employee_ids": employee_ids, "list_cursors": {}, "upload_rows": args.upload_rows}
+
+
+def compare(results, baseline, tolerance):
+    """Returns human-readable regressions against a previous --json output."""
+    previous = {row["scenario"]: row for row in baseline["results"]}
+    regressions = []
+    for row in results:
+        old = previous.get(row["scenario"])
+        if not old:
+            continue
+        if old["req_per_sec"] and row["req_per_sec"] < old["req_per_sec"] * (1 - tolerance):
+            regressions.append(f"{row['scenario']}: req/s {old['req_per_sec']} -> {row['req_per_sec']}")
+        if old["p95_ms"] and row["p95_ms"] > old["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{row['scenario']}: p95 {old['p95_ms']}ms -> {row['p95_ms']}ms")
+        if row["errors"] > old["errors"]:
+            regressions.append(f"{row['scenario']}: errors {old['errors']} -> {row['errors']}")
+    return regressions
+
+
+def print_table(results):
+    header = f"{'scenario':<18}{'reqs':>7}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}{'errors':>8}{'rss MB':>9}"
+    print(header)
+    print("-" * len(header))
+    for row in results:
+        print(f"{row['scenario']:<18}{row['requests']:>7}{row['req_per_sec']:>9}{row['p50_ms']:>9}"
+              f"{row['p95_ms']:>9}{row['p99_ms']:>9}{row['max_ms']:>9}{row['errors']:>8}{row['max_rss_mb']:>9}")
+        for error in row["sample_errors"]:
+            print(f"    ! {error}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help=f"comma-separated: {', '.join(SCENARIOS)}")
+    parser.add_argument('--employees', type=int, default=2000, help="employees to seed")
+    parser.add_argument('--requests', type=int, default=200, help="requests per scenario")
+    parser.add_argument('--duration', type=float, default=None, help="seconds per scenario (overrides --requests)")
+    parser.add_argument('--concurrency', type=int, default=8, help="client threads")
+    parser.add_argument('--pool-size', type=int, default=10, help="database pool size")
+    parser.add_argument('--llm-latency', type=float, default=0.05, help="fake LLM latency in seconds")
+    parser.add_argument('--llm-jitter', type=float, default=0.0, help="extra random latency in seconds")
+    parser.add_argument('--ai-cache', action='store_true', help="keep the AI response cache enabled")
+    parser.add_argument('--upload-rows', type=int, default=500, help="rows per HR upload request")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--db', help="SQLite file to use (default: a temporary one)")
+    parser.add_argument('--json', help="write results to this file")
+    parser.add_argument('--baseline', help="compare with a previous --json file")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed regression ratio (default 0.2)")
+    args = parser.parse_args(argv)
+
+    names = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+
+    workdir = tempfile.mkdtemp(prefix='lms-bench-')
+    try:
+        app, context = build_app(args, workdir)
+        results = [
+            run_scenario(app, name, context, args.requests, args.concurrency, args.duration, args.seed)
+            for name in names
+        ]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print_table(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("\nNo regressions against the baseline.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
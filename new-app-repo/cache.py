@@ -0,0 +1,243 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# ----------- Cache Backends -----------
+# Both backends share the same small interface:
+#   get(key) -> value or None, set(key, value, tags=()), delete(key),
+#   invalidate_tag(tag), clear(), stats()
+# Values must be JSON-serializable (the SQLite backend stores them as JSON).
+
+
+class LRUCache:
+    """In-process, thread-safe LRU cache with a per-entry TTL and a size cap."""
+
+    def __init__(self, max_entries=1024, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (value, expires_at, tags)
+        self._tags = {}  # tag -> set(keys)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at, _ = entry
+            if expires_at < time.time():
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, tags=(), ttl=None):
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, expires_at, tuple(tags))
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._data) > self.max_entries:
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def invalidate_tag(self, tag):
+        with self._lock:
+            for key in list(self._tags.get(tag, ())):
+                self._remove(key)
+            self._tags.pop(tag, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._tags.clear()
+
+    def _remove(self, key):
+        """Drops a key and its tag references. Caller holds the lock."""
+        entry = self._data.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": "memory",
+                "entries": len(self._data),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class SQLiteCache:
+    """
+    On-disk cache backed by a SQLite file. Every gunicorn worker that points at
+    the same file shares hits. Least-recently-used rows are evicted once the
+    table grows past `max_entries`.
+    """
+
+    def __init__(self, path, max_entries=10000, ttl=3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+                " expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_tags ("
+                " tag TEXT NOT NULL, key TEXT NOT NULL, PRIMARY KEY (tag, key))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_tags_key ON cache_tags (key)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_accessed ON cache_entries (accessed_at)")
+
+    def _connect(self):
+        # One connection per thread (and per process, since the pid is part of the check).
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _count(self, attr):
+        with self._lock:
+            setattr(self, attr, getattr(self, attr) + 1)
+
+    def get(self, key):
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute(
+            "SELECT value, expires_at FROM cache_entries WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or row[1] < now:
+            if row is not None:
+                self.delete(key)
+            self._count('misses')
+            return None
+        conn.execute("UPDATE cache_entries SET accessed_at = ? WHERE key = ?", (now, key))
+        self._count('hits')
+        return json.loads(row[0])
+
+    def set(self, key, value, tags=(), ttl=None):
+        conn = self._connect()
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), expires_at, now)
+            )
+            conn.execute("DELETE FROM cache_tags WHERE key = ?", (key,))
+            conn.executemany(
+                "INSERT OR IGNORE INTO cache_tags (tag, key) VALUES (?, ?)",
+                [(tag, key) for tag in tags]
+            )
+            overflow = conn.execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                conn.execute(
+                    "DELETE FROM cache_tags WHERE key IN "
+                    "(SELECT key FROM cache_entries ORDER BY accessed_at LIMIT ?)", (overflow,)
+                )
+                conn.execute(
+                    "DELETE FROM cache_entries WHERE key IN "
+                    "(SELECT key FROM cache_entries ORDER BY accessed_at LIMIT ?)", (overflow,)
+                )
+                with self._lock:
+                    self.evictions += overflow
+
+    def delete(self, key):
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+            conn.execute("DELETE FROM cache_tags WHERE key = ?", (key,))
+
+    def invalidate_tag(self, tag):
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "DELETE FROM cache_entries WHERE key IN (SELECT key FROM cache_tags WHERE tag = ?)", (tag,)
+            )
+            conn.execute(
+                "DELETE FROM cache_tags WHERE key IN (SELECT key FROM cache_tags WHERE tag = ?)", (tag,)
+            )
+
+    def clear(self):
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM cache_entries")
+            conn.execute("DELETE FROM cache_tags")
+
+    def stats(self):
+        entries = self._connect().execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0]
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": "sqlite",
+                "path": self.path,
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def make_cache(prefix, default_max_entries=1024, default_ttl=3600):
+    """
+    Builds a cache configured from environment variables named after `prefix`:
+      <PREFIX>_BACKEND      'memory' (default) or 'sqlite'
+      <PREFIX>_PATH         SQLite file, shared by all workers on the host
+      <PREFIX>_MAX_ENTRIES  size cap
+      <PREFIX>_TTL          seconds an entry stays valid
+    """
+    backend = os.getenv(f'{prefix}_BACKEND', 'memory').lower()
+    max_entries = int(os.getenv(f'{prefix}_MAX_ENTRIES', str(default_max_entries)))
+    ttl = float(os.getenv(f'{prefix}_TTL', str(default_ttl)))
+    if backend == 'sqlite':
+        path = os.getenv(f'{prefix}_PATH', os.path.join('instance', f'{prefix.lower()}.sqlite3'))
+        return SQLiteCache(path, max_entries=max_entries, ttl=ttl)
+    return LRUCache(max_entries=max_entries, ttl=ttl)
@@ -0,0 +1,175 @@
+import json
+import os
+from decimal import Decimal
+from db import get_db_connection, ensure_schema
+from jobs import register_job_type, register_periodic_job
+
+# ----------- Change Log -----------
+# Every write path appends what it changed to `change_log` with the cursor of
+# its own transaction, so an entry exists exactly when the change was
+# committed. `seq` only grows; downstream systems call
+# /admin/changes?since=<last seq they saw> for an incremental sync instead of
+# re-downloading the full report.
+#
+# Entities:
+#   employee          entity_id = employee id (insert: full row, update: changed columns, delete)
+#   course_assigned   entity_id = "<emp_id>:<course_name>" (insert / update with status and progress)
+#   assessment_marks  entity_id = "<emp_id>:<course_name>" (insert per result)
+#
+# Sequence numbers are handed out when a row is inserted but become visible
+# at commit, so a long transaction could commit a lower seq after a reader
+# has moved past it. The feed therefore only returns entries older than
+# CHANGE_FEED_SETTLE_SECONDS, which must exceed the longest write transaction
+# (the bulk upload commits every HR_BULK_BATCH_SIZE rows).
+#
+# Auto-increment leaves gaps (rolled-back inserts), so the lowest remaining
+# seq says nothing about pruning. Pruning records the highest seq it deleted
+# in change_log_pruned, and a consumer behind that mark must resync.
+
+CHANGE_FEED_SETTLE_SECONDS = int(os.getenv('CHANGE_FEED_SETTLE_SECONDS', '2'))
+CHANGE_FEED_PAGE_MAX = 5000
+CHANGE_LOG_RETENTION_DAYS = int(os.getenv('CHANGE_LOG_RETENTION_DAYS', '30'))
+
+CHANGE_ENTITIES = ('employee', 'course_assigned', 'assessment_marks')
+
+CHANGE_LOG_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS change_log (
+        seq BIGINT AUTO_INCREMENT PRIMARY KEY,
+        entity VARCHAR(30) NOT NULL,
+        entity_id VARCHAR(255) NOT NULL,
+        operation VARCHAR(10) NOT NULL,
+        data LONGTEXT NULL,
+        changed_at DATETIME(3) NOT NULL,
+        KEY idx_change_log_changed_at (changed_at)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS change_log_pruned (
+        id TINYINT PRIMARY KEY,
+        pruned_through BIGINT NOT NULL
+    )
+    """
+]
+
+
+def _ensure():
+    ensure_schema('change_log', CHANGE_LOG_SCHEMA)
+
+
+def _json_value(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if hasattr(value, 'item'):  # numpy scalars from pandas frames
+        return value.item()
+    return str(value)
+
+
+def record_changes(cursor, changes):
+    """
+    changes: (entity, entity_id, operation, data dict or None) tuples, written
+    with one multi-row INSERT on the caller's cursor (and transaction).
+    """
+    changes = list(changes)
+    if not changes:
+        return
+    _ensure()
+    cursor.execute(
+        "INSERT INTO change_log (entity, entity_id, operation, data, changed_at) VALUES "
+        + ", ".join(["(%s, %s, %s, %s, NOW(3))"] * len(changes)),
+        [value for entity, entity_id, operation, data in changes for value in (
+            entity, str(entity_id), operation,
+            json.dumps(data, default=_json_value) if data is not None else None
+        )]
+    )
+
+
+def employee_change(emp_id, operation, data=None):
+    return ('employee', emp_id, operation, data)
+
+
+def course_change(entity, emp_id, course_name, operation, data):
+    return (entity, f"{emp_id}:{course_name}", operation, dict(data, emp_id=emp_id, course_name=course_name))
+
+
+# ----------- Change Feed -----------
+
+def read_changes(since=0, limit=1000, entity=None):
+    """
+    Entries with seq > since (oldest first, at most `limit`), plus the
+    cursor to continue from. resync_required is set when entries after
+    `since` may have been pruned, i.e. the consumer needs a full export.
+    """
+    _ensure()
+    limit = max(1, min(int(limit), CHANGE_FEED_PAGE_MAX))
+    query = ("SELECT seq, entity, entity_id, operation, data, changed_at FROM change_log "
+             "WHERE seq > %s AND changed_at <= NOW(3) - INTERVAL %s SECOND")
+    params = [since, CHANGE_FEED_SETTLE_SECONDS]
+    if entity:
+        query += " AND entity = %s"
+        params.append(entity)
+    query += " ORDER BY seq LIMIT %s"
+    params.append(limit + 1)
+
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+            cursor.execute(
+                "SELECT (SELECT MAX(seq) FROM change_log) AS head, "
+                "(SELECT pruned_through FROM change_log_pruned WHERE id = 1) AS pruned_through"
+            )
+            bounds = cursor.fetchone()
+    finally:
+        conn.close()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    changes = [{
+        "seq": int(row['seq']),
+        "entity": row['entity'],
+        "entity_id": row['entity_id'],
+        "operation": row['operation'],
+        "data": json.loads(row['data']) if row['data'] else None,
+        "changed_at": row['changed_at'].isoformat() if hasattr(row['changed_at'], 'isoformat') else row['changed_at'],
+    } for row in rows]
+    pruned_through = int(bounds['pruned_through'] or 0)
+    return {
+        "changes": changes,
+        "next_since": changes[-1]["seq"] if changes else since,
+        "has_more": has_more,
+        "head": int(bounds['head']) if bounds['head'] is not None else 0,
+        "resync_required": since < pruned_through,
+    }
+
+
+def prune_change_log(target=None):
+    """Background job: drops entries older than CHANGE_LOG_RETENTION_DAYS."""
+    _ensure()
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT MAX(seq) AS last_seq FROM change_log WHERE changed_at < NOW(3) - INTERVAL %s SECOND",
+                (CHANGE_LOG_RETENTION_DAYS * 24 * 3600,)
+            )
+            last_seq = cursor.fetchone()['last_seq']
+            deleted = 0
+            if last_seq:
+                deleted = cursor.execute("DELETE FROM change_log WHERE seq <= %s", (last_seq,))
+                # The cutoff only moves forward, so last_seq never goes down.
+                cursor.execute(
+                    "INSERT INTO change_log_pruned (id, pruned_through) VALUES (1, %s) "
+                    "ON DUPLICATE KEY UPDATE pruned_through = VALUES(pruned_through)",
+                    (last_seq,)
+                )
+        conn.commit()
+    finally:
+        conn.close()
+    return {"deleted": deleted}
+
+
+register_job_type('prune_change_log', prune_change_log)
+if CHANGE_LOG_RETENTION_DAYS > 0:
+    register_periodic_job('prune_change_log', 'all', 24 * 3600)
@@ -0,0 +1,166 @@
+import os
+import threading
+import pymysql
+from pymysql.constants import ER
+from db import get_db_connection
+from dashboard_summary import record_course_status_changes, rebuild_summary
+from change_log import record_changes, course_change
+
+# ----------- Course Assignment Writes -----------
+# `course_assigned` has a unique key on (emp_id, course_name), so assigning a
+# course is one atomic upsert (concurrent clicks cannot create duplicates)
+# and assessment results for many courses are written with a fixed number of
+# statements per batch (at most five, see record_assessment_results) instead
+# of a few per result. That is not a single round trip: the dashboard summary
+# needs each course's previous status, which has to be read under a lock.
+
+COURSE_ASSIGNED_KEY = 'uq_course_assigned_emp_course'
+ASSESSMENT_MAX_SCORE = 10
+ASSESSMENT_PASSING_SCORE = int(os.getenv('ASSESSMENT_PASSING_SCORE', '7'))
+ASSESSMENT_BATCH_MAX = int(os.getenv('ASSESSMENT_BATCH_MAX', '1000'))
+
+_key_ready = False
+_key_lock = threading.Lock()
+
+
+def _create_key(cursor):
+    cursor.execute(f"CREATE UNIQUE INDEX {COURSE_ASSIGNED_KEY} ON course_assigned (emp_id, course_name)")
+
+
+def ensure_course_assignment_key():
+    """
+    Adds the unique key the first time this process writes assignments.
+    Existing duplicates (from before the key) are collapsed to the most
+    recent row first, and the dashboard summary is rebuilt afterwards.
+    """
+    global _key_ready
+    if _key_ready:
+        return
+    with _key_lock:
+        if _key_ready:
+            return
+        removed = 0
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cursor:
+                try:
+                    _create_key(cursor)
+                except pymysql.MySQLError as e:
+                    if e.args[0] == ER.DUP_KEYNAME:
+                        pass  # already there (or another worker just added it)
+                    elif e.args[0] == ER.DUP_ENTRY:
+                        removed = cursor.execute(
+                            "DELETE FROM course_assigned WHERE id NOT IN ("
+                            " SELECT keep_id FROM (SELECT MAX(id) AS keep_id FROM course_assigned"
+                            " GROUP BY emp_id, course_name) AS keep)"
+                        )
+                        _create_key(cursor)
+                    else:
+                        raise
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        _key_ready = True
+    if removed:
+        print(f"Removed {removed} duplicate course assignments before adding {COURSE_ASSIGNED_KEY}.")
+        rebuild_summary()
+
+
+def assign_course(cursor, emp_id, course_name):
+    """
+    Assigns a course in one statement. A completed course is reopened, an
+    unfinished one is left alone. Returns True if the employee got a new (or
+    reopened) assignment, False if it was already in progress.
+    """
+    # MySQL applies the SET list left to right, so `status` is changed last.
+    affected = cursor.execute(
+        "INSERT INTO course_assigned (emp_id, course_name, status, progress) VALUES (%s, %s, 'Not Started', 0) "
+        "ON DUPLICATE KEY UPDATE "
+        "assigned_date = CASE WHEN status = 'Completed' THEN NOW() ELSE assigned_date END, "
+        "progress = CASE WHEN status = 'Completed' THEN 0 ELSE progress END, "
+        "status = CASE WHEN status = 'Completed' THEN 'Not Started' ELSE status END",
+        (emp_id, course_name)
+    )
+    # Affected rows: 1 = inserted, 2 = reopened, 0 = unchanged.
+    if affected == 1:
+        record_course_status_changes(cursor, [(None, 'Not Started')])
+    elif affected == 2:
+        record_course_status_changes(cursor, [('Completed', 'Not Started')])
+    if affected:
+        record_changes(cursor, [course_change(
+            'course_assigned', emp_id, course_name, 'insert' if affected == 1 else 'update',
+            {"status": 'Not Started', "progress": 0}
+        )])
+    return affected > 0
+
+
+def record_assessment_results(cursor, results):
+    """
+    Stores assessment results [(emp_id, course_name, marks), ...] and moves
+    each assigned course to Completed (passed) or back to In Progress.
+    Statements for the whole batch, however many results it holds:
+      1. SELECT ... FOR UPDATE of the current statuses. The dashboard summary
+         counts courses per status, so it needs the old status of each
+         transition, and the lock keeps a concurrent submission from
+         counting the same transition twice.
+      2. multi-row INSERT into assessment_marks
+      3. multi-row status upsert (skipped when no course is assigned)
+      4. dashboard summary upsert (skipped when no status changes)
+      5. multi-row change_log INSERT
+    Returns one dict per result, in order.
+    """
+    keys = list(dict.fromkeys((emp_id, course_name) for emp_id, course_name, _ in results))
+    cursor.execute(
+        "SELECT emp_id, course_name, status FROM course_assigned WHERE (emp_id, course_name) IN ("
+        + ", ".join(["(%s, %s)"] * len(keys)) + ") FOR UPDATE",
+        [value for key in keys for value in key]
+    )
+    # Keys are compared case-insensitively, like MySQL's default collation.
+    statuses = {(row['emp_id'], row['course_name'].lower()): row['status'] for row in cursor.fetchall()}
+
+    cursor.execute(
+        "INSERT INTO assessment_marks (emp_id, course_name, marks_obtained) VALUES "
+        + ", ".join(["(%s, %s, %s)"] * len(results)),
+        [value for result in results for value in result]
+    )
+
+    outcomes, transitions, final = [], [], {}
+    for emp_id, course_name, marks in results:
+        passed = marks >= ASSESSMENT_PASSING_SCORE
+        key = (emp_id, course_name.lower())
+        assigned = key in statuses
+        if assigned:
+            new_status = 'Completed' if passed else 'In Progress'
+            transitions.append((statuses[key], new_status))
+            statuses[key] = new_status
+            final[key] = (emp_id, course_name, new_status, 100 if passed else 0)
+        outcomes.append({"emp_id": emp_id, "course_name": course_name, "score": marks,
+                         "passed": passed, "assigned": assigned})
+
+    if final:
+        # Every key exists, so this only updates; it is one statement for the batch.
+        cursor.execute(
+            "INSERT INTO course_assigned (emp_id, course_name, status, progress) VALUES "
+            + ", ".join(["(%s, %s, %s, %s)"] * len(final))
+            + " ON DUPLICATE KEY UPDATE status = VALUES(status), progress = VALUES(progress)",
+            [value for row in final.values() for value in row]
+        )
+    record_course_status_changes(cursor, transitions)
+    record_changes(cursor, [
+        course_change('assessment_marks', emp_id, course_name, 'insert', {"marks_obtained": marks})
+        for emp_id, course_name, marks in results
+    ] + [
+        course_change('course_assigned', emp_id, course_name, 'update', {"status": status, "progress": progress})
+        for emp_id, course_name, status, progress in final.values()
+    ])
+    return outcomes
+
+
+def assessment_message(outcome):
+    if outcome["passed"]:
+        return f"Congratulations! You passed with a score of {outcome['score']}/{ASSESSMENT_MAX_SCORE}."
+    return (f"You scored {outcome['score']}/{ASSESSMENT_MAX_SCORE}, which is below the passing mark of "
+            f"{ASSESSMENT_PASSING_SCORE}. Please review the material and try the assessment again.")
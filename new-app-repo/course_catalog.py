@@ -0,0 +1,196 @@
+import os
+import re
+import threading
+import time
+from difflib import SequenceMatcher
+from db import get_db_connection, SKILL_COLUMNS
+
+# ----------- In-Memory Course Catalog -----------
+# The `course` table is small and rarely changes, so each process keeps it in
+# memory with two indexes:
+#   skill  -> courses teaching it (from keywords in the name and file name)
+#   token  -> courses whose name contains it (candidates for fuzzy matching)
+# Recommendations resolve to a real CourseName from these indexes, and free
+# text (e.g. an LLM answer) is matched to the closest existing course, so
+# course_assigned only ever holds names that JOIN with `course`.
+
+# The catalog is reloaded from MySQL when it is older than this.
+COURSE_CATALOG_TTL = float(os.getenv('COURSE_CATALOG_TTL', '300'))
+# Minimum similarity (0-1) for free text to count as naming a course.
+COURSE_MATCH_THRESHOLD = float(os.getenv('COURSE_MATCH_THRESHOLD', '0.6'))
+
+# Tokens that mark a course as teaching a skill.
+SKILL_KEYWORDS = {
+    'HTML': {'html', 'htmltags', 'tags'},
+    'CSS': {'css'},
+    'JAVASCRIPT': {'javascript', 'js'},
+    'PYTHON': {'python', 'py'},
+    'C': {'c'},
+    'CPP': {'cpp'},
+    'JAVA': {'java'},
+    'SQL_TESTING': {'sql'},
+    'TOOLS_COURSE': {'tools', 'selenium', 'jmeter'},
+}
+
+# Words that say nothing about which course is meant.
+STOPWORDS = {
+    'a', 'an', 'and', 'the', 'to', 'for', 'of', 'in', 'on', 'with', 'course', 'intro',
+    'introduction', 'advanced', 'mastering', 'basics', 'fundamentals', 'beginners',
+}
+
+
+def tokenize(text):
+    """Lower-case word tokens; 'C++' becomes 'cpp' and digits are dropped ('js3' -> 'js')."""
+    text = (text or '').lower().replace('++', 'pp').replace('#', 'sharp')
+    return [token for token in re.findall(r'[a-z]+', text) if token not in STOPWORDS]
+
+
+def normalize(text):
+    return " ".join(tokenize(text))
+
+
+class Course:
+    __slots__ = ('name', 'file', 'tokens', 'normalized', 'skills')
+
+    def __init__(self, name, file):
+        self.name = name
+        self.file = file
+        self.tokens = frozenset(tokenize(name))
+        self.normalized = normalize(name)
+        file_tokens = set(tokenize(os.path.splitext(file or '')[0]))
+        self.skills = tuple(
+            skill for skill in SKILL_COLUMNS
+            if SKILL_KEYWORDS[skill] & (self.tokens | file_tokens)
+        )
+
+
+class CourseCatalog:
+    def __init__(self, ttl=COURSE_CATALOG_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._loaded_at = None
+        self._courses = {}      # CourseName -> Course
+        self._by_normalized = {}
+        self._by_skill = {}     # skill -> [Course], best match first
+        self._by_token = {}     # token -> [Course]
+        self.loads = 0
+
+    # ---- Loading ----
+
+    def load(self, rows=None):
+        """(Re)builds the indexes from `rows` (CourseName, CourseFile) or from the `course` table."""
+        if rows is None:
+            conn = get_db_connection()
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT CourseName, CourseFile FROM course")
+                    rows = cursor.fetchall()
+            finally:
+                conn.close()
+
+        courses = {}
+        for row in rows:
+            name = row['CourseName'] if isinstance(row, dict) else row[0]
+            file = row.get('CourseFile') if isinstance(row, dict) else row[1]
+            if name:
+                courses[name] = Course(name, file)
+
+        by_skill, by_token = {}, {}
+        for course in sorted(courses.values(), key=lambda c: c.name):
+            for skill in course.skills:
+                by_skill.setdefault(skill, []).append(course)
+            for token in course.tokens:
+                by_token.setdefault(token, []).append(course)
+        for skill, matches in by_skill.items():
+            # Courses named after the skill first, then the more specific ones.
+            keywords = SKILL_KEYWORDS[skill]
+            matches.sort(key=lambda c: (not (keywords & c.tokens), len(c.skills), c.name))
+
+        with self._lock:
+            self._courses = courses
+            self._by_normalized = {course.normalized: course for course in courses.values()}
+            self._by_skill = by_skill
+            self._by_token = by_token
+            self._loaded_at = time.monotonic()
+            self.loads += 1
+
+    def _expired(self):
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl
+
+    def _fresh(self):
+        if self._expired():
+            # One thread reloads; the others wait for it instead of querying too.
+            with self._load_lock:
+                if self._expired():
+                    self.load()
+
+    def invalidate(self):
+        """The next lookup reloads the catalog (call after changing the `course` table)."""
+        with self._lock:
+            self._loaded_at = None
+
+    # ---- Lookups ----
+
+    def get(self, name):
+        """The canonical CourseName for `name` (exact or same normalized words), or None."""
+        self._fresh()
+        if name in self._courses:
+            return name
+        course = self._by_normalized.get(normalize(name))
+        return course.name if course else None
+
+    def names(self):
+        self._fresh()
+        return sorted(self._courses)
+
+    def courses_for_skill(self, skill):
+        self._fresh()
+        return [course.name for course in self._by_skill.get(skill, [])]
+
+    def match(self, text, candidates=None):
+        """
+        Best existing course for free text, as (CourseName, score), or
+        (None, 0.0) below COURSE_MATCH_THRESHOLD. `candidates` limits the
+        search to those course names.
+        """
+        self._fresh()
+        exact = self.get(text)
+        if exact and (candidates is None or exact in candidates):
+            return exact, 1.0
+
+        tokens = set(tokenize(text))
+        if candidates is not None:
+            pool = [self._courses[name] for name in candidates if name in self._courses]
+        else:
+            # Only courses sharing a word with the text can score above the threshold.
+            pool = {course.name: course for token in tokens for course in self._by_token.get(token, [])}.values()
+
+        normalized = " ".join(sorted(tokens))
+        best, best_score = None, 0.0
+        for course in pool:
+            if not course.tokens:
+                continue
+            # Share of the course name found in the text, plus overall string similarity.
+            coverage = len(course.tokens & tokens) / len(course.tokens)
+            ratio = SequenceMatcher(None, normalized, " ".join(sorted(course.tokens))).ratio()
+            score = 0.8 * coverage + 0.2 * ratio
+            if score > best_score or (score == best_score and best and len(course.tokens) > len(best.tokens)):
+                best, best_score = course, score
+        if best is None or best_score < COURSE_MATCH_THRESHOLD:
+            return None, 0.0
+        return best.name, round(best_score, 4)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "courses": len(self._courses),
+                "skills": {skill: [c.name for c in matches] for skill, matches in sorted(self._by_skill.items())},
+                "uncovered_skills": [skill for skill in SKILL_COLUMNS if skill not in self._by_skill],
+                "loads": self.loads,
+                "age_seconds": round(time.monotonic() - self._loaded_at, 1) if self._loaded_at is not None else None,
+                "ttl_seconds": self.ttl,
+            }
+
+
+course_catalog = CourseCatalog()
@@ -0,0 +1,202 @@
+from collections import defaultdict
+from db import get_db_connection, ensure_schema, SKILL_COLUMNS, skill_score
+
+# ----------- Materialized Dashboard Statistics -----------
+# The admin dashboard reads small summary tables instead of scanning
+# `employee` and `course_assigned` on every load. The write paths keep them
+# current by calling the record_* helpers with their own cursor, so each
+# summary update commits (or rolls back) together with the change itself.
+# Department/role '' stands for "not assigned yet".
+
+SUMMARY_SCHEMA = [
+    f"""
+    CREATE TABLE IF NOT EXISTS dashboard_department_stats (
+        DEPARTMENT VARCHAR(100) NOT NULL PRIMARY KEY,
+        employees INT NOT NULL DEFAULT 0,
+        {', '.join(f'sum_{skill} DOUBLE NOT NULL DEFAULT 0' for skill in SKILL_COLUMNS)}
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS dashboard_role_stats (
+        ROLE VARCHAR(100) NOT NULL PRIMARY KEY,
+        employees INT NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS dashboard_course_status (
+        status VARCHAR(30) NOT NULL PRIMARY KEY,
+        courses INT NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS dashboard_stats_meta (
+        id TINYINT NOT NULL PRIMARY KEY,
+        rebuilt_at DATETIME NOT NULL
+    )
+    """,
+]
+
+
+def _ensure():
+    ensure_schema('dashboard_summary', SUMMARY_SCHEMA)
+
+
+def _apply_employee_deltas(cursor, rows, sign):
+    """Aggregates rows per department/role in Python and applies them as one upsert each."""
+    departments = defaultdict(lambda: [0] + [0.0] * len(SKILL_COLUMNS))
+    roles = defaultdict(int)
+    for row in rows:
+        totals = departments[row.get('DEPARTMENT') or '']
+        totals[0] += sign
+        for i, skill in enumerate(SKILL_COLUMNS, start=1):
+            totals[i] += sign * skill_score(row.get(skill))
+        roles[row.get('ROLE') or ''] += sign
+
+    if departments:
+        columns = ['DEPARTMENT', 'employees'] + [f'sum_{skill}' for skill in SKILL_COLUMNS]
+        placeholder = "(" + ", ".join(["%s"] * len(columns)) + ")"
+        updates = ", ".join(f"{col} = {col} + VALUES({col})" for col in columns[1:])
+        cursor.execute(
+            f"INSERT INTO dashboard_department_stats ({', '.join(columns)}) VALUES "
+            + ", ".join([placeholder] * len(departments))
+            + f" ON DUPLICATE KEY UPDATE {updates}",
+            [value for dept, totals in departments.items() for value in (dept, *totals)]
+        )
+    if roles:
+        cursor.execute(
+            "INSERT INTO dashboard_role_stats (ROLE, employees) VALUES "
+            + ", ".join(["(%s, %s)"] * len(roles))
+            + " ON DUPLICATE KEY UPDATE employees = employees + VALUES(employees)",
+            [value for role, count in roles.items() for value in (role, count)]
+        )
+
+
+def record_employees_added(cursor, rows):
+    """rows: dicts with DEPARTMENT, ROLE and skill columns (missing ones count as 0/unassigned)."""
+    _ensure()
+    _apply_employee_deltas(cursor, list(rows), 1)
+
+
+def record_employees_removed(cursor, rows):
+    _ensure()
+    _apply_employee_deltas(cursor, list(rows), -1)
+
+
+def record_role_assignments(cursor, changes):
+    """changes: (employee row before the update, new department, new role) tuples."""
+    _ensure()
+    changes = list(changes)
+    if not changes:
+        return
+    _apply_employee_deltas(cursor, [old for old, _, _ in changes], -1)
+    _apply_employee_deltas(
+        cursor,
+        [dict(old, DEPARTMENT=department, ROLE=role) for old, department, role in changes],
+        1
+    )
+
+
+def record_course_status_changes(cursor, transitions):
+    """transitions: (old status or None for a new assignment, new status) tuples."""
+    _ensure()
+    deltas = defaultdict(int)
+    for old_status, new_status in transitions:
+        if old_status == new_status:
+            continue
+        if old_status is not None:
+            deltas[old_status] -= 1
+        deltas[new_status] += 1
+    deltas = {status: delta for status, delta in deltas.items() if delta}
+    if deltas:
+        cursor.execute(
+            "INSERT INTO dashboard_course_status (status, courses) VALUES "
+            + ", ".join(["(%s, %s)"] * len(deltas))
+            + " ON DUPLICATE KEY UPDATE courses = courses + VALUES(courses)",
+            [value for status, delta in deltas.items() for value in (status, delta)]
+        )
+
+
+def rebuild_summary():
+    """Recomputes every summary table from the base tables in one transaction."""
+    _ensure()
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("DELETE FROM dashboard_department_stats")
+            cursor.execute("DELETE FROM dashboard_role_stats")
+            cursor.execute("DELETE FROM dashboard_course_status")
+            sums = ", ".join(f"COALESCE(SUM({skill}), 0)" for skill in SKILL_COLUMNS)
+            cursor.execute(
+                f"INSERT INTO dashboard_department_stats (DEPARTMENT, employees, "
+                f"{', '.join(f'sum_{skill}' for skill in SKILL_COLUMNS)}) "
+                f"SELECT COALESCE(DEPARTMENT, ''), COUNT(*), {sums} FROM employee GROUP BY COALESCE(DEPARTMENT, '')"
+            )
+            cursor.execute(
+                "INSERT INTO dashboard_role_stats (ROLE, employees) "
+                "SELECT COALESCE(ROLE, ''), COUNT(*) FROM employee GROUP BY COALESCE(ROLE, '')"
+            )
+            cursor.execute(
+                "INSERT INTO dashboard_course_status (status, courses) "
+                "SELECT status, COUNT(*) FROM course_assigned GROUP BY status"
+            )
+            cursor.execute(
+                "INSERT INTO dashboard_stats_meta (id, rebuilt_at) VALUES (1, NOW()) "
+                "ON DUPLICATE KEY UPDATE rebuilt_at = NOW()"
+            )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def read_summary():
+    """O(number of departments/roles) read of the dashboard statistics."""
+    _ensure()
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT rebuilt_at FROM dashboard_stats_meta WHERE id = 1")
+            meta = cursor.fetchone()
+    finally:
+        conn.close()
+    if not meta:
+        # First use: materialize from the base tables once.
+        rebuild_summary()
+
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT * FROM dashboard_department_stats WHERE employees > 0 ORDER BY DEPARTMENT")
+            departments = cursor.fetchall()
+            cursor.execute("SELECT ROLE, employees FROM dashboard_role_stats WHERE employees > 0 ORDER BY ROLE")
+            roles = cursor.fetchall()
+            cursor.execute("SELECT status, courses FROM dashboard_course_status WHERE courses > 0")
+            course_status = {row['status']: row['courses'] for row in cursor.fetchall()}
+            cursor.execute("SELECT rebuilt_at FROM dashboard_stats_meta WHERE id = 1")
+            meta = cursor.fetchone()
+    finally:
+        conn.close()
+
+    total_employees = sum(row['employees'] for row in departments)
+    assigned_courses = sum(course_status.values())
+    completed = course_status.get('Completed', 0)
+    return {
+        "total_employees": total_employees,
+        "departments": [
+            {
+                "department": row['DEPARTMENT'] or None,
+                "employees": row['employees'],
+                "avg_skills": {
+                    skill: round(row[f'sum_{skill}'] / row['employees'], 1) for skill in SKILL_COLUMNS
+                },
+            }
+            for row in departments
+        ],
+        "roles": [{"role": row['ROLE'] or None, "employees": row['employees']} for row in roles],
+        "course_status": course_status,
+        "assigned_courses": assigned_courses,
+        "completion_rate": round(completed * 100.0 / assigned_courses, 1) if assigned_courses else 0.0,
+        "rebuilt_at": meta['rebuilt_at'].isoformat() if meta else None,
+    }
@@ -1,11 +1,301 @@
 import pymysql
 import os
+import threading
+import time
+import weakref
+from collections import deque
+from profiling import current_profile, TimedCursor
+
+# Skill score columns of the employee table (scores out of 100).
+SKILL_COLUMNS = ['HTML', 'CSS', 'JAVASCRIPT', 'PYTHON', 'C', 'CPP', 'JAVA', 'SQL_TESTING', 'TOOLS_COURSE']
+
+
+def skill_score(value):
+    """A skill column value as a float; missing or unparseable values count as 0."""
+    try:
+        value = float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+    return 0.0 if value != value else value  # NaN from pandas counts as 0
+
+
+# ----------- Connection Pool -----------
+# Every blueprint calls get_db_connection() and closes the connection when it is
+# done. Instead of a fresh TCP + auth handshake per request, connections are
+# borrowed from a bounded per-process pool and close() hands them back.
+
+POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', '10'))
+POOL_MAX_IDLE_SECONDS = float(os.getenv('DB_POOL_MAX_IDLE_SECONDS', '300'))
+POOL_CHECKOUT_TIMEOUT = float(os.getenv('DB_POOL_CHECKOUT_TIMEOUT', '10'))
+
+
+class PoolExhaustedError(Exception):
+    """Raised when no connection could be checked out within the timeout."""
+
+
+class PooledConnection:
+    """
+    Thin wrapper around a pymysql connection. Everything is delegated to the
+    underlying connection except close(), which returns it to the pool.
+    close() is idempotent, and a wrapper that is garbage collected without
+    being closed gives its connection back as well, so a forgotten close()
+    cannot hold a pool slot forever.
+    """
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+        self._finalizer = weakref.finalize(self, _reclaim, pool, raw)
+        # Nothing to hand back to once the interpreter is shutting down.
+        self._finalizer.atexit = False
+
+    def __getattr__(self, name):
+        raw = self.__dict__.get('_raw')
+        if raw is None:
+            raise pymysql.err.InterfaceError("Connection already returned to the pool")
+        return getattr(raw, name)
+
+    def cursor(self, *args, **kwargs):
+        cursor = self.__getattr__('cursor')(*args, **kwargs)
+        # Profiled requests (see profiling.py) time every statement.
+        profile = current_profile()
+        return TimedCursor(cursor, profile) if profile is not None else cursor
+
+    @property
+    def open(self):
+        return self._raw is not None and self._raw.open
+
+    def close(self):
+        self._raw = None
+        # Detaches the finalizer, so the connection is released exactly once.
+        detached = self._finalizer.detach()
+        if detached is not None:
+            _, _, (pool, raw), _ = detached
+            pool.release(raw)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe pool of pymysql connections.
+
+    - checkout blocks up to `checkout_timeout` seconds when `max_size`
+      connections are already in use
+    - idle connections are pinged before being handed out (health check)
+    - connections idle for longer than `max_idle_seconds` are closed
+
+    `connect` replaces pymysql.connect (the benchmark uses it to pool SQLite
+    stand-in connections); it is called with `connect_kwargs`.
+    """
+
+    def __init__(self, max_size=POOL_MAX_SIZE, max_idle_seconds=POOL_MAX_IDLE_SECONDS,
+                 checkout_timeout=POOL_CHECKOUT_TIMEOUT, connect=None, **connect_kwargs):
+        self.max_size = max_size
+        self.max_idle_seconds = max_idle_seconds
+        self.checkout_timeout = checkout_timeout
+        self.connect_kwargs = connect_kwargs
+        self._connect_func = connect or pymysql.connect
+        self._idle = deque()  # (raw connection, returned_at)
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._stats = {
+            "created": 0,
+            "reused": 0,
+            "closed_idle": 0,
+            "closed_broken": 0,
+            "checkout_timeouts": 0,
+            "total_wait_ms": 0.0,
+            "checkouts": 0,
+            "reclaimed": 0,
+        }
+
+    def _connect(self):
+        raw = self._connect_func(**self.connect_kwargs)
+        with self._lock:
+            self._stats["created"] += 1
+        return raw
+
+    def _evict_idle(self, now):
+        """Closes idle connections that have exceeded max_idle_seconds. Caller holds the lock."""
+        expired = []
+        # Oldest returned connections sit at the left end of the deque.
+        while self._idle and now - self._idle[0][1] > self.max_idle_seconds:
+            expired.append(self._idle.popleft()[0])
+        self._stats["closed_idle"] += len(expired)
+        return expired
+
+    def acquire(self):
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=self.checkout_timeout):
+            with self._lock:
+                self._stats["checkout_timeouts"] += 1
+            raise PoolExhaustedError(
+                f"No database connection available after {self.checkout_timeout}s "
+                f"(pool size {self.max_size})"
+            )
+
+        try:
+            raw = None
+            while raw is None:
+                with self._lock:
+                    expired = self._evict_idle(time.monotonic())
+                    candidate = self._idle.pop()[0] if self._idle else None
+                for conn in expired:
+                    _close_quietly(conn)
+
+                if candidate is None:
+                    raw = self._connect()
+                    break
+
+                # Health check on borrow: a dead socket is discarded and we try the next one.
+                try:
+                    candidate.ping(reconnect=False)
+                    raw = candidate
+                    with self._lock:
+                        self._stats["reused"] += 1
+                except Exception:
+                    _close_quietly(candidate)
+                    with self._lock:
+                        self._stats["closed_broken"] += 1
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._in_use += 1
+            self._stats["checkouts"] += 1
+            self._stats["total_wait_ms"] += (time.monotonic() - started) * 1000
+        return PooledConnection(self, raw)
+
+    def release(self, raw):
+        keep = raw.open
+        if keep:
+            # Never hand out a connection with a half-finished transaction.
+            try:
+                raw.rollback()
+            except Exception:
+                keep = False
+
+        with self._lock:
+            self._in_use -= 1
+            if keep:
+                self._idle.append((raw, time.monotonic()))
+            else:
+                self._stats["closed_broken"] += 1
+        if not keep:
+            _close_quietly(raw)
+        self._slots.release()
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for raw, _ in idle:
+            _close_quietly(raw)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                "max_size": self.max_size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "avg_wait_ms": round(stats["total_wait_ms"] / stats["checkouts"], 3) if stats["checkouts"] else 0.0,
+            })
+        stats["total_wait_ms"] = round(stats["total_wait_ms"], 3)
+        return stats
+
+
+def _reclaim(pool, raw):
+    """Finalizer of a PooledConnection that was dropped without close()."""
+    with pool._lock:
+        pool._stats["reclaimed"] += 1
+    pool.release(raw)
+
+
+def _close_quietly(raw):
+    try:
+        raw.close()
+    except Exception:
+        pass
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """
+    Returns this process' pool. Gunicorn forks workers after import, so the
+    pool is keyed by pid to make sure sockets are never shared across workers.
+    """
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                _pool = ConnectionPool(
+                    host=os.getenv('DB_HOST', 'localhost'),
+                    user=os.getenv('DB_USER', 'root'),
+                    password=os.getenv('DB_PASSWORD', '1234'),
+                    database=os.getenv('DB_NAME', 'company_roles'),  # <-- UPDATED a
+                    cursorclass=pymysql.cursors.DictCursor
+                )
+                _pool_pid = pid
+    return _pool
+
+
+def use_pool(pool):
+    """Installs `pool` as this process' pool (benchmarks and local tooling)."""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is not None and _pool is not pool:
+            _pool.close_all()
+        _pool = pool
+        _pool_pid = os.getpid()
+
 
 def get_db_connection():
-    return pymysql.connect(
-        host=os.getenv('DB_HOST', 'localhost'),
-        user=os.getenv('DB_USER', 'root'),
-        password=os.getenv('DB_PASSWORD', '1234'),
-        database=os.getenv('DB_NAME', 'company_roles'),  # <-- UPDATED a
-        cursorclass=pymysql.cursors.DictCursor
-    )
\ No newline at end of file
+    """Checks a connection out of the pool. Call close() to give it back."""
+    profile = current_profile()
+    if profile is None:
+        return get_pool().acquire()
+    started = time.perf_counter()
+    conn = get_pool().acquire()
+    profile.record_connection(time.perf_counter() - started)
+    return conn
+
+
+def pool_stats():
+    return get_pool().stats()
+
+# ----------- Schema Helpers -----------
+_schema_ready = set()
+_schema_lock = threading.Lock()
+
+
+def ensure_schema(name, statements):
+    """
+    Runs idempotent DDL (CREATE TABLE IF NOT EXISTS ...) the first time a
+    feature needs its tables in this process. `name` identifies the group.
+    """
+    if name in _schema_ready:
+        return
+    with _schema_lock:
+        if name in _schema_ready:
+            return
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cursor:
+                for statement in statements:
+                    cursor.execute(statement)
+            conn.commit()
+        finally:
+            conn.close()
+        _schema_ready.add(name)
\ No newline at end of file
@@ -0,0 +1,338 @@
+import os
+import re
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from db import get_db_connection, ensure_schema
+from jobs import register_job_type
+from ai_agents import call_ai, skill_highlights
+from employee_profiles import PROFILE_COLUMNS, get_employee_profile
+from metrics import instrument_agent
+
+# ----------- Department Analysis -----------
+# AI upskilling reports for a whole department in one background job instead
+# of one LLM request per employee:
+#   1. every employee of the department is read with one query,
+#   2. employees are grouped by skill profile (role, top and weakest skills
+#      and the score band of each), and a group shares one analysis,
+#   3. several profiles are packed into each LLM request, which answers in a
+#      fixed record format, and DEPARTMENT_ANALYSIS_PARALLELISM requests run
+#      at a time,
+#   4. results are stored per employee in `employee_analysis`, where the
+#      admin AI report page and the CSV export pick them up.
+# A stored analysis is used as long as the employee's profile key still
+# matches, so employees whose skills changed are re-analyzed on the next run.
+
+# Profiles per LLM request.
+DEPARTMENT_ANALYSIS_BATCH_SIZE = int(os.getenv('DEPARTMENT_ANALYSIS_BATCH_SIZE', '8'))
+# LLM requests in flight per department job (llm_guard still applies).
+DEPARTMENT_ANALYSIS_PARALLELISM = int(os.getenv('DEPARTMENT_ANALYSIS_PARALLELISM', '4'))
+# Stored analyses older than this are regenerated.
+DEPARTMENT_ANALYSIS_MAX_AGE = int(os.getenv('DEPARTMENT_ANALYSIS_MAX_AGE', str(24 * 3600)))
+# Width of a score band in the profile key: 20 -> 0-19, 20-39, ..., 80-100.
+ANALYSIS_BAND_WIDTH = 20
+
+ANALYSIS_FIELDS = ['summary', 'strengths', 'roadmap', 'remark']
+
+ANALYSIS_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS employee_analysis (
+        emp_id INT NOT NULL PRIMARY KEY,
+        DEPARTMENT VARCHAR(100) NULL,
+        skill_profile VARCHAR(255) NOT NULL,
+        summary TEXT NOT NULL,
+        strengths TEXT NOT NULL,
+        roadmap TEXT NOT NULL,
+        remark TEXT NOT NULL,
+        generated_at DATETIME NOT NULL,
+        KEY idx_employee_analysis_department (DEPARTMENT)
+    )
+    """
+]
+
+# "=== P3" starts the answer for the third profile of a request.
+_RECORD_HEADER = re.compile(r'^[ \t*#=]*=+[ \t]*P(\d+)[ \t\r*#=]*$', re.M)
+
+
+def _ensure():
+    ensure_schema('department_analysis', ANALYSIS_SCHEMA)
+
+
+def _band(score):
+    return min(int(score // ANALYSIS_BAND_WIDTH), 99 // ANALYSIS_BAND_WIDTH)
+
+
+def _band_label(band):
+    low = band * ANALYSIS_BAND_WIDTH
+    high = 100 if band == 99 // ANALYSIS_BAND_WIDTH else low + ANALYSIS_BAND_WIDTH - 1
+    return f"{low}-{high}"
+
+
+def analysis_profile(employee):
+    """
+    (key, role, top [(skill, band)], weakest [(skill, band)]) for an employee
+    row, or None without any skill data. Employees with the same key get the
+    same analysis.
+    """
+    _, top_skills, weak_skills = skill_highlights(employee)
+    if not top_skills:
+        return None
+    role = employee.get('ROLE') or 'Unassigned'
+    top = [(skill, _band(score)) for skill, score in top_skills.items()]
+    weak = [(skill, _band(score)) for skill, score in weak_skills.items()]
+    key = "|".join([role, ",".join(f"{s}{b}" for s, b in top), ",".join(f"{s}{b}" for s, b in weak)])
+    return key[:255], role, top, weak
+
+
+# ----------- Prompt and Response Format -----------
+# call_ai strips quotes from model output, so the answer uses labelled lines
+# rather than JSON.
+
+def build_batch_prompt(department, profiles):
+    lines = "\n".join(
+        f"    Profile P{i}: role {role}; strongest: "
+        + ", ".join(f"{skill} {_band_label(band)}" for skill, band in top)
+        + "; weakest: " + ", ".join(f"{skill} {_band_label(band)}" for skill, band in weak)
+        for i, (_, role, top, weak) in enumerate(profiles, 1)
+    )
+    return f"""
+    You are an expert AI Career Development Analyst for a corporate Learning Management System.
+    Write a concise, actionable, and encouraging upskilling roadmap for each employee skill profile below.
+    All employees work in the {department or 'unassigned'} department. Scores are out of 100.
+
+{lines}
+
+    Answer every profile, in order, in exactly this format and with no other text:
+    === P1
+    SUMMARY: 2-3 sentences on the skill set in relation to the role and department.
+    STRENGTHS: the top skills and why they are valuable for the role, separated by |
+    ROADMAP: 3-4 clear, actionable steps, weakest skills first, separated by |
+    REMARK: one short, encouraging sentence.
+    """
+
+
+def parse_batch_response(text, count):
+    """{profile index: {summary, strengths, roadmap, remark}} for every complete record in the answer."""
+    results = {}
+    parts = _RECORD_HEADER.split(text)
+    for number, body in zip(parts[1::2], parts[2::2]):
+        index = int(number) - 1
+        if not 0 <= index < count:
+            continue
+        fields = {}
+        for line in body.splitlines():
+            name, separator, value = line.partition(':')
+            name = name.strip(' *-#').lower()
+            if separator and name in ANALYSIS_FIELDS:
+                fields[name] = value.strip(' *')
+        if fields.get('summary') and fields.get('roadmap'):
+            results[index] = {
+                "summary": fields['summary'],
+                "strengths": [item.strip() for item in fields.get('strengths', '').split('|') if item.strip()],
+                "roadmap": [item.strip() for item in fields['roadmap'].split('|') if item.strip()],
+                "remark": fields.get('remark', ''),
+            }
+    return results
+
+
+def analysis_markdown(result):
+    """The stored fields in the markdown layout of the single-employee report."""
+    lines = ["**Overall Summary:**", result['summary'], "", "**Key Strengths:**"]
+    lines += [f"- {item}" for item in result['strengths']]
+    lines += ["", "**Recommended Upskilling Roadmap:**"]
+    lines += [f"- {item}" for item in result['roadmap']]
+    lines += ["", "**Concluding Remark:**", result['remark']]
+    return "\n".join(lines)
+
+
+# ----------- Batch Job -----------
+
+def _department_employees(department):
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"SELECT {', '.join(PROFILE_COLUMNS)} FROM employee WHERE DEPARTMENT = %s ORDER BY id",
+                (department,)
+            )
+            return cursor.fetchall()
+    finally:
+        conn.close()
+
+
+def _fresh_keys(department):
+    """{emp_id: skill_profile} of the department's analyses that have not expired."""
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT emp_id, skill_profile FROM employee_analysis "
+                "WHERE DEPARTMENT = %s AND generated_at >= NOW() - INTERVAL %s SECOND",
+                (department, DEPARTMENT_ANALYSIS_MAX_AGE)
+            )
+            return {int(row['emp_id']): row['skill_profile'] for row in cursor.fetchall()}
+    finally:
+        conn.close()
+
+
+@instrument_agent('department_analysis_agent', failed=lambda results: not results)
+def _analyze_batch(department, profiles):
+    answer = call_ai(build_batch_prompt(department, profiles), cache_tags=("department_analysis",))
+    if answer.startswith("AI Error"):
+        return {}
+    return parse_batch_response(answer, len(profiles))
+
+
+def _store(department, rows):
+    """rows: [(emp_id, profile key, result)]; one multi-row upsert."""
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO employee_analysis "
+                "(emp_id, DEPARTMENT, skill_profile, summary, strengths, roadmap, remark, generated_at) VALUES "
+                + ", ".join(["(%s, %s, %s, %s, %s, %s, %s, NOW())"] * len(rows))
+                + " ON DUPLICATE KEY UPDATE DEPARTMENT = VALUES(DEPARTMENT), skill_profile = VALUES(skill_profile), "
+                "summary = VALUES(summary), strengths = VALUES(strengths), roadmap = VALUES(roadmap), "
+                "remark = VALUES(remark), generated_at = VALUES(generated_at)",
+                [value for emp_id, key, result in rows for value in (
+                    emp_id, department, key, result['summary'], "\n".join(result['strengths']),
+                    "\n".join(result['roadmap']), result['remark']
+                )]
+            )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def analyze_department(department):
+    """
+    Analyzes every employee of the department whose stored analysis is
+    missing, expired or for an older skill profile. Returns a report.
+    """
+    _ensure()
+    started = time.perf_counter()
+    employees = _department_employees(department)
+    if not employees:
+        raise LookupError(f"No employees found in department {department}.")
+    fresh = _fresh_keys(department)
+
+    groups = {}  # profile key -> [profile, [emp_id, ...]]
+    report = {"department": department, "employees": len(employees), "fresh": 0, "no_skill_data": 0}
+    for employee in employees:
+        profile = analysis_profile(employee)
+        if profile is None:
+            report["no_skill_data"] += 1
+        elif fresh.get(int(employee['id'])) == profile[0]:
+            report["fresh"] += 1
+        else:
+            groups.setdefault(profile[0], [profile, []])[1].append(int(employee['id']))
+
+    # Sorted keys put the same role and strongest skills in the same request.
+    profiles = [groups[key][0] for key in sorted(groups)]
+    batches = [profiles[i:i + DEPARTMENT_ANALYSIS_BATCH_SIZE]
+               for i in range(0, len(profiles), DEPARTMENT_ANALYSIS_BATCH_SIZE)]
+    report.update(profiles=len(profiles), llm_requests=len(batches), analyzed=0, failed_profiles=0)
+
+    if batches:
+        with ThreadPoolExecutor(min(DEPARTMENT_ANALYSIS_PARALLELISM, len(batches)),
+                                thread_name_prefix='department-analysis') as pool:
+            futures = {
+                pool.submit(contextvars.copy_context().run, _analyze_batch, department, batch): batch
+                for batch in batches
+            }
+            for future in as_completed(futures):
+                batch = futures[future]
+                try:
+                    results = future.result()
+                except Exception as e:
+                    print(f"Error analyzing a batch for department {department}: {e}")
+                    results = {}
+                rows = [
+                    (emp_id, profile[0], results[index])
+                    for index, profile in enumerate(batch) if index in results
+                    for emp_id in groups[profile[0]][1]
+                ]
+                if rows:
+                    _store(department, rows)
+                report["analyzed"] += len(rows)
+                report["failed_profiles"] += len(batch) - len(results)
+
+    if profiles and not report["analyzed"]:
+        # Fail the job so it can be retried instead of reporting an empty success.
+        raise RuntimeError(f"AI Error: no profile of department {department} could be analyzed.")
+    report["seconds"] = round(time.perf_counter() - started, 4)
+    return report
+
+
+def department_analysis_job(target):
+    """Background job handler; the target is the department name."""
+    return analyze_department(target)
+
+
+register_job_type('department_analysis', department_analysis_job)
+
+
+# ----------- Reading Stored Analyses -----------
+
+def get_stored_analysis(emp_id):
+    """
+    The employee's stored department analysis in the shape of the
+    single-employee report job result, or None if there is none, it
+    expired, or the employee's skills changed since.
+    """
+    _ensure()
+    employee = get_employee_profile(emp_id)
+    if not employee:
+        return None
+    profile = analysis_profile(employee)
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT skill_profile, summary, strengths, roadmap, remark FROM employee_analysis "
+                "WHERE emp_id = %s AND generated_at >= NOW() - INTERVAL %s SECOND",
+                (emp_id, DEPARTMENT_ANALYSIS_MAX_AGE)
+            )
+            row = cursor.fetchone()
+    finally:
+        conn.close()
+    if not row or profile is None or row['skill_profile'] != profile[0]:
+        return None
+
+    _, top_skills, weak_skills = skill_highlights(employee)
+    result = {
+        "summary": row['summary'],
+        "strengths": row['strengths'].split("\n") if row['strengths'] else [],
+        "roadmap": row['roadmap'].split("\n") if row['roadmap'] else [],
+        "remark": row['remark'],
+    }
+    return {
+        "employee": {"Name": employee.get('NAME'), "Domain": employee.get('DEPARTMENT'), "Role": employee.get('ROLE')},
+        "top_skills": {k: float(v) for k, v in top_skills.items()},
+        "weak_skills": {k: float(v) for k, v in weak_skills.items()},
+        "analysis": analysis_markdown(result),
+    }
+
+
+EXPORT_COLUMNS = ['id', 'NAME', 'ROLE', 'skill_profile', 'summary', 'strengths', 'roadmap', 'remark', 'generated_at']
+
+
+def department_analysis_rows(department):
+    """Stored analyses of the department for the CSV export, in id order."""
+    _ensure()
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT e.id, e.NAME, e.ROLE, a.skill_profile, a.summary, a.strengths, a.roadmap, a.remark, a.generated_at "
+                "FROM employee_analysis a JOIN employee e ON e.id = a.emp_id "
+                "WHERE a.DEPARTMENT = %s ORDER BY e.id",
+                (department,)
+            )
+            return cursor.fetchall()
+    finally:
+        conn.close()
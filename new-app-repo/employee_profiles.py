@@ -0,0 +1,94 @@
+from decimal import Decimal
+from db import get_db_connection, SKILL_COLUMNS
+from cache import make_cache
+
+# ----------- Employee Profile Cache -----------
+# Read-through cache of employee rows (name, department, role and skill
+# scores) keyed by id, used by the dashboard, login, the agents and the
+# recommender instead of querying `employee` for the same person again and
+# again. Every write path that changes those columns calls
+# invalidate_employee_profile. The default backend is per process; set
+# PROFILE_CACHE_BACKEND=sqlite so invalidations reach every worker on the
+# host immediately (otherwise other workers see the change within
+# PROFILE_CACHE_TTL seconds).
+
+PROFILE_COLUMNS = ['id', 'NAME', 'DEPARTMENT', 'ROLE'] + SKILL_COLUMNS
+
+profile_cache = make_cache('PROFILE_CACHE', default_max_entries=10000, default_ttl=300)
+
+
+def _profile_key(emp_id):
+    return f"emp:{int(emp_id)}"
+
+
+def _to_profile(row):
+    # Plain JSON types, so the SQLite backend can store it.
+    return {column: float(value) if isinstance(value, Decimal) else value for column, value in row.items()}
+
+
+def _fetch(cursor, emp_ids):
+    cursor.execute(
+        f"SELECT {', '.join(PROFILE_COLUMNS)} FROM employee WHERE id IN ({', '.join(['%s'] * len(emp_ids))})",
+        list(emp_ids)
+    )
+    return {int(row['id']): _to_profile(row) for row in cursor.fetchall()}
+
+
+def _cache_get(emp_id):
+    try:
+        return profile_cache.get(_profile_key(emp_id))
+    except Exception as e:
+        print(f"Profile cache read failed: {e}")
+        return None
+
+
+def _cache_set(emp_id, profile):
+    try:
+        profile_cache.set(_profile_key(emp_id), profile)
+    except Exception as e:
+        print(f"Profile cache write failed: {e}")
+
+
+def get_employee_profiles(emp_ids, cursor=None):
+    """
+    Profiles for several employees, {id: profile}; unknown ids are left out.
+    Misses are loaded with one query, on `cursor` if given (no extra
+    connection checkout), otherwise on a pooled connection.
+    """
+    profiles, missing = {}, []
+    for emp_id in dict.fromkeys(int(emp_id) for emp_id in emp_ids):
+        profile = _cache_get(emp_id)
+        if profile is not None:
+            profiles[emp_id] = dict(profile)
+        else:
+            missing.append(emp_id)
+    if not missing:
+        return profiles
+
+    if cursor is not None:
+        loaded = _fetch(cursor, missing)
+    else:
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as own_cursor:
+                loaded = _fetch(own_cursor, missing)
+        finally:
+            conn.close()
+    for emp_id, profile in loaded.items():
+        _cache_set(emp_id, profile)
+        profiles[emp_id] = dict(profile)
+    return profiles
+
+
+def get_employee_profile(emp_id, cursor=None):
+    """One employee's profile (a copy, safe to modify), or None if there is no such employee."""
+    if emp_id is None:
+        return None
+    return get_employee_profiles([emp_id], cursor).get(int(emp_id))
+
+
+def invalidate_employee_profile(emp_id):
+    try:
+        profile_cache.delete(_profile_key(emp_id))
+    except Exception as e:
+        print(f"Error invalidating profile cache for employee {emp_id}: {e}")
@@ -1,7 +1,11 @@
-from flask import Blueprint, jsonify, request, session, render_template, redirect
+from flask import Blueprint, jsonify, request, session, render_template, redirect, Response, stream_with_context
 from db import get_db_connection
 # We are now using the specific, mark-based recommender agent
-from ai_agents import profile_agent, assessment_agent, recommender_agent, tracker_agent, course_recommender_agent_v2
+from ai_agents import profile_agent, assessment_agent, recommender_agent, tracker_agent, invalidate_employee_ai_cache, stream_employee_agent, run_employee_agents, EMPLOYEE_AGENTS
+from recommendations import course_recommender_agent_v2
+from employee_profiles import invalidate_employee_profile
+from course_assignments import ensure_course_assignment_key, record_assessment_results, assessment_message, ASSESSMENT_MAX_SCORE, ASSESSMENT_BATCH_MAX
+import json
 import random
 
 employee_bp = Blueprint('employee', __name__)
@@ -28,6 +32,8 @@ def ask_agent():
 
     data = request.json
     agent_type = data.get('agent')
+    # Optional free-text question; progress/pending/score questions are answered from data.
+    question = (data.get('question') or '').strip() or None
     emp_code = session['emp_code']
 
     agent_functions = {
@@ -42,10 +48,107 @@ def ask_agent():
     if not agent_function:
         return jsonify({"error": "Unknown agent"}), 400
 
-    response = agent_function(emp_code)
+    response = agent_function(emp_code, question)
     return jsonify(response)
 
 
+@employee_bp.route('/ask_agent/stream', methods=['GET'])
+def ask_agent_stream():
+    """
+    Server-Sent Events version of /ask_agent: streams the answer as the model
+    generates it. Events: 'meta' (agent label and summary), unnamed chunk
+    events {"text": ...}, then 'done' with the /ask_agent JSON or 'error'.
+    Takes the same optional question as ?question=.
+    """
+    if session.get('role') != 'employee':
+        return jsonify({"error": "Unauthorized"}), 401
+
+    agent_type = request.args.get('agent')
+    if agent_type not in EMPLOYEE_AGENTS:
+        return jsonify({"error": "Unknown agent"}), 400
+    question = request.args.get('question', '').strip() or None
+    emp_code = session['emp_code']
+
+    def sse(data, event=None):
+        prefix = f"event: {event}\n" if event else ""
+        return f"{prefix}data: {json.dumps(data)}\n\n"
+
+    def generate():
+        spec = EMPLOYEE_AGENTS[agent_type]
+        yield sse({"agent": spec["label"], "summary": spec["summary"]}, event='meta')
+        for kind, payload in stream_employee_agent(agent_type, emp_code, question):
+            if kind == 'chunk':
+                yield sse({"text": payload})
+            elif kind == 'done':
+                yield sse(payload, event='done')
+            else:
+                yield sse({"error": payload}, event='error')
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def _requested_agents(agents):
+    """Agent types from a list or comma-separated string (default: all); None if any is unknown."""
+    if isinstance(agents, str):
+        agents = [agent.strip() for agent in agents.split(',') if agent.strip()]
+    agents = agents or list(EMPLOYEE_AGENTS)
+    if not isinstance(agents, list) or any(agent not in EMPLOYEE_AGENTS for agent in agents):
+        return None
+    return agents
+
+
+@employee_bp.route('/ask_agents', methods=['POST'])
+def ask_agents():
+    """
+    Runs several agents at once (JSON {"agents": [...], "question": ...},
+    default all four) and returns {"results": {agent_type: /ask_agent JSON}}.
+    The agents run concurrently, so this takes as long as the slowest one.
+    """
+    if session.get('role') != 'employee':
+        return jsonify({"error": "Unauthorized"}), 401
+
+    data = request.get_json(silent=True) or {}
+    agent_types = _requested_agents(data.get('agents'))
+    if agent_types is None:
+        return jsonify({"error": "Unknown agent"}), 400
+    question = (data.get('question') or '').strip() or None
+
+    results = dict(run_employee_agents(session['emp_code'], agent_types, question))
+    return jsonify({"results": {agent_type: results[agent_type] for agent_type in agent_types}})
+
+
+@employee_bp.route('/ask_agents/stream', methods=['GET'])
+def ask_agents_stream():
+    """
+    Server-Sent Events version of /ask_agents (?agents=profile,tracker&question=...):
+    one 'result' event {"type": agent_type, ...} per agent as soon as it
+    finishes, then 'done'.
+    """
+    if session.get('role') != 'employee':
+        return jsonify({"error": "Unauthorized"}), 401
+
+    agent_types = _requested_agents(request.args.get('agents', ''))
+    if agent_types is None:
+        return jsonify({"error": "Unknown agent"}), 400
+    question = request.args.get('question', '').strip() or None
+    emp_code = session['emp_code']
+
+    def generate():
+        for agent_type, response in run_employee_agents(emp_code, agent_types, question):
+            yield f"event: result\ndata: {json.dumps({'type': agent_type, **response})}\n\n"
+        yield f"event: done\ndata: {json.dumps({'agents': agent_types})}\n\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 # ------------- CORRECTED: Course Recommender Route -------------
 @employee_bp.route('/employee/recommend_course', methods=['GET'])
 def recommend_course():
@@ -58,7 +161,7 @@ def recommend_course():
     
     emp_id = session.get('emp_code')
     
-    # This calls the correct function from ai_agents.py
+    # Served from the recommendation store (recommendations.py); the LLM is only hit on a cold miss.
     result = course_recommender_agent_v2(emp_id)
     
     return jsonify(result), 200
@@ -112,7 +215,31 @@ def get_my_courses():
     finally:
         conn.close()
 
-# --- ASSESSMENT SUBMISSION ROUTE ---
+# --- ASSESSMENT SUBMISSION ROUTES ---
+def _submit_assessments(emp_id, course_names):
+    """
+    Scores and stores the assessments in one transaction, with the same
+    handful of statements for any number of courses (see
+    record_assessment_results).
+    """
+    ensure_course_assignment_key()
+    # Assessments are simulated: a random score out of ASSESSMENT_MAX_SCORE.
+    results = [(emp_id, name, random.randint(1, ASSESSMENT_MAX_SCORE)) for name in course_names]
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            outcomes = record_assessment_results(cursor, results)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    # Assessment results feed the agents' answers, so drop stale cached output.
+    invalidate_employee_ai_cache(emp_id)
+    invalidate_employee_profile(emp_id)
+    return outcomes
+
 @employee_bp.route('/employee/submit_assessment', methods=['POST'])
 def submit_assessment():
     if session.get('role') != 'employee':
@@ -125,37 +252,30 @@ def submit_assessment():
     if not course_name:
         return jsonify({"success": False, "message": "Course name not provided."}), 400
 
-    marks = random.randint(1, 10)
-    passing_score = 7
-
-    conn = get_db_connection()
     try:
-        with conn.cursor() as cursor:
-            cursor.execute(
-                "INSERT INTO assessment_marks (emp_id, course_name, marks_obtained) VALUES (%s, %s, %s)",
-                (emp_id, course_name, marks)
-            )
-
-            if marks >= passing_score:
-                cursor.execute(
-                    "UPDATE course_assigned SET status = 'Completed', progress = 100 WHERE emp_id = %s AND course_name = %s",
-                    (emp_id, course_name)
-                )
-                message = f"Congratulations! You passed with a score of {marks}/10."
-                passed = True
-            else:
-                cursor.execute(
-                    "UPDATE course_assigned SET progress = 0, status = 'In Progress' WHERE emp_id = %s AND course_name = %s",
-                    (emp_id, course_name)
-                )
-                message = f"You scored {marks}/10, which is below the passing mark of {passing_score}. Please review the material and try the assessment again."
-                passed = False
+        outcome = _submit_assessments(emp_id, [course_name])[0]
+    except Exception as e:
+        return jsonify({"success": False, "message": f"An error occurred: {e}"}), 500
+    return jsonify({"success": True, "passed": outcome["passed"], "score": outcome["score"], "message": assessment_message(outcome)})
+
+@employee_bp.route('/employee/submit_assessments', methods=['POST'])
+def submit_assessments():
+    """Batch variant: {"course_names": [...]} -> one result per course, written in one transaction."""
+    if session.get('role') != 'employee':
+        return jsonify({"success": False, "message": "Unauthorized"}), 401
 
-            conn.commit()
-            return jsonify({"success": True, "passed": passed, "score": marks, "message": message})
+    course_names = (request.get_json(silent=True) or {}).get('course_names')
+    if not isinstance(course_names, list) or not course_names or not all(isinstance(name, str) and name for name in course_names):
+        return jsonify({"success": False, "message": "course_names must be a non-empty list of course names."}), 400
+    if len(course_names) > ASSESSMENT_BATCH_MAX:
+        return jsonify({"success": False, "message": f"At most {ASSESSMENT_BATCH_MAX} assessments per request."}), 400
 
+    try:
+        outcomes = _submit_assessments(session.get('emp_code'), course_names)
     except Exception as e:
-        conn.rollback()
         return jsonify({"success": False, "message": f"An error occurred: {e}"}), 500
-    finally:
-        conn.close()
\ No newline at end of file
+    results = [
+        {"course_name": o["course_name"], "passed": o["passed"], "score": o["score"], "message": assessment_message(o)}
+        for o in outcomes
+    ]
+    return jsonify({"success": True, "results": results})
\ No newline at end of file
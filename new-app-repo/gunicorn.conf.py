@@ -0,0 +1,25 @@
+import os
+import time
+
+# ----------- Gunicorn Settings -----------
+# Picked up automatically when gunicorn is started from this directory
+# (e.g. `gunicorn app:app`). Bind address, worker count etc. still come from
+# the command line.
+
+# The app itself imports langchain and pandas lazily. With
+# GUNICORN_PRELOAD_HEAVY=1 the master imports them once before forking, so
+# all workers share those pages copy-on-write instead of each importing them
+# on first use. The LLM client is still created per worker.
+PRELOAD_HEAVY_MODULES = os.getenv('GUNICORN_PRELOAD_HEAVY', '0') == '1'
+
+# GUNICORN_PRELOAD_APP=1 additionally imports the whole app in the master.
+preload_app = os.getenv('GUNICORN_PRELOAD_APP', '0') == '1'
+
+
+def on_starting(server):
+    if not PRELOAD_HEAVY_MODULES:
+        return
+    started = time.perf_counter()
+    import ai_agents
+    ai_agents.preload_heavy_modules()
+    server.log.info("Preloaded langchain and pandas in %.2fs", time.perf_counter() - started)
@@ -0,0 +1,164 @@
+import io
+import os
+from werkzeug.sansio.multipart import MultipartDecoder, File, Data, Epilogue, NEED_DATA
+from ai_agents import hr_agent_bulk_ingest, MAX_REPORTED_REJECTIONS
+
+# ----------- Streaming Upload Ingestion -----------
+# Uploads are parsed straight from the request stream in fixed-size chunks and
+# every chunk goes through the HR agent's bulk insert path, so memory stays
+# flat regardless of file size and nothing is written to disk.
+
+HR_STREAM_CHUNK_ROWS = int(os.getenv('HR_STREAM_CHUNK_ROWS', '5000'))
+# Bytes read from the request per step when decoding a multipart upload.
+HR_MULTIPART_READ_SIZE = 64 * 1024
+
+
+class CountingStream(io.RawIOBase):
+    """
+    Adapts any object with read(n) (werkzeug's request stream, an uploaded
+    FileStorage stream) to a raw binary stream and counts the bytes consumed,
+    which is what upload progress is based on.
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._stream.read(len(buffer))
+        if not data:
+            return 0
+        size = len(data)
+        buffer[:size] = data
+        self.bytes_read += size
+        return size
+
+
+class MultipartFileStream(io.RawIOBase):
+    """
+    One file field of a multipart/form-data body, decoded as the body is
+    read. request.files would make Werkzeug parse the whole form first and
+    spool any file over 500 KB to a temporary file. `filename` is None when
+    the form has no such field.
+    """
+
+    def __init__(self, stream, boundary, field_name, read_size=HR_MULTIPART_READ_SIZE):
+        if not boundary:
+            raise ValueError("missing boundary")
+        self._stream = stream
+        self._decoder = MultipartDecoder(boundary.encode('latin-1'))
+        self._read_size = read_size
+        self._pending = b""
+        self._eof = False
+        self.filename = None
+        # Skip the parts before the file (their data is discarded).
+        while True:
+            event = self._next_event()
+            if isinstance(event, Epilogue):
+                self._eof = True
+                return
+            if isinstance(event, File) and event.name == field_name:
+                self.filename = event.filename
+                return
+
+    def _next_event(self):
+        while True:
+            event = self._decoder.next_event()
+            if event is not NEED_DATA:
+                return event
+            if self._decoder.complete:
+                raise ValueError("Unexpected end of multipart body")
+            self._decoder.receive_data(self._stream.read(self._read_size) or None)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._pending and not self._eof:
+            event = self._next_event()
+            if isinstance(event, Data):
+                self._pending = bytes(event.data)
+                self._eof = not event.more_data
+            else:
+                self._eof = True
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+
+def _is_json_lines(reader: io.BufferedReader):
+    """A .json upload whose first non-blank character is not '[' is treated as JSON lines."""
+    head = reader.peek(64).lstrip()
+    return not head.startswith(b'[')
+
+
+def iter_upload_chunks(stream: io.BufferedReader, extension: str, chunk_rows=None):
+    """
+    Yields DataFrames of at most `chunk_rows` rows. CSV and JSON-lines are
+    streamed; a JSON array or .xlsx workbook cannot be parsed incrementally
+    and is read in one go (still from memory, not from disk).
+    """
+    import pandas as pd
+    chunk_rows = chunk_rows or HR_STREAM_CHUNK_ROWS
+    extension = extension.lower()
+
+    if extension == 'csv':
+        yield from pd.read_csv(stream, chunksize=chunk_rows)
+    elif extension == 'jsonl' or (extension == 'json' and _is_json_lines(stream)):
+        yield from pd.read_json(stream, lines=True, chunksize=chunk_rows)
+    elif extension == 'json':
+        yield pd.read_json(stream)
+    elif extension == 'xlsx':
+        yield pd.read_excel(io.BytesIO(stream.read()))
+    else:
+        raise ValueError("Unsupported file format")
+
+
+def stream_ingest(raw_stream, extension: str, total_bytes=None, chunk_rows=None, batch_size=None):
+    """
+    Generator that ingests an upload chunk by chunk and yields a progress dict
+    after each chunk. The final dict has done=True plus success and message.
+    """
+    counter = CountingStream(raw_stream)
+    reader = io.BufferedReader(counter)
+    totals = {"rows_read": 0, "employees_added": 0, "rejected_count": 0, "rejected": [], "chunks": 0}
+
+    def progress(**extra):
+        update = dict(totals, bytes_read=counter.bytes_read, total_bytes=total_bytes)
+        if total_bytes:
+            update["percent"] = min(100.0, round(counter.bytes_read * 100.0 / total_bytes, 1))
+        update.update(extra)
+        return update
+
+    try:
+        for chunk in iter_upload_chunks(reader, extension, chunk_rows):
+            report = hr_agent_bulk_ingest(chunk, batch_size=batch_size)
+            totals["chunks"] += 1
+            totals["rows_read"] += len(chunk)
+            totals["employees_added"] += report["employees_added"]
+            totals["rejected_count"] += report["rejected_count"]
+            room = MAX_REPORTED_REJECTIONS - len(totals["rejected"])
+            if room > 0:
+                totals["rejected"].extend(report["rejected"][:room])
+            if report["error"]:
+                yield progress(done=True, success=False, message=_error_message(f"Error processing data: {report['error']}", totals))
+                return
+            yield progress(done=False)
+    except Exception as e:
+        yield progress(done=True, success=False, message=_error_message(f"Error reading file: {e}", totals))
+        return
+
+    message = f"AI HR Agent successfully onboarded {totals['employees_added']} new employees."
+    if totals["rejected_count"]:
+        message += f" {totals['rejected_count']} rows were rejected."
+    yield progress(done=True, success=True, message=message)
+
+
+def _error_message(message, totals):
+    if totals["employees_added"]:
+        message += f" ({totals['employees_added']} employees were onboarded before the error.)"
+    return message
@@ -0,0 +1,378 @@
+import json
+import os
+import queue
+import socket
+import threading
+import time
+import pymysql
+from pymysql.constants import ER
+from db import get_db_connection, ensure_schema
+
+# ----------- Background Job Queue -----------
+# Slow AI work (e.g. the employee analysis report) is enqueued here instead of
+# running inside the request. Jobs are persisted in the `ai_jobs` table so
+# results can be reused by later page views and any worker process can pick
+# up work left behind by another one. Each process runs a few daemon threads.
+#
+# A queued or running job holds `active_key` ("<job_type>:<target>"), which
+# has a unique key; finishing clears it. So concurrent enqueues of the same
+# work (two admins opening the same report, several workers' periodic jobs)
+# end up with one job instead of each inserting their own.
+
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+JOB_POLL_SECONDS = float(os.getenv('JOB_POLL_SECONDS', '5'))
+# A job 'running' for longer than this is assumed to belong to a dead worker.
+JOB_STALE_SECONDS = float(os.getenv('JOB_STALE_SECONDS', '600'))
+
+JOBS_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS ai_jobs (
+        id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        job_type VARCHAR(50) NOT NULL,
+        target VARCHAR(100) NOT NULL,
+        status VARCHAR(20) NOT NULL DEFAULT 'queued',
+        result LONGTEXT NULL,
+        error TEXT NULL,
+        attempts INT NOT NULL DEFAULT 0,
+        worker VARCHAR(100) NULL,
+        enqueued_at DATETIME(3) NOT NULL,
+        started_at DATETIME(3) NULL,
+        finished_at DATETIME(3) NULL,
+        active_key VARCHAR(160) NULL,
+        UNIQUE KEY uq_ai_jobs_active (active_key),
+        KEY idx_ai_jobs_target (job_type, target, status),
+        KEY idx_ai_jobs_status (status, id)
+    )
+    """
+]
+
+_handlers = {}
+_periodic = {}  # (job_type, target) -> interval seconds
+
+_active_key_ready = False
+_active_key_lock = threading.Lock()
+
+
+def _ensure():
+    """JOBS_SCHEMA, plus the active_key column on tables created before it."""
+    global _active_key_ready
+    ensure_schema('jobs', JOBS_SCHEMA)
+    if _active_key_ready:
+        return
+    with _active_key_lock:
+        if _active_key_ready:
+            return
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cursor:
+                try:
+                    cursor.execute("SELECT active_key FROM ai_jobs LIMIT 0")
+                except Exception:
+                    conn.rollback()
+                    try:
+                        cursor.execute(
+                            "ALTER TABLE ai_jobs ADD COLUMN active_key VARCHAR(160) NULL, "
+                            "ADD UNIQUE KEY uq_ai_jobs_active (active_key)"
+                        )
+                    except pymysql.MySQLError as e:
+                        if e.args[0] != ER.DUP_FIELDNAME:  # another worker just added it
+                            raise
+            conn.commit()
+        finally:
+            conn.close()
+        _active_key_ready = True
+
+
+def _active_key(job_type, target):
+    return f"{job_type}:{target}"
+
+
+def register_job_type(job_type, handler):
+    """
+    Registers the function that runs a job type. The handler receives the job
+    target (a string) and returns a JSON-serializable result, or raises.
+    """
+    _handlers[job_type] = handler
+
+
+def register_periodic_job(job_type, target, interval):
+    """
+    Enqueues (job_type, target) every `interval` seconds while the worker
+    threads run. A job that finished within the interval (in any process)
+    counts, so several workers do not each run it.
+    """
+    _periodic[(job_type, str(target))] = interval
+
+
+def _row_to_job(row):
+    if not row:
+        return None
+    job = dict(row)
+    job['result'] = json.loads(job['result']) if job.get('result') else None
+    for field in ('enqueued_at', 'started_at', 'finished_at'):
+        if job.get(field) is not None:
+            job[field] = job[field].isoformat()
+    return job
+
+
+class JobQueue:
+    def __init__(self, workers=JOB_WORKERS):
+        self.workers = workers
+        self._pending = queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._pid = None
+        self._worker_name = f"{socket.gethostname()}:{os.getpid()}"
+        self._local_stats = {"processed": 0, "failed": 0, "total_run_ms": 0.0}
+        self._next_periodic = {}  # (job_type, target) -> monotonic due time
+
+    # ---- Producer side ----
+
+    def enqueue(self, job_type, target, reuse_max_age=None, force=False):
+        """
+        Returns the job for (job_type, target). An unfinished job is always
+        reused; a finished one is reused if it is younger than
+        `reuse_max_age` seconds (None = forever). `force` skips reuse of
+        finished jobs.
+        """
+        if job_type not in _handlers:
+            raise ValueError(f"Unknown job type: {job_type}")
+        _ensure()
+        self.start()
+        target = str(target)
+        active_key = _active_key(job_type, target)
+
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT * FROM ai_jobs WHERE active_key = %s", (active_key,))
+                existing = cursor.fetchone()
+                if existing:
+                    return _row_to_job(existing)
+
+                if not force:
+                    query = ("SELECT * FROM ai_jobs WHERE job_type = %s AND target = %s "
+                             "AND status = 'done'")
+                    params = [job_type, target]
+                    if reuse_max_age is not None:
+                        query += " AND finished_at >= NOW(3) - INTERVAL %s SECOND"
+                        params.append(int(reuse_max_age))
+                    cursor.execute(query + " ORDER BY id DESC LIMIT 1", params)
+                    finished = cursor.fetchone()
+                    if finished:
+                        return _row_to_job(finished)
+
+                # If a concurrent request inserted the job first, the unique key
+                # turns this into a no-op and the SELECT returns that job.
+                cursor.execute(
+                    "INSERT INTO ai_jobs (job_type, target, status, enqueued_at, active_key) "
+                    "VALUES (%s, %s, 'queued', NOW(3), %s) "
+                    "ON DUPLICATE KEY UPDATE active_key = VALUES(active_key)",
+                    (job_type, target, active_key)
+                )
+                # Locking read: sees the other request's row even under REPEATABLE READ.
+                cursor.execute("SELECT * FROM ai_jobs WHERE active_key = %s FOR UPDATE", (active_key,))
+                job = cursor.fetchone()
+            conn.commit()
+        finally:
+            conn.close()
+
+        if job['status'] == 'queued':
+            # Harmless if it was already queued: only one worker can claim it.
+            self._pending.put(job['id'])
+        return _row_to_job(job)
+
+    def get(self, job_id):
+        _ensure()
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT * FROM ai_jobs WHERE id = %s", (job_id,))
+                return _row_to_job(cursor.fetchone())
+        finally:
+            conn.close()
+
+    def latest(self, job_type, target):
+        _ensure()
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "SELECT * FROM ai_jobs WHERE job_type = %s AND target = %s ORDER BY id DESC LIMIT 1",
+                    (job_type, str(target))
+                )
+                return _row_to_job(cursor.fetchone())
+        finally:
+            conn.close()
+
+    # ---- Worker side ----
+
+    def start(self):
+        """Starts this process' worker threads (once per process, fork-safe)."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._pending = queue.Queue()
+            self._worker_name = f"{socket.gethostname()}:{self._pid}"
+            self._threads = []
+            self._next_periodic = {}
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"ai-job-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _run(self):
+        while True:
+            try:
+                job_id = self._pending.get(timeout=JOB_POLL_SECONDS)
+            except queue.Empty:
+                job_id = None
+            try:
+                if job_id is None:
+                    self._enqueue_periodic()
+                    self._recover_orphans()
+                else:
+                    self._process(job_id)
+            except Exception as e:
+                print(f"Error in AI job worker: {e}")
+
+    def _enqueue_periodic(self):
+        now = time.monotonic()
+        due = []
+        with self._lock:
+            for key, interval in _periodic.items():
+                if self._next_periodic.get(key, 0) <= now:
+                    self._next_periodic[key] = now + interval
+                    due.append((key, interval))
+        for (job_type, target), interval in due:
+            self.enqueue(job_type, target, reuse_max_age=interval)
+
+    def _recover_orphans(self):
+        """Picks up queued jobs from other processes and requeues stale running ones."""
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "UPDATE ai_jobs SET status = 'queued', worker = NULL "
+                    "WHERE status = 'running' AND started_at < NOW(3) - INTERVAL %s SECOND",
+                    (int(JOB_STALE_SECONDS),)
+                )
+                conn.commit()
+                cursor.execute("SELECT id FROM ai_jobs WHERE status = 'queued' ORDER BY id LIMIT %s", (self.workers,))
+                orphan_ids = [row['id'] for row in cursor.fetchall()]
+        finally:
+            conn.close()
+        for job_id in orphan_ids:
+            self._process(job_id)
+
+    def _claim(self, job_id):
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cursor:
+                # Atomic claim: only one worker (in any process) moves it out of 'queued'.
+                claimed = cursor.execute(
+                    "UPDATE ai_jobs SET status = 'running', worker = %s, started_at = NOW(3), "
+                    "attempts = attempts + 1 WHERE id = %s AND status = 'queued'",
+                    (self._worker_name, job_id)
+                )
+                conn.commit()
+                if not claimed:
+                    return None
+                cursor.execute("SELECT job_type, target FROM ai_jobs WHERE id = %s", (job_id,))
+                return cursor.fetchone()
+        finally:
+            conn.close()
+
+    def _finish(self, job_id, status, result=None, error=None):
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "UPDATE ai_jobs SET status = %s, result = %s, error = %s, finished_at = NOW(3), "
+                    "active_key = NULL WHERE id = %s",
+                    (status, json.dumps(result) if result is not None else None, error, job_id)
+                )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _process(self, job_id):
+        job = self._claim(job_id)
+        if not job:
+            return
+        started = time.monotonic()
+        handler = _handlers.get(job['job_type'])
+        try:
+            if handler is None:
+                raise ValueError(f"No handler registered for job type {job['job_type']}")
+            result = handler(job['target'])
+            self._finish(job_id, 'done', result=result)
+            failed = False
+        except Exception as e:
+            self._finish(job_id, 'failed', error=str(e))
+            failed = True
+        with self._lock:
+            self._local_stats["processed"] += 1
+            self._local_stats["failed"] += int(failed)
+            self._local_stats["total_run_ms"] += (time.monotonic() - started) * 1000
+
+    # ---- Observability ----
+
+    def stats(self, window_seconds=3600):
+        """Queue depth and latency across all processes, plus this process' counters."""
+        _ensure()
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT status, COUNT(*) AS count FROM ai_jobs GROUP BY status")
+                by_status = {row['status']: row['count'] for row in cursor.fetchall()}
+                cursor.execute(
+                    """
+                    SELECT
+                        COUNT(*) AS finished,
+                        AVG(TIMESTAMPDIFF(MICROSECOND, enqueued_at, started_at)) / 1000 AS avg_wait_ms,
+                        MAX(TIMESTAMPDIFF(MICROSECOND, enqueued_at, started_at)) / 1000 AS max_wait_ms,
+                        AVG(TIMESTAMPDIFF(MICROSECOND, started_at, finished_at)) / 1000 AS avg_run_ms,
+                        MAX(TIMESTAMPDIFF(MICROSECOND, started_at, finished_at)) / 1000 AS max_run_ms
+                    FROM ai_jobs
+                    WHERE finished_at >= NOW(3) - INTERVAL %s SECOND
+                    """,
+                    (int(window_seconds),)
+                )
+                latency = cursor.fetchone()
+                cursor.execute(
+                    "SELECT TIMESTAMPDIFF(MICROSECOND, MIN(enqueued_at), NOW(3)) / 1000 AS oldest_queued_ms "
+                    "FROM ai_jobs WHERE status = 'queued'"
+                )
+                oldest = cursor.fetchone()
+        finally:
+            conn.close()
+
+        with self._lock:
+            local = dict(self._local_stats)
+        local["avg_run_ms"] = round(local.pop("total_run_ms") / local["processed"], 1) if local["processed"] else 0.0
+        local["workers"] = len(self._threads) if self._pid == os.getpid() else 0
+        local["local_backlog"] = self._pending.qsize()
+
+        def _ms(value):
+            return round(float(value), 1) if value is not None else None
+
+        return {
+            "depth": by_status.get('queued', 0),
+            "running": by_status.get('running', 0),
+            "by_status": by_status,
+            "oldest_queued_ms": _ms(oldest['oldest_queued_ms']),
+            "window_seconds": window_seconds,
+            "finished_in_window": latency['finished'],
+            "avg_wait_ms": _ms(latency['avg_wait_ms']),
+            "max_wait_ms": _ms(latency['max_wait_ms']),
+            "avg_run_ms": _ms(latency['avg_run_ms']),
+            "max_run_ms": _ms(latency['max_run_ms']),
+            "this_process": local,
+        }
+
+
+job_queue = JobQueue()
@@ -0,0 +1,278 @@
+import bisect
+import contextvars
+import functools
+import os
+import threading
+import time
+from collections import deque
+
+# ----------- Agent Instrumentation -----------
+# Every agent function is wrapped with @instrument_agent and call_ai reports
+# each LLM call (or cache hit) to the agent that is currently running, so for
+# each agent we know:
+#   calls, errors, in-flight count, end-to-end latency, LLM latency,
+#   time to first token (streamed responses), cache hits/misses,
+#   LLM calls rejected by the bulkhead/circuit breaker and stale answers served, prompt/response characters and tokens (when the model
+#   reports usage).
+# Counters are per process: with several gunicorn workers every worker
+# reports its own numbers (the `pid` field / label tells them apart).
+
+# Percentiles are computed over the most recent samples per agent.
+METRICS_WINDOW = int(os.getenv('METRICS_WINDOW', '1000'))
+# Histogram bucket upper bounds (seconds) for the Prometheus endpoint.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_current_call = contextvars.ContextVar('current_agent_call', default=None)
+
+
+class LatencyHistogram:
+    """Cumulative bucket counts for Prometheus plus a ring buffer for percentiles."""
+
+    def __init__(self, window=METRICS_WINDOW, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.bucket_counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._recent = deque(maxlen=window)
+
+    def observe(self, seconds):
+        self.bucket_counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self._recent.append(seconds)
+
+    def percentiles(self, *quantiles):
+        samples = sorted(self._recent)
+        if not samples:
+            return [None] * len(quantiles)
+        # Nearest-rank percentile.
+        return [samples[min(len(samples) - 1, max(0, int(round(q * len(samples))) - 1))] for q in quantiles]
+
+    def summary(self):
+        p50, p95, p99 = self.percentiles(0.5, 0.95, 0.99)
+
+        def _ms(value):
+            return round(value * 1000, 1) if value is not None else None
+
+        return {
+            "count": self.count,
+            "avg_ms": _ms(self.total / self.count) if self.count else None,
+            "p50_ms": _ms(p50),
+            "p95_ms": _ms(p95),
+            "p99_ms": _ms(p99),
+            "max_ms": _ms(self.max) if self.count else None,
+        }
+
+
+class AgentStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.latency = LatencyHistogram()
+        self.llm_calls = 0
+        self.llm_errors = 0
+        self.llm_latency = LatencyHistogram()
+        self.first_token_latency = LatencyHistogram()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.rejections = {}  # reason -> count
+        self.stale_served = 0
+        self.prompt_chars = 0
+        self.response_chars = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+
+class AgentMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._agents = {}
+        self.started_at = time.time()
+
+    def _stats(self, agent):
+        """Caller holds the lock."""
+        stats = self._agents.get(agent)
+        if stats is None:
+            stats = self._agents[agent] = AgentStats()
+        return stats
+
+    # ---- Recording ----
+
+    def agent_started(self, agent):
+        with self._lock:
+            self._stats(agent).in_flight += 1
+
+    def agent_finished(self, agent, seconds, failed):
+        with self._lock:
+            stats = self._stats(agent)
+            stats.in_flight -= 1
+            stats.calls += 1
+            stats.errors += int(failed)
+            stats.latency.observe(seconds)
+
+    def record_cache_hit(self, agent, prompt_chars):
+        with self._lock:
+            stats = self._stats(agent)
+            stats.cache_hits += 1
+            stats.prompt_chars += prompt_chars
+
+    def record_llm_call(self, agent, seconds, prompt_chars, response_chars=0,
+                        input_tokens=0, output_tokens=0, failed=False):
+        with self._lock:
+            stats = self._stats(agent)
+            stats.cache_misses += 1
+            stats.llm_calls += 1
+            stats.llm_errors += int(failed)
+            stats.llm_latency.observe(seconds)
+            stats.prompt_chars += prompt_chars
+            stats.response_chars += response_chars
+            stats.input_tokens += input_tokens
+            stats.output_tokens += output_tokens
+
+    def record_rejection(self, agent, reason, stale_served=False):
+        with self._lock:
+            stats = self._stats(agent)
+            stats.rejections[reason] = stats.rejections.get(reason, 0) + 1
+            stats.stale_served += int(stale_served)
+
+    def record_first_token(self, agent, seconds):
+        with self._lock:
+            self._stats(agent).first_token_latency.observe(seconds)
+
+    def reset(self):
+        with self._lock:
+            self._agents.clear()
+            self.started_at = time.time()
+
+    # ---- Reporting ----
+
+    def snapshot(self):
+        with self._lock:
+            agents = {}
+            for name, stats in sorted(self._agents.items()):
+                lookups = stats.cache_hits + stats.cache_misses
+                agents[name] = {
+                    "calls": stats.calls,
+                    "errors": stats.errors,
+                    "error_rate": round(stats.errors / stats.calls, 4) if stats.calls else 0.0,
+                    "in_flight": stats.in_flight,
+                    "latency": stats.latency.summary(),
+                    "llm_calls": stats.llm_calls,
+                    "llm_errors": stats.llm_errors,
+                    "llm_latency": stats.llm_latency.summary(),
+                    "first_token_latency": stats.first_token_latency.summary(),
+                    "cache_hits": stats.cache_hits,
+                    "cache_misses": stats.cache_misses,
+                    "cache_hit_rate": round(stats.cache_hits / lookups, 4) if lookups else 0.0,
+                    "rejections": dict(stats.rejections),
+                    "stale_served": stats.stale_served,
+                    "prompt_chars": stats.prompt_chars,
+                    "response_chars": stats.response_chars,
+                    "input_tokens": stats.input_tokens,
+                    "output_tokens": stats.output_tokens,
+                }
+            return {
+                "pid": os.getpid(),
+                "uptime_seconds": round(time.time() - self.started_at, 1),
+                "window": METRICS_WINDOW,
+                "agents": agents,
+            }
+
+    def prometheus(self, prefix='lms_agent'):
+        """Prometheus text exposition format (version 0.0.4)."""
+        pid = os.getpid()
+        lines = []
+
+        def family(name, kind, help_text, samples):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            lines.extend(samples)
+
+        def label(agent, **extra):
+            pairs = [f'agent="{agent}"', f'pid="{pid}"'] + [f'{k}="{v}"' for k, v in extra.items()]
+            return "{" + ",".join(pairs) + "}"
+
+        def histogram(name, help_text, attr):
+            samples = []
+            for agent, stats in agents:
+                hist = getattr(stats, attr)
+                cumulative = 0
+                for bound, count in zip(hist.buckets, hist.bucket_counts):
+                    cumulative += count
+                    samples.append(f"{prefix}_{name}_bucket{label(agent, le=bound)} {cumulative}")
+                samples.append(f"{prefix}_{name}_bucket{label(agent, le='+Inf')} {hist.count}")
+                samples.append(f"{prefix}_{name}_sum{label(agent)} {hist.total}")
+                samples.append(f"{prefix}_{name}_count{label(agent)} {hist.count}")
+            family(name, "histogram", help_text, samples)
+
+        with self._lock:
+            agents = sorted(self._agents.items())
+            counters = [
+                ("calls_total", "Agent invocations.", "calls"),
+                ("errors_total", "Agent invocations that failed.", "errors"),
+                ("llm_calls_total", "LLM requests (cache misses).", "llm_calls"),
+                ("llm_errors_total", "LLM requests that raised.", "llm_errors"),
+                ("cache_hits_total", "AI responses served from the cache.", "cache_hits"),
+                ("cache_misses_total", "AI responses not found in the cache.", "cache_misses"),
+                ("stale_served_total", "Stale cached answers served while the LLM was unavailable.", "stale_served"),
+                ("prompt_chars_total", "Prompt characters sent or looked up.", "prompt_chars"),
+                ("response_chars_total", "Response characters received from the LLM.", "response_chars"),
+                ("input_tokens_total", "Prompt tokens reported by the LLM.", "input_tokens"),
+                ("output_tokens_total", "Completion tokens reported by the LLM.", "output_tokens"),
+            ]
+            for name, help_text, attr in counters:
+                family(name, "counter", help_text,
+                       [f"{prefix}_{name}{label(agent)} {getattr(stats, attr)}" for agent, stats in agents])
+            family("rejections_total", "counter", "LLM calls rejected by the bulkhead, breaker or timeout.",
+                   [f"{prefix}_rejections_total{label(agent, reason=reason)} {count}"
+                    for agent, stats in agents for reason, count in sorted(stats.rejections.items())])
+            family("in_flight", "gauge", "Agent invocations currently running.",
+                   [f"{prefix}_in_flight{label(agent)} {stats.in_flight}" for agent, stats in agents])
+            histogram("latency_seconds", "End-to-end agent latency.", "latency")
+            histogram("llm_latency_seconds", "Latency of individual LLM requests.", "llm_latency")
+            histogram("first_token_seconds", "Time to the first streamed LLM chunk.", "first_token_latency")
+        return "\n".join(lines) + "\n"
+
+
+agent_metrics = AgentMetrics()
+
+
+def current_agent():
+    """Name of the instrumented agent running in this context, or None."""
+    call = _current_call.get()
+    return call["agent"] if call else None
+
+
+def mark_current_call_failed():
+    """Lets helpers such as call_ai flag the surrounding agent call as an error."""
+    call = _current_call.get()
+    if call is not None:
+        call["failed"] = True
+
+
+def instrument_agent(name, failed=None):
+    """
+    Decorator recording latency, in-flight count and errors for an agent.
+    The call counts as an error if it raises, if `failed(result)` is true, or
+    if an LLM request made during the call failed.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            call = {"agent": name, "failed": False}
+            token = _current_call.set(call)
+            agent_metrics.agent_started(name)
+            started = time.perf_counter()
+            error = True
+            try:
+                result = func(*args, **kwargs)
+                error = call["failed"] or bool(failed and failed(result))
+                return result
+            finally:
+                _current_call.reset(token)
+                agent_metrics.agent_finished(name, time.perf_counter() - started, error)
+        return wrapper
+    return decorator
@@ -0,0 +1,366 @@
+import contextvars
+import cProfile
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+from metrics import LatencyHistogram
+
+# ----------- Request Profiling -----------
+# Opt-in per-request timing. When a request is profiled we record
+#   wall time, every SQL statement (execute + fetch time, rows),
+#   connection checkout time from the pool, and template render time,
+# send them back as a Server-Timing header (visible in the browser devtools)
+# and aggregate them per route for /admin/profiling.
+#
+# Profiling is on for every request when PROFILING_ENABLED=1 (or after an
+# admin turns it on at runtime). Admins can also profile a single request:
+#   ?_profile=1         timings only
+#   ?_profile=sample    + sampling profiler, dumps collapsed stacks (.folded,
+#                         for flamegraph.pl / speedscope)
+#   ?_profile=cprofile  + cProfile, dumps a .prof file (snakeviz, pstats)
+# Like the agent metrics, everything is per process.
+
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', '0') == '1'
+# Requests slower than this are logged with their query breakdown (0 = off).
+PROFILING_SLOW_MS = float(os.getenv('PROFILING_SLOW_MS', '0'))
+PROFILING_RECENT = int(os.getenv('PROFILING_RECENT', '200'))
+PROFILING_SAMPLE_INTERVAL = float(os.getenv('PROFILING_SAMPLE_INTERVAL', '0.005'))
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join('instance', 'profiles'))
+PROFILE_PARAM = '_profile'
+PROFILER_MODES = ('sample', 'cprofile')
+
+# Queries kept per request (the count and total time always cover all of them).
+MAX_QUERIES_PER_REQUEST = 200
+MAX_SQL_CHARS = 300
+
+_current_profile = contextvars.ContextVar('current_request_profile', default=None)
+
+
+def current_profile():
+    """The RequestProfile of the request running in this context, or None."""
+    return _current_profile.get()
+
+
+class RequestProfile:
+    def __init__(self, method, route, path, mode=None):
+        self.method = method
+        self.route = route
+        self.path = path
+        self.mode = mode
+        self.started = time.perf_counter()
+        self.wall = None
+        self.queries = []
+        self.query_count = 0
+        self.sql_seconds = 0.0
+        self.connections = 0
+        self.connect_seconds = 0.0
+        self.render_seconds = 0.0
+        self.status = None
+        self.profile_file = None
+        self.profiler = None
+
+    def record_query(self, sql, seconds, rows=None):
+        self.query_count += 1
+        self.sql_seconds += seconds
+        if len(self.queries) < MAX_QUERIES_PER_REQUEST:
+            self.queries.append({"sql": _normalize_sql(sql), "ms": seconds * 1000, "rows": rows})
+        return self.queries[-1] if len(self.queries) == self.query_count else None
+
+    def record_connection(self, seconds):
+        self.connections += 1
+        self.connect_seconds += seconds
+
+    def record_render(self, seconds):
+        self.render_seconds += seconds
+
+    def elapsed(self):
+        return self.wall if self.wall is not None else time.perf_counter() - self.started
+
+    def server_timing(self):
+        """Server-Timing header value (durations in ms)."""
+        return ", ".join([
+            f'db;dur={self.sql_seconds * 1000:.2f};desc="{self.query_count} queries"',
+            f'conn;dur={self.connect_seconds * 1000:.2f};desc="{self.connections} checkouts"',
+            f'render;dur={self.render_seconds * 1000:.2f}',
+            f'total;dur={self.elapsed() * 1000:.2f}',
+        ])
+
+    def summary(self):
+        return {
+            "method": self.method,
+            "route": self.route,
+            "path": self.path,
+            "status": self.status,
+            "mode": self.mode,
+            "wall_ms": round(self.elapsed() * 1000, 2),
+            "query_count": self.query_count,
+            "sql_ms": round(self.sql_seconds * 1000, 2),
+            "connections": self.connections,
+            "connect_ms": round(self.connect_seconds * 1000, 2),
+            "render_ms": round(self.render_seconds * 1000, 2),
+            "queries": [dict(q, ms=round(q["ms"], 3)) for q in self.queries],
+            "profile_file": self.profile_file,
+        }
+
+
+def _normalize_sql(sql):
+    if isinstance(sql, bytes):
+        sql = sql.decode('utf-8', 'replace')
+    sql = re.sub(r'\s+', ' ', str(sql)).strip()
+    # Long IN (...) / VALUES lists would make every batch look like a new query.
+    sql = re.sub(r'(%s, ){3,}%s', '%s, ...', sql)
+    sql = re.sub(r'(\(%s(, %s)*\), ){2,}\(%s(, %s)*\)', '(...), ...', sql)
+    return sql[:MAX_SQL_CHARS]
+
+
+class TimedCursor:
+    """Wraps a DB-API cursor and reports execute/fetch time to a RequestProfile."""
+
+    def __init__(self, cursor, profile):
+        self._cursor = cursor
+        self._profile = profile
+        self._last_query = None
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def _timed_execute(self, method, sql, args):
+        started = time.perf_counter()
+        try:
+            return method(sql, args)
+        finally:
+            rows = getattr(self._cursor, 'rowcount', None)
+            self._last_query = self._profile.record_query(
+                sql, time.perf_counter() - started, rows if rows is not None and rows >= 0 else None
+            )
+
+    def execute(self, query, args=None):
+        return self._timed_execute(self._cursor.execute, query, args)
+
+    def executemany(self, query, args):
+        return self._timed_execute(self._cursor.executemany, query, args)
+
+    def _timed_fetch(self, method, *args):
+        started = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            # Server-side cursors do most of their work while fetching.
+            seconds = time.perf_counter() - started
+            self._profile.sql_seconds += seconds
+            if self._last_query is not None:
+                self._last_query["ms"] += seconds * 1000
+
+    def fetchone(self):
+        return self._timed_fetch(self._cursor.fetchone)
+
+    def fetchmany(self, size=None):
+        return self._timed_fetch(self._cursor.fetchmany, *(() if size is None else (size,)))
+
+    def fetchall(self):
+        return self._timed_fetch(self._cursor.fetchall)
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._cursor.close()
+
+
+class StackSampler:
+    """
+    Samples one thread's Python stack every `interval` seconds from a helper
+    thread (pyinstrument-style, low overhead) and counts collapsed stacks.
+    """
+
+    def __init__(self, thread_id, interval=PROFILING_SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.counts[";".join(reversed(stack))] += 1
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            for stack, count in self.counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class RouteStats:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.latency = LatencyHistogram()
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.connect_seconds = 0.0
+        self.render_seconds = 0.0
+        self.query_time = Counter()   # normalized sql -> total ms
+        self.query_calls = Counter()  # normalized sql -> executions
+
+
+class RequestProfiler:
+    def __init__(self, enabled=PROFILING_ENABLED):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._routes = {}
+        self._recent = deque(maxlen=PROFILING_RECENT)
+        self.started_at = time.time()
+
+    # ---- Request lifecycle (called from app.py hooks) ----
+
+    def start_request(self, method, route, path, requested_mode, is_admin):
+        """
+        Starts profiling the current request if profiling is on or an admin
+        asked for it. requested_mode is the ?_profile= value (or None).
+        """
+        mode = requested_mode if is_admin else None
+        if not self.enabled and not mode:
+            return None
+        profile = RequestProfile(method, route, path, mode if mode in PROFILER_MODES else None)
+        if profile.mode == 'cprofile':
+            profile.profiler = cProfile.Profile()
+            profile.profiler.enable()
+        elif profile.mode == 'sample':
+            profile.profiler = StackSampler(threading.get_ident())
+            profile.profiler.start()
+        _current_profile.set(profile)
+        return profile
+
+    def finish_request(self, status=None):
+        """Stops the current request's profile, dumps profiler output and aggregates it."""
+        profile = _current_profile.get()
+        if profile is None:
+            return None
+        _current_profile.set(None)
+        profile.wall = time.perf_counter() - profile.started
+        if status is not None:
+            profile.status = status
+        if profile.profiler is not None:
+            try:
+                profile.profile_file = self._dump(profile)
+            except Exception as e:
+                print(f"Error writing request profile: {e}")
+            profile.profiler = None
+
+        with self._lock:
+            stats = self._routes.get((profile.method, profile.route))
+            if stats is None:
+                stats = self._routes[(profile.method, profile.route)] = RouteStats()
+            stats.requests += 1
+            stats.errors += int(bool(profile.status and profile.status >= 500))
+            stats.latency.observe(profile.wall)
+            stats.queries += profile.query_count
+            stats.sql_seconds += profile.sql_seconds
+            stats.connect_seconds += profile.connect_seconds
+            stats.render_seconds += profile.render_seconds
+            for query in profile.queries:
+                stats.query_time[query["sql"]] += query["ms"]
+                stats.query_calls[query["sql"]] += 1
+            self._recent.append(profile.summary())
+
+        if PROFILING_SLOW_MS and profile.wall * 1000 >= PROFILING_SLOW_MS:
+            print(f"Slow request {profile.method} {profile.path}: {profile.server_timing()}")
+        return profile
+
+    def _dump(self, profile):
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        slug = re.sub(r'[^A-Za-z0-9]+', '_', profile.route).strip('_') or 'root'
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{int(profile.started * 1000) % 1000:03d}-{slug}"
+        if profile.mode == 'cprofile':
+            profile.profiler.disable()
+            filename = f"{name}.prof"
+            profile.profiler.dump_stats(os.path.join(PROFILE_DIR, filename))
+        else:
+            profile.profiler.stop()
+            filename = f"{name}.folded"
+            profile.profiler.dump(os.path.join(PROFILE_DIR, filename))
+        return filename
+
+    # ---- Reporting ----
+
+    def set_enabled(self, enabled):
+        self.enabled = bool(enabled)
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+            self._recent.clear()
+            self.started_at = time.time()
+
+    def snapshot(self, recent=20, top_queries=5):
+        with self._lock:
+            routes = []
+            for (method, route), stats in self._routes.items():
+                n = stats.requests
+                routes.append({
+                    "method": method,
+                    "route": route,
+                    "requests": n,
+                    "errors": stats.errors,
+                    "latency": stats.latency.summary(),
+                    "avg_queries": round(stats.queries / n, 2),
+                    "avg_sql_ms": round(stats.sql_seconds * 1000 / n, 2),
+                    "avg_connect_ms": round(stats.connect_seconds * 1000 / n, 2),
+                    "avg_render_ms": round(stats.render_seconds * 1000 / n, 2),
+                    "top_queries": [
+                        {"sql": sql, "total_ms": round(ms, 2), "calls": stats.query_calls[sql]}
+                        for sql, ms in stats.query_time.most_common(top_queries)
+                    ],
+                })
+            routes.sort(key=lambda row: row["latency"]["avg_ms"] * row["requests"], reverse=True)
+            return {
+                "pid": os.getpid(),
+                "enabled": self.enabled,
+                "uptime_seconds": round(time.time() - self.started_at, 1),
+                "routes": routes,
+                "recent": list(self._recent)[-recent:][::-1] if recent else [],
+            }
+
+
+request_profiler = RequestProfiler()
+
+
+def connect_template_timing(app):
+    """Times render_template() calls of profiled requests via Flask's signals."""
+    from flask import before_render_template, template_rendered
+
+    render_started = contextvars.ContextVar('template_render_started', default=None)
+
+    def before_render(sender, **extra):
+        if _current_profile.get() is not None:
+            render_started.set(time.perf_counter())
+
+    def after_render(sender, **extra):
+        profile, started = _current_profile.get(), render_started.get()
+        if profile is not None and started is not None:
+            profile.record_render(time.perf_counter() - started)
+            render_started.set(None)
+
+    before_render_template.connect(before_render, app, weak=False)
+    template_rendered.connect(after_render, app, weak=False)
@@ -0,0 +1,317 @@
+import os
+import threading
+import time
+from db import get_db_connection, ensure_schema, SKILL_COLUMNS, skill_score
+from jobs import job_queue, register_job_type, register_periodic_job
+from ai_agents import call_ai
+from course_assignments import ensure_course_assignment_key, assign_course
+from metrics import instrument_agent
+from course_catalog import course_catalog
+from employee_profiles import get_employee_profile
+
+# ----------- Course Recommendation Store -----------
+# The recommended course only depends on the employee's role, weakest skill
+# and how weak it is, so recommendations are stored per
+# (ROLE, weakest_skill, score_band) and shared by every employee with that
+# profile. Courses always come from the `course` catalog (course_catalog.py);
+# the LLM only re-ranks when several courses fit. A background job fills the
+# store for every profile that exists (after HR uploads, new employees and
+# role assignment, and every RECOMMENDATION_REFRESH_INTERVAL seconds), so
+# requests rarely miss. An employee whose marks change simply maps to a
+# different profile.
+
+# Width of a score band (scores are out of 100): 20 -> 0-19, 20-39, ..., 80-100.
+RECOMMENDATION_BAND_WIDTH = int(os.getenv('RECOMMENDATION_BAND_WIDTH', '20'))
+# Stored recommendations older than this are regenerated by the refresh job.
+RECOMMENDATION_MAX_AGE = int(os.getenv('RECOMMENDATION_MAX_AGE', str(30 * 24 * 3600)))
+RECOMMENDATION_REFRESH_INTERVAL = float(os.getenv('RECOMMENDATION_REFRESH_INTERVAL', '3600'))
+# Let the LLM re-rank when several catalog courses teach the weakest skill.
+RECOMMENDATION_LLM_RERANK = os.getenv('RECOMMENDATION_LLM_RERANK', '1') == '1'
+RECOMMENDATION_SCAN_BATCH = 5000
+DEFAULT_ROLE = 'Trainee'
+
+RECOMMENDATION_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS course_recommendation (
+        ROLE VARCHAR(100) NOT NULL,
+        weakest_skill VARCHAR(50) NOT NULL,
+        score_band TINYINT NOT NULL,
+        course_name VARCHAR(255) NOT NULL,
+        generated_at DATETIME NOT NULL,
+        PRIMARY KEY (ROLE, weakest_skill, score_band)
+    )
+    """
+]
+
+_key_locks = {}
+_key_locks_guard = threading.Lock()
+
+
+def _ensure():
+    ensure_schema('recommendations', RECOMMENDATION_SCHEMA)
+
+
+def _max_band():
+    return 99 // RECOMMENDATION_BAND_WIDTH  # a perfect 100 joins the top band
+
+
+def recommendation_profile(employee):
+    """(role, weakest skill, score band) of an employee row. Ties go to the first skill column."""
+    skills = {skill: skill_score(employee.get(skill)) for skill in SKILL_COLUMNS}
+    weakest_skill = min(skills, key=skills.get)
+    band = min(max(int(skills[weakest_skill] // RECOMMENDATION_BAND_WIDTH), 0), _max_band())
+    return (employee.get('ROLE') or DEFAULT_ROLE, weakest_skill, band)
+
+
+def band_range(band):
+    low = band * RECOMMENDATION_BAND_WIDTH
+    return low, 100 if band == _max_band() else low + RECOMMENDATION_BAND_WIDTH - 1
+
+
+def build_recommendation_prompt(profile, candidates):
+    role, weakest_skill, band = profile
+    low, high = band_range(band)
+    course_list = "\n".join(f"    - {name}" for name in candidates)
+    return f"""
+    As a corporate Learning Management System AI, your task is to pick the best course for an employee based on their weakest skill.
+
+    Employee Role: {role}
+    Identified Weakest Skill: {weakest_skill}
+    Score in that skill (out of 100): between {low} and {high}
+
+    Available courses:
+{course_list}
+
+    Pick the single course from this list that best helps the employee improve their weakest skill at their current level.
+
+    Return only the exact course title from the list and nothing else.
+    """
+
+
+def _lookup(cursor, profile):
+    """Stored course name for the profile, or None if missing, expired or no longer in the catalog."""
+    cursor.execute(
+        "SELECT course_name FROM course_recommendation "
+        "WHERE ROLE = %s AND weakest_skill = %s AND score_band = %s "
+        "AND generated_at >= NOW() - INTERVAL %s SECOND",
+        (*profile, RECOMMENDATION_MAX_AGE)
+    )
+    row = cursor.fetchone()
+    return course_catalog.get(row['course_name']) if row else None
+
+
+def _store(cursor, profile, course_name):
+    cursor.execute(
+        "INSERT INTO course_recommendation (ROLE, weakest_skill, score_band, course_name, generated_at) "
+        "VALUES (%s, %s, %s, %s, NOW()) "
+        "ON DUPLICATE KEY UPDATE course_name = VALUES(course_name), generated_at = VALUES(generated_at)",
+        (*profile, course_name)
+    )
+
+
+def _key_lock(profile):
+    with _key_locks_guard:
+        return _key_locks.setdefault(profile, threading.Lock())
+
+
+def choose_course(profile):
+    """
+    Picks a course from the catalog (course_catalog.py) for the profile.
+    With a single course for the weakest skill that course is the answer;
+    with several, the LLM may re-rank them (RECOMMENDATION_LLM_RERANK). When
+    no course covers the skill, the LLM picks from the whole catalog. The
+    LLM's answer is always matched back to a real course name.
+    Returns a CourseName, None (nothing suitable) or "AI Error: ..." text.
+    """
+    candidates = course_catalog.courses_for_skill(profile[1])
+    if len(candidates) == 1 or (candidates and not RECOMMENDATION_LLM_RERANK):
+        return candidates[0]
+    pool = candidates or course_catalog.names()
+    if not pool or not RECOMMENDATION_LLM_RERANK:
+        return None
+
+    answer = call_ai(build_recommendation_prompt(profile, pool), cache_tags=("recommendations",))
+    if "AI Error" in answer:
+        # Re-ranking is optional; the catalog order is a fine answer.
+        return candidates[0] if candidates else answer
+    course_name, _ = course_catalog.match(answer, candidates=pool)
+    return course_name or (candidates[0] if candidates else None)
+
+
+def generate_recommendation(profile, replace=False):
+    """
+    Chooses the profile's course and stores it. Concurrent cold misses for
+    the same profile in this process share one choice (and LLM call); unless
+    `replace` is set, a recommendation stored meanwhile is returned as is.
+    Returns what choose_course returned.
+    """
+    with _key_lock(profile):
+        if not replace:
+            conn = get_db_connection()
+            try:
+                with conn.cursor() as cursor:
+                    stored = _lookup(cursor, profile)
+            finally:
+                conn.close()
+            if stored:
+                return stored
+
+        course_name = choose_course(profile)
+        if not course_name or "AI Error" in course_name:
+            return course_name
+
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cursor:
+                _store(cursor, profile, course_name)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        return course_name
+
+
+# ----------- AI Course Recommender Agent (Based on Skills) -----------
+@instrument_agent('course_recommender_agent', failed=lambda result: not result['success'])
+def course_recommender_agent_v2(emp_id: int):
+    """
+    Finds the employee's weakest skill, looks up the course stored for their
+    (role, weakest skill, score band) profile and assigns it to them. On a
+    cold miss the course is chosen from the catalog (see choose_course).
+
+    The pooled connection is not held during a re-ranking LLM call.
+    """
+    _ensure()
+    try:
+        # Step 1: Employee skills and role (profile cache), then the stored recommendation
+        employee = get_employee_profile(emp_id)
+        if not employee:
+            return {"success": False, "message": "Employee not found."}
+        profile = recommendation_profile(employee)
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cursor:
+                recommended_course_name = _lookup(cursor, profile)
+        finally:
+            conn.close()
+    except Exception as e:
+        return {"success": False, "message": str(e)}
+
+    # Step 2: Cold miss, choose (and store) it for everyone with this profile
+    if not recommended_course_name:
+        try:
+            recommended_course_name = generate_recommendation(profile)
+        except Exception as e:
+            return {"success": False, "message": str(e)}
+        if not recommended_course_name:
+            return {"success": False, "message": f"No course in the catalog covers {profile[1]} yet."}
+        if "AI Error" in recommended_course_name:
+            return {"success": False, "message": recommended_course_name}
+
+    ensure_course_assignment_key()
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            # Step 3: Assign the course (one upsert) unless it is already in progress
+            assigned = assign_course(cursor, emp_id, recommended_course_name)
+        conn.commit()
+
+        if not assigned:
+            return {"success": True, "course": {"CourseName": recommended_course_name, "message": "This course is already assigned to you."}}
+        return {"success": True, "course": {"CourseName": recommended_course_name}}
+
+    except Exception as e:
+        conn.rollback()
+        return {"success": False, "message": str(e)}
+    finally:
+        conn.close()
+
+
+# ----------- Batch Refresh -----------
+
+def _current_profiles():
+    """
+    Counts employees per profile, scanning `employee` in id order. Employees
+    still waiting for batch role assignment are skipped.
+    """
+    profiles = {}
+    last_id = 0
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            while True:
+                cursor.execute(
+                    f"SELECT id, ROLE, {', '.join(SKILL_COLUMNS)} FROM employee "
+                    "WHERE id > %s AND ROLE IS NOT NULL AND ROLE != '' ORDER BY id LIMIT %s",
+                    (last_id, RECOMMENDATION_SCAN_BATCH)
+                )
+                rows = cursor.fetchall()
+                for row in rows:
+                    profile = recommendation_profile(row)
+                    profiles[profile] = profiles.get(profile, 0) + 1
+                if len(rows) < RECOMMENDATION_SCAN_BATCH:
+                    return profiles
+                last_id = rows[-1]['id']
+    finally:
+        conn.close()
+
+
+def refresh_recommendations(force=False):
+    """
+    Makes sure every profile that currently exists has a fresh stored
+    recommendation; force=True regenerates all of them. Returns a report.
+    """
+    _ensure()
+    started = time.perf_counter()
+    profiles = _current_profiles()
+
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT ROLE, weakest_skill, score_band, course_name FROM course_recommendation "
+                "WHERE generated_at >= NOW() - INTERVAL %s SECOND",
+                (RECOMMENDATION_MAX_AGE,)
+            )
+            fresh = {
+                (row['ROLE'], row['weakest_skill'], int(row['score_band'])) for row in cursor.fetchall()
+                if course_catalog.get(row['course_name'])
+            }
+    finally:
+        conn.close()
+
+    missing = list(profiles) if force else [profile for profile in profiles if profile not in fresh]
+    # Most common profiles first, so a partial run helps the most employees.
+    missing.sort(key=profiles.get, reverse=True)
+    report = {"profiles": len(profiles), "fresh": len(profiles) - len(missing), "generated": 0, "failed": 0, "uncovered": 0}
+    for profile in missing:
+        course_name = generate_recommendation(profile, replace=force)
+        if not course_name:
+            report["uncovered"] += 1
+        elif "AI Error" in course_name:
+            report["failed"] += 1
+        else:
+            report["generated"] += 1
+    report["seconds"] = round(time.perf_counter() - started, 4)
+    return report
+
+
+def recommendation_refresh_job(target):
+    """Background job handler; target 'all' fills gaps, 'force' regenerates everything."""
+    return refresh_recommendations(force=target == 'force')
+
+
+def queue_recommendation_refresh():
+    """Called after employees' marks or roles change; errors are only logged."""
+    try:
+        return job_queue.enqueue('refresh_recommendations', 'all', force=True)
+    except Exception as e:
+        print(f"Error queueing recommendation refresh: {e}")
+        return None
+
+
+register_job_type('refresh_recommendations', recommendation_refresh_job)
+if RECOMMENDATION_REFRESH_INTERVAL > 0:
+    register_periodic_job('refresh_recommendations', 'all', RECOMMENDATION_REFRESH_INTERVAL)
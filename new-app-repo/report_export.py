@@ -0,0 +1,124 @@
+import io
+import os
+from db import SKILL_COLUMNS
+
+# ----------- Columnar Report Export -----------
+# Parquet and Arrow IPC versions of /admin/generate_report for the analytics
+# team: typed columns (integer id, text, float skill scores) that load without
+# parsing, compressed per column. Rows are converted and written one record
+# batch at a time as they come off the server-side cursor, so memory use stays
+# at one batch. pyarrow (in requirements.txt) is imported on first use, so an
+# install without it still serves the CSV report and answers 501 for these.
+
+# Rows per Parquet row group / Arrow record batch.
+REPORT_COLUMNAR_BATCH_ROWS = int(os.getenv('REPORT_COLUMNAR_BATCH_ROWS', '50000'))
+# zstd, snappy, gzip, lz4 or none.
+REPORT_COLUMNAR_COMPRESSION = os.getenv('REPORT_COLUMNAR_COMPRESSION', 'zstd')
+
+COLUMNAR_FORMATS = {
+    # format -> (file extension, mimetype)
+    'parquet': ('parquet', 'application/vnd.apache.parquet'),
+    'arrow': ('arrows', 'application/vnd.apache.arrow.stream'),
+}
+
+
+class ColumnarExportUnavailable(Exception):
+    pass
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        raise ColumnarExportUnavailable("Parquet and Arrow reports need the pyarrow package (pip install pyarrow).")
+    return pyarrow
+
+
+def report_schema(columns):
+    pa = _pyarrow()
+    types = {'id': pa.int64()}
+    types.update({skill: pa.float64() for skill in SKILL_COLUMNS})
+    return pa.schema([(column, types.get(column, pa.string())) for column in columns])
+
+
+def _record_batch(pa, schema, rows):
+    arrays = []
+    for field in schema:
+        values = [row[field.name] for row in rows]
+        if pa.types.is_floating(field.type):
+            # MySQL DECIMAL columns arrive as Decimal.
+            values = [float(value) if value is not None else None for value in values]
+        elif pa.types.is_string(field.type):
+            values = [str(value) if value is not None else None for value in values]
+        arrays.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that keeps what was written until the response drains it."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _writer(pa, export_format, sink, schema):
+    compression = None if REPORT_COLUMNAR_COMPRESSION == 'none' else REPORT_COLUMNAR_COMPRESSION
+    if export_format == 'parquet':
+        return pa.parquet.ParquetWriter(sink, schema, compression=compression or 'none')
+    options = pa.ipc.IpcWriteOptions(compression=compression if compression in ('zstd', 'lz4') else None)
+    return pa.ipc.new_stream(sink, schema, options=options)
+
+
+def stream_columnar(conn, cursor, first_row, columns, export_format):
+    """
+    Generator writing the cursor's rows as Parquet (one row group per batch)
+    or an Arrow IPC stream. Closes the cursor and connection when done; the
+    caller must also release them when the response closes, since the body
+    is never iterated for HEAD requests.
+    Call check_columnar_support() before starting the response.
+    """
+    try:
+        pa = _pyarrow()
+        schema = report_schema(columns)
+        sink = _ChunkSink()
+        file = pa.PythonFile(sink, mode='w')
+        writer = _writer(pa, export_format, file, schema)
+        rows = [first_row] + list(cursor.fetchmany(REPORT_COLUMNAR_BATCH_ROWS - 1))
+        while rows:
+            writer.write_batch(_record_batch(pa, schema, rows))
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+            rows = cursor.fetchmany(REPORT_COLUMNAR_BATCH_ROWS)
+        writer.close()
+        chunk = sink.drain()
+        if chunk:
+            yield chunk
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def check_columnar_support():
+    """Raises ColumnarExportUnavailable when pyarrow is not installed."""
+    _pyarrow()
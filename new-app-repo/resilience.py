@@ -0,0 +1,223 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+# ----------- LLM Bulkhead and Circuit Breaker -----------
+# Every request to the LLM goes through `llm_guard`, which
+#   * caps concurrent LLM calls per process (bulkhead) so a slow model cannot
+#     tie up every worker thread; callers wait at most LLM_QUEUE_TIMEOUT
+#     seconds for a slot and are rejected after that,
+#   * runs the call on a small pool so the caller gives up after
+#     LLM_TIMEOUT_SECONDS (the slot stays taken until the call really ends),
+#   * opens a circuit breaker after LLM_BREAKER_FAILURES consecutive failures
+#     and fast-fails for LLM_BREAKER_RESET_SECONDS before letting one trial
+#     call through (half-open).
+# Rejections raise LLMUnavailableError; call_ai turns them into a stale cached
+# answer when it has one.
+
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '8'))
+LLM_QUEUE_TIMEOUT = float(os.getenv('LLM_QUEUE_TIMEOUT', '2'))
+LLM_TIMEOUT_SECONDS = float(os.getenv('LLM_TIMEOUT_SECONDS', '30'))
+LLM_BREAKER_FAILURES = int(os.getenv('LLM_BREAKER_FAILURES', '5'))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv('LLM_BREAKER_RESET_SECONDS', '30'))
+
+_DONE = object()
+
+
+class LLMUnavailableError(Exception):
+    """The LLM call was not made or was abandoned. `reason` names why."""
+    reason = 'unavailable'
+
+
+class BulkheadFullError(LLMUnavailableError):
+    reason = 'bulkhead_full'
+
+
+class CircuitOpenError(LLMUnavailableError):
+    reason = 'circuit_open'
+
+
+class LLMTimeoutError(LLMUnavailableError):
+    reason = 'timeout'
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold=LLM_BREAKER_FAILURES, reset_timeout=LLM_BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self._trial_in_progress = False
+
+    def before_call(self):
+        """Raises CircuitOpenError unless a call may go through now."""
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    raise CircuitOpenError("AI service is temporarily unavailable (circuit open).")
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN:
+                if self._trial_in_progress:
+                    raise CircuitOpenError("AI service is recovering; try again shortly.")
+                self._trial_in_progress = True
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._trial_in_progress = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self._trial_in_progress = False
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.times_opened += 1
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def release_trial(self):
+        """The admitted call never reached the LLM (e.g. bulkhead rejection)."""
+        with self._lock:
+            self._trial_in_progress = False
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "failure_threshold": self.failure_threshold,
+                "reset_timeout_seconds": self.reset_timeout,
+                "times_opened": self.times_opened,
+                "open_for_seconds": round(time.monotonic() - self.opened_at, 1) if self.state == self.OPEN else None,
+            }
+
+
+class LLMGuard:
+    def __init__(self, max_concurrent=LLM_MAX_CONCURRENCY, queue_timeout=LLM_QUEUE_TIMEOUT,
+                 timeout=LLM_TIMEOUT_SECONDS, breaker=None):
+        self.max_concurrent = max_concurrent
+        self.queue_timeout = queue_timeout
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker()
+        self._lock = threading.Lock()
+        self._pid = None
+        self._semaphore = None
+        self._executor = None
+        self.in_flight = 0
+        self.rejections = {BulkheadFullError.reason: 0, CircuitOpenError.reason: 0, LLMTimeoutError.reason: 0}
+
+    def _resources(self):
+        """Semaphore and pool belong to one process (gunicorn forks after import)."""
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._semaphore = threading.BoundedSemaphore(self.max_concurrent)
+                    self._executor = ThreadPoolExecutor(self.max_concurrent, thread_name_prefix='llm-call')
+                    self.in_flight = 0
+                    self._pid = os.getpid()
+        return self._semaphore, self._executor
+
+    def _count_rejection(self, error):
+        with self._lock:
+            self.rejections[error.reason] += 1
+        return error
+
+    def _admit(self):
+        semaphore, executor = self._resources()
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError as e:
+            raise self._count_rejection(e)
+        if not semaphore.acquire(timeout=self.queue_timeout):
+            self.breaker.release_trial()
+            raise self._count_rejection(BulkheadFullError(
+                f"AI service is busy ({self.max_concurrent} requests in progress)."
+            ))
+        with self._lock:
+            self.in_flight += 1
+        return semaphore, executor
+
+    def _release(self, semaphore):
+        with self._lock:
+            self.in_flight -= 1
+        semaphore.release()
+
+    def call(self, func, *args, **kwargs):
+        """Runs func(*args, **kwargs) under the bulkhead, timeout and breaker."""
+        semaphore, executor = self._admit()
+        try:
+            future = executor.submit(func, *args, **kwargs)
+        except Exception:
+            self._release(semaphore)
+            self.breaker.release_trial()
+            raise
+        # The slot is freed when the call really finishes, not when we stop waiting.
+        future.add_done_callback(lambda _: self._release(semaphore))
+        try:
+            result = future.result(timeout=self.timeout)
+        except FutureTimeout:
+            self.breaker.record_failure()
+            raise self._count_rejection(LLMTimeoutError(f"AI request timed out after {self.timeout:g}s."))
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        return result
+
+    def stream(self, factory):
+        """
+        Yields from the iterator returned by factory() under the same guard.
+        The timeout applies to the whole stream.
+        """
+        semaphore, executor = self._admit()
+        deadline = time.monotonic() + self.timeout
+        pending = None
+        try:
+            iterator = iter(factory())
+            while True:
+                remaining = deadline - time.monotonic()
+                pending = executor.submit(next, iterator, _DONE)
+                try:
+                    item = pending.result(timeout=max(remaining, 0))
+                except FutureTimeout:
+                    self.breaker.record_failure()
+                    raise self._count_rejection(LLMTimeoutError(f"AI request timed out after {self.timeout:g}s."))
+                pending = None
+                if item is _DONE:
+                    break
+                yield item
+            self.breaker.record_success()
+        except (GeneratorExit, LLMTimeoutError):
+            self.breaker.release_trial()
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        finally:
+            if pending is not None and not pending.done():
+                pending.add_done_callback(lambda _: self._release(semaphore))
+            else:
+                self._release(semaphore)
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                "max_concurrent": self.max_concurrent,
+                "in_flight": self.in_flight if self._pid == os.getpid() else 0,
+                "queue_timeout_seconds": self.queue_timeout,
+                "timeout_seconds": self.timeout,
+                "rejections": dict(self.rejections),
+            }
+        stats["breaker"] = self.breaker.stats()
+        return stats
+
+
+llm_guard = LLMGuard()
@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import json
+import os
+import time
+from typing import TYPE_CHECKING
+from db import get_db_connection, SKILL_COLUMNS
+from jobs import register_job_type, register_periodic_job
+from ai_agents import invalidate_employee_ai_cache
+from search_index import index_employees
+from employee_profiles import invalidate_employee_profile
+from dashboard_summary import record_role_assignments
+from change_log import record_changes, employee_change
+from recommendations import queue_recommendation_refresh
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# ----------- Batch Role Assignment -----------
+# Employees without a role/department get one from their strongest skill
+# group. Instead of doing this per employee at login, a background job scores
+# every unassigned employee at once (one matrix product) and writes each batch
+# with a single UPDATE. It runs after every HR upload and every
+# ROLE_ASSIGNMENT_INTERVAL seconds.
+
+# Each role: department plus skill weights. The default weights (all 1) make a
+# role's score the plain average of its skills. Override with
+# ROLE_SKILL_WEIGHTS='{"Backend Developer": {"department": "Development",
+#                     "weights": {"PYTHON": 2, "JAVA": 1}}, ...}'
+DEFAULT_ROLE_GROUPS = {
+    'Frontend Developer': {"department": "Development", "weights": {"HTML": 1, "CSS": 1, "JAVASCRIPT": 1}},
+    'Backend Developer': {"department": "Development", "weights": {"PYTHON": 1, "C": 1, "CPP": 1, "JAVA": 1}},
+    'Automation Tester': {"department": "Testing", "weights": {"SQL_TESTING": 1, "TOOLS_COURSE": 1}},
+}
+
+ROLE_ASSIGNMENT_BATCH_SIZE = int(os.getenv('ROLE_ASSIGNMENT_BATCH_SIZE', '1000'))
+ROLE_ASSIGNMENT_INTERVAL = float(os.getenv('ROLE_ASSIGNMENT_INTERVAL', '300'))
+
+UNASSIGNED_CONDITION = "(DEPARTMENT IS NULL OR DEPARTMENT = '' OR ROLE IS NULL OR ROLE = '')"
+
+
+def load_role_groups():
+    raw = os.getenv('ROLE_SKILL_WEIGHTS')
+    if not raw:
+        return DEFAULT_ROLE_GROUPS
+    groups = json.loads(raw)
+    for role, group in groups.items():
+        unknown = set(group.get("weights", {})) - set(SKILL_COLUMNS)
+        if unknown or not group.get("department") or not any(group.get("weights", {}).values()):
+            raise ValueError(f"Invalid ROLE_SKILL_WEIGHTS entry for {role}")
+    return groups
+
+
+def compute_role_assignments(employees: pd.DataFrame, groups=None):
+    """
+    Returns a DataFrame (id, ROLE, DEPARTMENT) with the best role for each
+    employee. Scores are weighted averages of the role's skills; ties go to
+    the role listed first.
+    """
+    import numpy as np
+    import pandas as pd
+    groups = groups or load_role_groups()
+    roles = list(groups)
+    weights = np.array(
+        [[groups[role]["weights"].get(skill, 0) for role in roles] for skill in SKILL_COLUMNS],
+        dtype=float
+    )
+
+    skills = (
+        employees.reindex(columns=SKILL_COLUMNS)
+        .apply(pd.to_numeric, errors='coerce')
+        .fillna(0)
+        .to_numpy(dtype=float)
+    )
+    # Divide after the product (not by pre-normalized weights) so equal averages
+    # compare exactly equal and ties resolve to the first role.
+    best = np.argmax((skills @ weights) / weights.sum(axis=0), axis=1)
+    assigned_roles = np.array(roles, dtype=object)[best]
+    return pd.DataFrame({
+        "id": employees['id'].to_numpy(),
+        "ROLE": assigned_roles,
+        "DEPARTMENT": [groups[role]["department"] for role in assigned_roles],
+    })
+
+
+def _bulk_update_roles(cursor, assignments: pd.DataFrame):
+    """One UPDATE ... CASE statement for the whole batch."""
+    ids = assignments['id'].astype(int).tolist()
+    role_cases = " ".join(["WHEN %s THEN %s"] * len(ids))
+    params = []
+    for emp_id, role in zip(ids, assignments['ROLE']):
+        params.extend((emp_id, role))
+    for emp_id, department in zip(ids, assignments['DEPARTMENT']):
+        params.extend((emp_id, department))
+    params.extend(ids)
+    cursor.execute(
+        f"UPDATE employee SET ROLE = CASE id {role_cases} END, "
+        f"DEPARTMENT = CASE id {role_cases} END "
+        f"WHERE id IN ({', '.join(['%s'] * len(ids))})",
+        params
+    )
+
+
+def assign_pending_roles(batch_size=None, groups=None):
+    """
+    Assigns a role and department to every employee that lacks one. Works in
+    id order, one transaction per batch, and returns a small report.
+    """
+    import pandas as pd
+    batch_size = batch_size or ROLE_ASSIGNMENT_BATCH_SIZE
+    groups = groups or load_role_groups()
+    columns = ['id', 'NAME', 'DEPARTMENT', 'ROLE'] + SKILL_COLUMNS
+    report = {"assigned": 0, "batches": 0, "by_role": {}}
+    started = time.perf_counter()
+    last_id = 0
+
+    conn = get_db_connection()
+    try:
+        while True:
+            with conn.cursor() as cursor:
+                # FOR UPDATE keeps a concurrent run from assigning the same rows twice.
+                cursor.execute(
+                    f"SELECT {', '.join(columns)} FROM employee "
+                    f"WHERE {UNASSIGNED_CONDITION} AND id > %s ORDER BY id LIMIT %s FOR UPDATE",
+                    (last_id, batch_size)
+                )
+                rows = cursor.fetchall()
+                if not rows:
+                    conn.commit()
+                    break
+                employees = pd.DataFrame(rows, columns=columns)
+                assignments = compute_role_assignments(employees, groups)
+                _bulk_update_roles(cursor, assignments)
+                record_role_assignments(cursor, [
+                    (row, department, role)
+                    for row, role, department in zip(rows, assignments['ROLE'], assignments['DEPARTMENT'])
+                ])
+                record_changes(cursor, [
+                    employee_change(int(row['id']), 'update', {"ROLE": row['ROLE'], "DEPARTMENT": row['DEPARTMENT']})
+                    for row in assignments.to_dict('records')
+                ])
+            conn.commit()
+
+            changed = assignments.to_dict('records')
+            for row in changed:
+                invalidate_employee_ai_cache(row['id'])
+                invalidate_employee_profile(row['id'])
+            index_employees(changed)
+            last_id = int(rows[-1]['id'])
+            report["assigned"] += len(rows)
+            report["batches"] += 1
+            for role, count in assignments['ROLE'].value_counts().items():
+                report["by_role"][role] = report["by_role"].get(role, 0) + int(count)
+            if len(rows) < batch_size:
+                break
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    report["seconds"] = round(time.perf_counter() - started, 4)
+    return report
+
+
+def role_assignment_job(target):
+    """Background job handler; the target is ignored ('pending')."""
+    report = assign_pending_roles()
+    if report["assigned"]:
+        # New roles mean new (role, weakest skill) profiles to precompute.
+        queue_recommendation_refresh()
+    return report
+
+
+register_job_type('assign_roles', role_assignment_job)
+if ROLE_ASSIGNMENT_INTERVAL > 0:
+    register_periodic_job('assign_roles', 'pending', ROLE_ASSIGNMENT_INTERVAL)
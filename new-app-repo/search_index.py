@@ -0,0 +1,271 @@
+import bisect
+import difflib
+import os
+import re
+import threading
+import time
+from db import get_db_connection, SKILL_COLUMNS
+
+# ----------- In-Process Employee Search Index -----------
+# LIKE '%x%' can never use an index, so employee search runs against an
+# inverted index held in memory:
+#   name tokens (sorted, for prefix lookups) -> employee ids
+#   department / role (lower-cased)          -> employee ids
+#   skill                                    -> sorted (score, id) pairs for range scans
+# The write paths (add/delete employee, HR bulk upload, role assignment) update
+# the index of the worker that served them; every worker also rebuilds from
+# MySQL once its copy is older than SEARCH_INDEX_MAX_AGE seconds, which bounds
+# staleness for changes made through other gunicorn workers.
+
+SEARCH_INDEX_MAX_AGE = float(os.getenv('SEARCH_INDEX_MAX_AGE', '300'))
+# A bare skill name in a skill-gap filter (e.g. "PYTHON") means "scored below this".
+SKILL_GAP_THRESHOLD = float(os.getenv('SKILL_GAP_THRESHOLD', '50'))
+FUZZY_CUTOFF = 0.75
+
+_FILTER_PATTERN = re.compile(r'^\s*([A-Za-z_]+)\s*(<=|>=|<|>|=)?\s*(\d+(?:\.\d+)?)?\s*$')
+
+
+def _tokens(name):
+    return [token for token in re.split(r'\W+', (name or '').lower()) if token]
+
+
+def _key(value):
+    return (value or '').strip().lower()
+
+
+def parse_skill_filters(raw):
+    """
+    Parses "PYTHON<40, HTML>=60" into [(skill, low, high, low_inclusive, high_inclusive)].
+    A bare skill name means below SKILL_GAP_THRESHOLD. Raises ValueError on bad input.
+    """
+    filters = []
+    for part in (raw or '').split(','):
+        if not part.strip():
+            continue
+        match = _FILTER_PATTERN.match(part)
+        if not match:
+            raise ValueError(f"Invalid skill filter: {part.strip()}")
+        skill, op, number = match.group(1).upper(), match.group(2), match.group(3)
+        if skill not in SKILL_COLUMNS:
+            raise ValueError(f"Unknown skill: {skill}")
+        if op is None and number is None:
+            op, number = '<', SKILL_GAP_THRESHOLD
+        elif op is None or number is None:
+            raise ValueError(f"Invalid skill filter: {part.strip()}")
+        value = float(number)
+        filters.append({
+            '<': (skill, None, value, True, False),
+            '<=': (skill, None, value, True, True),
+            '>': (skill, value, None, False, True),
+            '>=': (skill, value, None, True, True),
+            '=': (skill, value, value, True, True),
+        }[op])
+    return filters
+
+
+class EmployeeSearchIndex:
+    def __init__(self, max_age=SEARCH_INDEX_MAX_AGE):
+        self.max_age = max_age
+        self._lock = threading.RLock()
+        self._reset()
+        self.built_at = None
+
+    def _reset(self):
+        self._docs = {}
+        self._token_list = []  # sorted unique name tokens
+        self._postings = {}  # token -> set(ids)
+        self._by_department = {}
+        self._by_role = {}
+        self._skills = {skill: [] for skill in SKILL_COLUMNS}  # sorted [(score, id)]
+
+    # ---- Maintenance ----
+
+    def rebuild(self, rows):
+        with self._lock:
+            self._reset()
+            for row in rows:
+                self._add(row)
+            self.built_at = time.time()
+
+    def refresh_if_stale(self):
+        if self.built_at is not None and time.time() - self.built_at < self.max_age:
+            return
+        columns = ['id', 'NAME', 'DEPARTMENT', 'ROLE'] + SKILL_COLUMNS
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(f"SELECT {', '.join(columns)} FROM employee")
+                rows = cursor.fetchall()
+        finally:
+            conn.close()
+        self.rebuild(rows)
+
+    def upsert(self, row):
+        """Adds or replaces one employee. A no-op until the index has been built."""
+        with self._lock:
+            if self.built_at is None:
+                return
+            existing = self._docs.get(int(row['id']))
+            if existing is not None:
+                merged = dict(existing)
+                merged.update(row)
+                row = merged
+                self._remove(existing['id'])
+            self._add(row)
+
+    def remove(self, emp_id):
+        with self._lock:
+            if self.built_at is not None:
+                self._remove(int(emp_id))
+
+    def _add(self, row):
+        emp_id = int(row['id'])
+        doc = {
+            'id': emp_id,
+            'NAME': row.get('NAME'),
+            'DEPARTMENT': row.get('DEPARTMENT'),
+            'ROLE': row.get('ROLE'),
+        }
+        for skill in SKILL_COLUMNS:
+            doc[skill] = float(row.get(skill) or 0)
+        self._docs[emp_id] = doc
+
+        for token in set(_tokens(doc['NAME'])):
+            if token not in self._postings:
+                self._postings[token] = set()
+                bisect.insort(self._token_list, token)
+            self._postings[token].add(emp_id)
+        self._by_department.setdefault(_key(doc['DEPARTMENT']), set()).add(emp_id)
+        self._by_role.setdefault(_key(doc['ROLE']), set()).add(emp_id)
+        for skill in SKILL_COLUMNS:
+            bisect.insort(self._skills[skill], (doc[skill], emp_id))
+
+    def _remove(self, emp_id):
+        doc = self._docs.pop(emp_id, None)
+        if doc is None:
+            return
+        for token in set(_tokens(doc['NAME'])):
+            ids = self._postings.get(token)
+            if ids is None:
+                continue
+            ids.discard(emp_id)
+            if not ids:
+                del self._postings[token]
+                del self._token_list[bisect.bisect_left(self._token_list, token)]
+        for mapping, value in ((self._by_department, doc['DEPARTMENT']), (self._by_role, doc['ROLE'])):
+            ids = mapping.get(_key(value))
+            if ids is not None:
+                ids.discard(emp_id)
+                if not ids:
+                    del mapping[_key(value)]
+        for skill in SKILL_COLUMNS:
+            entries = self._skills[skill]
+            position = bisect.bisect_left(entries, (doc[skill], emp_id))
+            if position < len(entries) and entries[position] == (doc[skill], emp_id):
+                del entries[position]
+
+    # ---- Queries ----
+
+    def _prefix_ids(self, prefix):
+        ids = set()
+        position = bisect.bisect_left(self._token_list, prefix)
+        while position < len(self._token_list) and self._token_list[position].startswith(prefix):
+            ids |= self._postings[self._token_list[position]]
+            position += 1
+        return ids
+
+    def _fuzzy_ids(self, token):
+        ids = set()
+        for match in difflib.get_close_matches(token, self._token_list, n=10, cutoff=FUZZY_CUTOFF):
+            ids |= self._postings[match]
+        return ids
+
+    def _name_ids(self, name, fuzzy):
+        """Every query token must prefix-match (or, with fuzzy, closely match) a name token."""
+        result = None
+        for token in _tokens(name):
+            ids = self._prefix_ids(token)
+            if fuzzy or not ids:
+                # Fall back to fuzzy matching for typos when no name starts with the token.
+                ids = ids | self._fuzzy_ids(token)
+            result = ids if result is None else result & ids
+            if not result:
+                return set()
+        return result if result is not None else None
+
+    def _skill_ids(self, skill, low, high, low_inclusive, high_inclusive):
+        entries = self._skills[skill]
+        if low is None:
+            start = 0
+        elif low_inclusive:
+            start = bisect.bisect_left(entries, (low, float('-inf')))
+        else:
+            start = bisect.bisect_right(entries, (low, float('inf')))
+        if high is None:
+            end = len(entries)
+        elif high_inclusive:
+            end = bisect.bisect_right(entries, (high, float('inf')))
+        else:
+            end = bisect.bisect_left(entries, (high, float('-inf')))
+        return {emp_id for _, emp_id in entries[start:end]}
+
+    def search(self, name=None, fuzzy=False, department=None, role=None, skill_filters=(),
+               page=1, page_size=50):
+        """Returns (matching employees for the page, total matches)."""
+        with self._lock:
+            candidates = []
+            if department:
+                candidates.append(self._by_department.get(_key(department), set()))
+            if role:
+                candidates.append(self._by_role.get(_key(role), set()))
+            if name:
+                name_ids = self._name_ids(name, fuzzy)
+                if name_ids is not None:
+                    candidates.append(name_ids)
+            for skill_filter in skill_filters:
+                candidates.append(self._skill_ids(*skill_filter))
+
+            if candidates:
+                candidates.sort(key=len)
+                matched = set(candidates[0])
+                for ids in candidates[1:]:
+                    matched &= ids
+                    if not matched:
+                        break
+            else:
+                matched = set(self._docs)
+
+            ordered = sorted(matched)
+            start = (page - 1) * page_size
+            return [dict(self._docs[emp_id]) for emp_id in ordered[start:start + page_size]], len(ordered)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "employees": len(self._docs),
+                "name_tokens": len(self._token_list),
+                "departments": len(self._by_department),
+                "roles": len(self._by_role),
+                "built_at": self.built_at,
+                "age_seconds": round(time.time() - self.built_at, 1) if self.built_at else None,
+                "max_age_seconds": self.max_age,
+            }
+
+
+employee_index = EmployeeSearchIndex()
+
+
+def index_employees(rows):
+    """Write-path hook: rows need 'id' plus any of NAME, DEPARTMENT, ROLE and skill columns."""
+    try:
+        for row in rows:
+            employee_index.upsert(row)
+    except Exception as e:
+        print(f"Error updating employee search index: {e}")
+
+
+def unindex_employee(emp_id):
+    try:
+        employee_index.remove(emp_id)
+    except Exception as e:
+        print(f"Error updating employee search index: {e}")
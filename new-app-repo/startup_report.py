@@ -0,0 +1,75 @@
+"""
+Startup-time report: how long importing the app takes and which modules
+cost the most.
+
+    python startup_report.py              # import the app as a worker would
+    python startup_report.py --heavy      # also import langchain/pandas
+    python startup_report.py --top 40
+
+Runs `python -X importtime` in a fresh interpreter and aggregates its output
+by top-level package.
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+APP_IMPORT = "import app"
+HEAVY_IMPORT = "import app, ai_agents; ai_agents.preload_heavy_modules()"
+
+
+def run_importtime(statement):
+    """Returns [(module, self_us, cumulative_us, depth)] in import order."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else "import failed")
+    entries = []
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            entries.append((module, int(self_us), int(cumulative_us), len(indent) // 2))
+    return entries
+
+
+def summarize(entries, top=25):
+    by_package = {}
+    for module, self_us, _, _ in entries:
+        package = module.split('.')[0]
+        by_package[package] = by_package.get(package, 0) + self_us
+    total_us = sum(self_us for _, self_us, _, _ in entries)
+    # Top-level imports (depth 0) carry the cumulative cost of everything they pulled in.
+    roots = sorted(((cum, module) for module, _, cum, depth in entries if depth == 0), reverse=True)
+
+    lines = [f"Total import time: {total_us / 1000:.1f} ms across {len(entries)} modules", ""]
+    lines.append(f"{'package':<32}{'self ms':>10}{'share':>8}")
+    for package, self_us in sorted(by_package.items(), key=lambda item: item[1], reverse=True)[:top]:
+        lines.append(f"{package:<32}{self_us / 1000:>10.1f}{self_us * 100.0 / total_us:>7.1f}%")
+    lines += ["", f"{'top-level import':<32}{'cumulative ms':>14}"]
+    for cumulative_us, module in roots[:top]:
+        lines.append(f"{module:<32}{cumulative_us / 1000:>14.1f}")
+    loaded = {module.split('.')[0] for module, _, _, _ in entries}
+    lines += ["", "Heavy modules loaded: " + (", ".join(
+        name for name in ('pandas', 'numpy', 'langchain_google_genai', 'langchain_core') if name in loaded
+    ) or "none")]
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--heavy', action='store_true', help="also import langchain and pandas")
+    parser.add_argument('--top', type=int, default=25, help="rows per table")
+    args = parser.parse_args()
+    print(summarize(run_importtime(HEAVY_IMPORT if args.heavy else APP_IMPORT), top=args.top))
+
+
+if __name__ == '__main__':
+    main()